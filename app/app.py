@@ -1,6 +1,6 @@
 import streamlit as st
 
-from pages import home, game, player, team
+import metrics
 from app_multipage import MultiApp
 
 st.set_page_config(
@@ -17,12 +17,22 @@ side = st.sidebar
 
 side.header("Page Navigation")
 st.title("Nice play: NHL Data Exploration")
-app.add_app("Home", home.page)
-app.add_app("Game Explorer", game.page)
-app.add_app("Player Drilldown",player.page)
-app.add_app("Team Records", team.page)
+# pages are imported when first selected
+app.add_app("Home", "pages.home")
+app.add_app("Game Explorer", "pages.game")
+app.add_app("Player Drilldown", "pages.player")
+app.add_app("Team Records", "pages.team")
 app.run()
 
+with side.expander("Page Load Timings"):
+    st.table(app.timing_report())
+
+if side.checkbox("Show Debug Metrics"):
+    side.dataframe(metrics.summary())
+
+# METRICS_PORT serves /metrics, METRICS_FILE is rewritten after each render
+metrics.export_from_env()
+
 side.text("")
 side.text("")
 side.text("built by Thierry Jean")
@@ -1,17 +1,30 @@
 # Reference: https://github.com/dmf95/nhl-expansion-twitter-app/blob/main/app_multipage.py
 """Frameworks for running multiple Streamlit applications as a single app.
 """
+import importlib
+import time
+
 import streamlit as st
 
+import metrics
+
+
+# kept at module level so the timings survive reruns of the script
+PAGE_TIMINGS = {}
+PAGE_IMPORT = metrics.histogram("page_import_seconds", "Import time of the page modules", ["page"])
+PAGE_RENDER = metrics.histogram("page_render_seconds", "Time to run the page functions", ["page"])
+
+
 class MultiApp:
     """Framework for combining multiple streamlit applications.
     It is also possible keep each application in a separate file.
         import foo
-        import bar
         app = MultiApp()
         app.add_app("Foo", foo.app)
-        app.add_app("Bar", bar.app)
+        app.add_app("Bar", "bar:app")
         app.run()
+    A page given as "module:function" (function defaults to `page`) is only
+    imported when it is first selected, so its dependencies don't slow down the start.
     """
     def __init__(self):
         self.pages = []
@@ -22,6 +35,20 @@ class MultiApp:
             "function": func
         })
 
+    @staticmethod
+    def _load(title, func):
+        if callable(func):
+            return func
+        module_name, _, func_name = func.partition(":")
+        if title not in PAGE_TIMINGS:
+            start = time.perf_counter()
+            module = importlib.import_module(module_name)
+            PAGE_TIMINGS[title] = {"import (s)": time.perf_counter() - start}
+            PAGE_IMPORT.observe(PAGE_TIMINGS[title]["import (s)"], page=title)
+        else:
+            module = importlib.import_module(module_name)
+        return getattr(module, func_name or "page")
+
     def run(self):
         app = st.sidebar.selectbox(
             'Choose a page',
@@ -29,4 +56,17 @@ class MultiApp:
             format_func=lambda app: app['title']
         )
 
-        app['function']()
+        page_function = self._load(app['title'], app['function'])
+        timings = PAGE_TIMINGS.setdefault(app['title'], {"import (s)": 0.0})
+        start = time.perf_counter()
+        try:
+            page_function()
+        finally:
+            duration = time.perf_counter() - start
+            PAGE_RENDER.observe(duration, page=app['title'])
+            if "first render (s)" not in timings:
+                timings["first render (s)"] = duration
+
+    def timing_report(self):
+        """import and first render time of each page opened since the server started"""
+        return [dict(page=page["title"], **PAGE_TIMINGS[page["title"]]) for page in self.pages if page["title"] in PAGE_TIMINGS]
@@ -0,0 +1,230 @@
+"""Offline benchmarks of the parsing and feature code on synthetic feeds (see synthetic.py).
+    python benchmark.py --output bench.json
+    python benchmark.py --scales game season --compare bench.json
+
+Each benchmark is timed at three scales: one game, one season and several seasons.
+It reports the best and mean time over the repeats, the throughput in games and plays
+per second, and the peak memory allocated while it runs (tracemalloc, measured in a
+separate untimed run). The results are written as JSON. With --compare, the exit
+status is 1 when a benchmark is slower than in a previous results file by more than
+--threshold.
+
+Game feeds are generated and parsed one season at a time, so memory stays bounded
+at the largest scale. The feature benchmarks run on the plays of every season at once.
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from features import normalize_plays_coords, basic_features, advanced_features
+from synthetic import generate_season
+from utils import play_json_to_play_dict, augment_with_previous_event, game_json_to_plays_list, games_to_df, compact_plays_df
+from xg import BASELINE_FEATURES, LinearModel, TreeEnsemble, score_plays
+
+
+SCALES = ["game", "season", "seasons"]
+
+
+def _plays_dict_lists(games):
+    return [
+        (game_json["liveData"]["plays"]["allPlays"], list(filter(None, [play_json_to_play_dict(play) for play in game_json["liveData"]["plays"]["allPlays"]])))
+        for game_json in games
+    ]
+
+
+# benchmarks of the game feeds: setup(games) builds the untimed input of run(input)
+JSON_BENCHMARKS = {
+    "game_json_to_plays_list": (
+        lambda games: games,
+        lambda games: [game_json_to_plays_list(game_json) for game_json in games],
+    ),
+    "augment_with_previous_event": (
+        # augment_with_previous_event updates the play dicts, so each run gets new ones
+        _plays_dict_lists,
+        lambda inputs: [augment_with_previous_event(all_plays, plays_dicts) for all_plays, plays_dicts in inputs],
+    ),
+    "games_to_df": (
+        lambda games: games,
+        lambda games: games_to_df(games, augment=True),
+    ),
+}
+
+def _xg_trees(n_trees=100, depth=6, seed=0):
+    """complete trees with random splits on the baseline features, the size of a boosted xG model"""
+    rng = np.random.default_rng(seed)
+    n_nodes = 2 ** (depth + 1) - 1
+    children = np.arange(n_nodes) * 2 + 1
+    left = np.where(children < n_nodes, children, -1)
+    right = np.where(children < n_nodes, children + 1, -1)
+    trees = [dict(
+        feature=rng.integers(len(BASELINE_FEATURES), size=n_nodes).tolist(),
+        threshold=rng.normal(20, 30, size=n_nodes).tolist(),
+        left=left.tolist(),
+        right=right.tolist(),
+        value=rng.normal(0, 0.1, size=n_nodes).tolist(),
+    ) for _ in range(n_trees)]
+    return TreeEnsemble(BASELINE_FEATURES, trees, base_score=-2.5, pipeline_features=BASELINE_FEATURES)
+
+
+# the coefficients only matter for the outcome, not the time
+XG_LINEAR = LinearModel(BASELINE_FEATURES, np.full(len(BASELINE_FEATURES), 0.01), -2.5, pipeline_features=BASELINE_FEATURES)
+XG_TREES = _xg_trees()
+
+# benchmarks of the plays DataFrame parsed with games_to_df(augment=True)
+DF_BENCHMARKS = {
+    "normalize_plays_coords": normalize_plays_coords,
+    "basic_features": basic_features,
+    "advanced_features": advanced_features,
+    "compact_plays_df": compact_plays_df,
+    "xg_linear": lambda plays_df: score_plays(XG_LINEAR, plays_df),
+    "xg_trees": lambda plays_df: score_plays(XG_TREES, plays_df),
+}
+
+
+def _time(setup, run, repeat):
+    durations = []
+    for _ in range(repeat):
+        run_input = setup()
+        start = time.perf_counter()
+        run(run_input)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def _peak_memory(setup, run):
+    """peak memory allocated by run, in MB, not counting its input"""
+    run_input = setup()
+    tracemalloc.start()
+    try:
+        run(run_input)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 2**20
+
+
+def _scale_chunks(scale, games_per_season, n_seasons, first_year):
+    """(start_year, n_games) of the seasons generated for a scale"""
+    if scale == "game":
+        return [(first_year, 1)]
+    if scale == "season":
+        return [(first_year, games_per_season)]
+    return [(first_year + i, games_per_season) for i in range(n_seasons)]
+
+
+def run_scale(scale, benchmarks, games_per_season, n_seasons, plays_per_game, repeat, first_year=2021, seed=0):
+    """run the benchmarks at a scale; returns one result dict per benchmark"""
+    durations = {name: np.zeros(repeat) for name in benchmarks}
+    peaks = {name: 0.0 for name in benchmarks}
+    n_games, n_plays = 0, 0
+    plays_dfs = []
+    for start_year, n_chunk_games in _scale_chunks(scale, games_per_season, n_seasons, first_year):
+        games = generate_season(start_year, n_games=n_chunk_games, n_plays=plays_per_game, seed=seed)
+        n_games += len(games)
+        n_plays += sum(len(game_json["liveData"]["plays"]["allPlays"]) for game_json in games)
+        for name in benchmarks:
+            if name in JSON_BENCHMARKS:
+                setup, run = JSON_BENCHMARKS[name]
+                durations[name] += _time(lambda: setup(games), run, repeat)
+                peaks[name] = max(peaks[name], _peak_memory(lambda: setup(games), run))
+        plays_dfs.append(games_to_df(games, augment=True))
+        del games
+
+    plays_df = pd.concat(plays_dfs, ignore_index=True)
+    for name in benchmarks:
+        if name in DF_BENCHMARKS:
+            durations[name] += _time(lambda: plays_df, DF_BENCHMARKS[name], repeat)
+            peaks[name] = _peak_memory(lambda: plays_df, DF_BENCHMARKS[name])
+
+    results = []
+    for name in benchmarks:
+        best = float(durations[name].min())
+        results.append({
+            "benchmark": name,
+            "scale": scale,
+            "n_games": n_games,
+            "n_plays": n_plays,
+            "n_shots": len(plays_df),
+            "repeat": repeat,
+            "best_s": best,
+            "mean_s": float(durations[name].mean()),
+            "games_per_s": n_games / best if best else None,
+            "plays_per_s": n_plays / best if best else None,
+            "peak_memory_mb": peaks[name],
+        })
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """return the results slower than the baseline by more than threshold (a fraction)"""
+    baseline_best = {(r["benchmark"], r["scale"]): r["best_s"] for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        key = (result["benchmark"], result["scale"])
+        if key not in baseline_best or not baseline_best[key]:
+            continue
+        ratio = result["best_s"] / baseline_best[key]
+        print(f"{result['benchmark']:<28} {result['scale']:<8} {baseline_best[key]:>9.4f}s -> {result['best_s']:>9.4f}s  x{ratio:.2f}")
+        if ratio > 1 + threshold:
+            regressions.append(dict(result, baseline_best_s=baseline_best[key], ratio=ratio))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parsing and features on synthetic game feeds.")
+    parser.add_argument("--scales", nargs="+", choices=SCALES, default=SCALES)
+    parser.add_argument("--benchmarks", nargs="+", choices=list(JSON_BENCHMARKS) + list(DF_BENCHMARKS), default=list(JSON_BENCHMARKS) + list(DF_BENCHMARKS))
+    parser.add_argument("--plays-per-game", type=int, default=350)
+    parser.add_argument("--games-per-season", type=int, default=1312)
+    parser.add_argument("--seasons", type=int, default=3, help="number of seasons of the 'seasons' scale")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", default=None, help="results file of a previous run")
+    parser.add_argument("--threshold", type=float, default=0.1, help="slowdown reported as a regression (0.1: 10%%)")
+    args = parser.parse_args()
+
+    # feeds have shots on the goal line, where the angle is undefined
+    warnings.simplefilter("ignore", RuntimeWarning)
+    results = []
+    for scale in args.scales:
+        for result in run_scale(scale, args.benchmarks, args.games_per_season, args.seasons, args.plays_per_game, args.repeat, seed=args.seed):
+            print(f"{result['benchmark']:<28} {result['scale']:<8} best {result['best_s']:>9.4f}s  {result['games_per_s']:>10.1f} games/s  peak {result['peak_memory_mb']:>8.1f} MB")
+            results.append(result)
+
+    report = {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "args": vars(args),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"regression: {regression['benchmark']} ({regression['scale']}) x{regression['ratio']:.2f}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,158 @@
+import contextlib
+import functools
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: locks only exclude the threads of the process
+    fcntl = None
+
+import metrics
+
+
+MEMOIZE_REQUESTS = metrics.counter("memoize_requests_total", "Lookups of memoized functions", ["cache", "result"])
+
+
+# without fcntl, paths are locked with one of these (by hash)
+_THREAD_LOCKS = [threading.Lock() for _ in range(64)]
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """hold an exclusive lock on `path` (created if missing), shared by every process using the
+    same file system, i.e. app replicas on a shared volume"""
+    if fcntl is None:
+        with _THREAD_LOCKS[hash(path) % len(_THREAD_LOCKS)]:
+            yield
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@contextlib.contextmanager
+def atomic_path(path):
+    """a new temporary path next to `path`, moved over it once written, so readers never see a
+    partial file and concurrent writers never share the temporary one"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+class DiskCache:
+    """JSON cache persisted as one file per entry under `cache_dir`.
+    Entries are written atomically so that concurrent readers never see a partial file,
+    and lock(key) lets processes sharing the directory compute an entry only once.
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(endpoint, params=None):
+        """build a stable key from an API endpoint and its query params"""
+        raw = json.dumps([endpoint, sorted((params or {}).items())], default=str)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def get(self, key, expired=False):
+        """return the cached data, or None if the entry is missing or expired;
+        expired=True also returns entries past their TTL (i.e., to replay them)"""
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if not expired and entry["expires_at"] is not None and entry["expires_at"] < time.time():
+            return None
+        return entry["data"]
+
+    def lock(self, key):
+        """exclusive lock on an entry, i.e. to check it again before computing it"""
+        return file_lock(self._path(key) + ".lock")
+
+    def set(self, key, data, ttl=None):
+        """store data for `ttl` seconds (None: never expires)"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {
+            "expires_at": None if ttl is None else time.time() + ttl,
+            "data": data,
+        }
+        with atomic_path(path) as tmp_path:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+
+
+def memoize(maxsize=128, key=None, ttl=None):
+    """keep the results of a function in memory, evicting the least recently used.
+    Unlike st.cache, arguments are not hashed: `key(*args, **kwargs)` returns a cheap
+    hashable identifier of the call (by default the arguments themselves), and results
+    are returned as is, so callers must not mutate them.
+    `ttl` is the lifetime of a result in seconds (None: until evicted), or a function of
+    the result returning it, as for ApiEngine.cached_query.
+        @memoize(maxsize=32, key=lambda game_json: game_json["gameData"]["game"]["pk"])
+        def get_metadata(game_json): ...
+    """
+    def decorator(func):
+        # key -> (result, expires_at)
+        entries = OrderedDict()
+        lock = threading.Lock()
+        stats = {"hits": 0, "misses": 0}
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            entry_key = key(*args, **kwargs) if key else (args, tuple(sorted(kwargs.items())))
+            with lock:
+                entry = entries.get(entry_key)
+                if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                    entries.move_to_end(entry_key)
+                    stats["hits"] += 1
+                    MEMOIZE_REQUESTS.inc(cache=func.__qualname__, result="hit")
+                    return entry[0]
+                if entry is not None:
+                    del entries[entry_key]
+                stats["misses"] += 1
+            MEMOIZE_REQUESTS.inc(cache=func.__qualname__, result="miss")
+            # computed outside of the lock: concurrent misses on one key may both compute it
+            result = func(*args, **kwargs)
+            lifetime = ttl(result) if callable(ttl) else ttl
+            with lock:
+                entries[entry_key] = (result, None if lifetime is None else time.monotonic() + lifetime)
+                entries.move_to_end(entry_key)
+                while len(entries) > maxsize:
+                    entries.popitem(last=False)
+            return result
+
+        def cache_info():
+            with lock:
+                return dict(stats, size=len(entries), maxsize=maxsize)
+
+        def cache_clear():
+            with lock:
+                entries.clear()
+                stats.update(hits=0, misses=0)
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
@@ -0,0 +1,54 @@
+"""Season by season NHL stats of many players, as one table.
+    seasons_df, failed = load_player_seasons(api_engine, roster_df.player_id)
+    seasons_df[seasons_df.player_id == 8478402]
+"""
+import pandas as pd
+
+from data_query import ApiError, DOWNLOAD_WORKERS
+
+
+# 133 is the NHL league ID
+NHL_LEAGUE_ID = 133
+SEASON_COLUMNS = ["player_id", "season", "sequence_number", "team_id", "team_name"]
+
+
+def year_by_year_to_records(player_id, year_by_year):
+    """one record per NHL season and team of the people/{id}/stats?stats=yearByYear response;
+    the stats of skaters and goalies differ, so each record keeps the stats it has"""
+    records = []
+    for stats in year_by_year.get("stats", []):
+        for split in stats.get("splits", []):
+            if split["league"].get("id", -1) != NHL_LEAGUE_ID:
+                continue
+            record = dict(
+                player_id=int(player_id),
+                season=split["season"],
+                sequence_number=split.get("sequenceNumber"),
+                team_id=split["team"].get("id"),
+                team_name=split["team"].get("name"),
+            )
+            record.update(split.get("stat", {}))
+            records.append(record)
+    return records
+
+
+def load_player_seasons(api_engine, player_ids, max_workers=DOWNLOAD_WORKERS, progress=None):
+    """download the year by year stats of the players concurrently (through the on-disk cache)
+    and normalize them into one table with a row per player, season and team.
+    Returns the table and the ids of the players that could not be downloaded."""
+    player_ids = list(dict.fromkeys(int(player_id) for player_id in player_ids))
+    records = []
+    loaded = set()
+    try:
+        for player_id, year_by_year in api_engine.download_player_year_by_year(player_ids, max_workers=max_workers, progress=progress):
+            records.extend(year_by_year_to_records(player_id, year_by_year))
+            loaded.add(player_id)
+    except ApiError:
+        pass
+    failed = [player_id for player_id in player_ids if player_id not in loaded]
+
+    seasons_df = pd.DataFrame.from_records(records)
+    if seasons_df.empty:
+        seasons_df = pd.DataFrame(columns=SEASON_COLUMNS)
+    seasons_df = seasons_df.sort_values(["player_id", "season", "sequence_number"], ignore_index=True)
+    return seasons_df, failed
@@ -1,14 +1,250 @@
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import requests
 import json
 
-import pandas as pd
-import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError as Urllib3HTTPError, ReadTimeoutError
+from urllib3.util.retry import Retry
+
+import metrics
+import selective
+from cache import DiskCache, memoize
+from media import MediaIndex
+from schedule import ScheduleIndex
+
+
+# NHL_API_BASE_URL points the app to another server, i.e. mock_api.py
+API_URL = os.environ.get("NHL_API_BASE_URL", "https://statsapi.web.nhl.com/api/v1").rstrip("/")
+# directory of the response cache and the warehouse; replicas of the app share it on a volume
+STORAGE_PATH = os.environ.get("STORAGE_PATH", "./")
+
+# (connect, read) timeouts in seconds; the first matching endpoint pattern wins
+DEFAULT_TIMEOUT = (3.05, 5)
+ENDPOINT_TIMEOUTS = {
+    "feed/live": (3.05, 15),
+    "schedule": (3.05, 10),
+}
+# fields of a game feed read by the plays parsing (utils.game_to_df) and get_metadata
+FEED_FIELDS = (
+    "gamePk",
+    "metaData",
+    "gameData.game",
+    "gameData.datetime",
+    "gameData.status",
+    "gameData.teams",
+    "gameData.venue",
+    "liveData.plays.allPlays",
+    "liveData.plays.scoringPlays",
+    "liveData.plays.penaltyPlays",
+    "liveData.plays.playsByPeriod",
+    "liveData.linescore",
+    "liveData.boxscore.teams.away.teamStats",
+    "liveData.boxscore.teams.home.teamStats",
+    "liveData.decisions",
+)
+# endpoints that can be decoded selectively (selective=True), by the end of their path
+ENDPOINT_FIELDS = {
+    "feed/live": FEED_FIELDS,
+}
+
+# retries on connection errors, timeouts and 5xx, waiting backoff * 2**n seconds in between
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+POOL_SIZE = 16
+# concurrent requests when downloading many games
+DOWNLOAD_WORKERS = 8
+# threads fetching in the background while a page renders (see get_executor)
+BACKGROUND_WORKERS = 4
+
+
+# seconds before a cached response is fetched again; final games never expire
+LIVE_GAME_TTL = 30
+SCHEDULE_TTL = 60 * 60
+# highlights keep being published during and after a game
+MEDIA_TTL = 10 * 60
+STATS_TTL = 24 * 60 * 60
+
+
+def _game_ttl(game_json):
+    """final games are stored forever, games in progress expire quickly"""
+    if game_json["gameData"]["status"]["abstractGameState"] == "Final":
+        return None
+    return LIVE_GAME_TTL
+
+
+class ApiError(Exception):
+    """raised when an API request fails"""
+    def __init__(self, message, url=None, status_code=None):
+        super().__init__(message)
+        self.url = url
+        self.status_code = status_code
+
+
+class ApiTimeoutError(ApiError):
+    """raised when an API request times out after all retries"""
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """return the session shared by every ApiEngine;
+    its connection pool keeps connections alive and is safe to use across threads"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=MAX_RETRIES,
+                backoff_factor=BACKOFF_FACTOR,
+                status_forcelist=(500, 502, 503, 504),
+                allowed_methods=frozenset(["GET"]),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+    return _session
+
+
+_executor = None
+
+
+def get_executor():
+    """return the thread pool shared by the background fetches of every session"""
+    global _executor
+    with _session_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix="api-background")
+    return _executor
+
+
+def schedule_to_gamePks(season_schedule):
+    """get list of valid gamePk from season schedule"""
+    gamePk_list = []
+    for date in season_schedule["dates"]:
+        for game in date["games"]:
+            gamePk_list.append(game["gamePk"])
+    return gamePk_list
+
+
+API_LATENCY = metrics.histogram("nhl_api_request_seconds", "Latency of NHL API requests, retries included", ["endpoint"])
+API_ERRORS = metrics.counter("nhl_api_errors_total", "NHL API requests that failed", ["endpoint", "error"])
+API_DECODE = metrics.histogram("nhl_api_decode_seconds", "Time to read and decode NHL API responses", ["endpoint", "mode"])
+DISK_CACHE_REQUESTS = metrics.counter("api_disk_cache_requests_total", "Lookups of API responses in the on-disk cache", ["result"])
+
+
+def _endpoint_label(endpoint):
+    """endpoint without ids nor query, to keep few label values (i.e., game/{id}/feed/live)"""
+    return re.sub(r"\d+", "{id}", endpoint.split("?")[0])
+
+
+def _endpoint_fields(endpoint):
+    path = endpoint.split("?")[0]
+    for suffix, fields in ENDPOINT_FIELDS.items():
+        if path.endswith(suffix):
+            return fields
+    return None
+
+
+def _decode_json(r, url):
+    """decode a whole response; a truncated or non JSON body (i.e., an HTML error page
+    from a proxy) raises ApiError like a failed request"""
+    try:
+        return r.json()
+    except ValueError as e:
+        raise ApiError(f"Invalid JSON returned for '{url}'", url=url) from e
+    except requests.exceptions.RequestException as e:
+        raise ApiError(f"Could not read API endpoint '{url}'", url=url) from e
+
+
+def _decode_fields(r, fields, url):
+    """stream the selected fields out of a response opened with stream=True;
+    without ijson, decode it fully and keep the same fields"""
+    if selective.ijson is None:
+        return selective.select_fields(_decode_json(r, url), fields)
+    try:
+        with r:
+            r.raw.decode_content = True
+            return selective.stream_fields(r.raw, fields)
+    except selective.ijson.JSONError as e:
+        raise ApiError(f"Invalid JSON returned for '{url}'", url=url) from e
+    except ReadTimeoutError as e:
+        raise ApiTimeoutError(f"Timed out reading API endpoint '{url}'", url=url) from e
+    except Urllib3HTTPError as e:
+        raise ApiError(f"Could not read API endpoint '{url}'", url=url) from e
+
+
+def _endpoint_timeout(endpoint):
+    for pattern, timeout in ENDPOINT_TIMEOUTS.items():
+        if pattern in endpoint:
+            return timeout
+    return DEFAULT_TIMEOUT
+
+
+def fetch_concurrently(fetch, keys, max_workers=DOWNLOAD_WORKERS, progress=None, name="items"):
+    """call fetch(key) for each key on a thread pool, yielding (key, result) as each one completes.
+    At most `max_workers` calls run at once, `progress(n_done, n_total)` is called after each one.
+    Keys whose fetch raised ApiError are skipped and reported in an ApiError once the others are done.
+    """
+    keys = list(keys)
+    pending = iter(keys)
+    failed = []
+    n_done = 0
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    in_flight = {}
+    try:
+        for key in pending:
+            in_flight[executor.submit(fetch, key)] = key
+            if len(in_flight) >= max_workers:
+                break
+
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = in_flight.pop(future)
+                # keep the number of open requests constant
+                next_key = next(pending, None)
+                if next_key is not None:
+                    in_flight[executor.submit(fetch, next_key)] = next_key
+
+                n_done += 1
+                if progress is not None:
+                    progress(n_done, len(keys))
+                try:
+                    result = future.result()
+                except ApiError:
+                    failed.append(key)
+                    continue
+                yield key, result
+    finally:
+        # stop queued requests if the caller stops iterating early
+        for future in in_flight:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+    if failed:
+        raise ApiError(f"Could not download {len(failed)} {name}: {failed}")
 
 
 # class to interact with the API
 class ApiEngine:
     def __init__(self, storage_path):
         self.storage_path = storage_path
+        self.cache = DiskCache(os.path.join(storage_path, "api_cache"))
+
+    # engines on the same storage share their memoized results
+    def __eq__(self, other):
+        return isinstance(other, ApiEngine) and self.storage_path == other.storage_path
+
+    def __hash__(self):
+        return hash(self.storage_path)
 
     @staticmethod
     def _start_year_to_season_string(start_year):
@@ -16,57 +252,190 @@ class ApiEngine:
         return str(start_year) + str(start_year+1)
         
     @staticmethod
-    def query_api(endpoint, params=None):
-        """query API endpoint"""
-        # base url of the API
-        url = f"https://statsapi.web.nhl.com/api/v1/{endpoint}"
-        r = requests.get(url, params=params, timeout=3)
-        # check if the HTTP request is valid
+    def query_api(endpoint, params=None, timeout=None, selective=False):
+        """query API endpoint; raise ApiError if it can't be reached or returns an error status.
+        With selective=True, endpoints listed in ENDPOINT_FIELDS only decode those fields."""
+        url = f"{API_URL}/{endpoint}"
+        if timeout is None:
+            timeout = _endpoint_timeout(endpoint)
+        fields = _endpoint_fields(endpoint) if selective else None
+        endpoint_label = _endpoint_label(endpoint)
         try:
+            with API_LATENCY.time(endpoint=endpoint_label):
+                r = get_session().get(url, params=params, timeout=timeout, stream=fields is not None)
             r.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            API_ERRORS.inc(endpoint=endpoint_label, error=str(r.status_code))
+            raise ApiError(f"API returned {r.status_code} for '{url}'", url=url, status_code=r.status_code) from e
+        except requests.exceptions.Timeout as e:
+            API_ERRORS.inc(endpoint=endpoint_label, error="timeout")
+            raise ApiTimeoutError(f"Timed out reaching API endpoint '{url}'", url=url) from e
         except requests.exceptions.RequestException as e:
-            print(f"Could not reach API endpoint:\n'{url}'")
-        return r.json()
+            # read timeouts that exhausted the retries surface as connection errors
+            reason = getattr(e.args[0], "reason", None) if e.args else None
+            if isinstance(reason, ReadTimeoutError):
+                API_ERRORS.inc(endpoint=endpoint_label, error="timeout")
+                raise ApiTimeoutError(f"Timed out reaching API endpoint '{url}'", url=url) from e
+            API_ERRORS.inc(endpoint=endpoint_label, error="connection")
+            raise ApiError(f"Could not reach API endpoint '{url}'", url=url) from e
+
+        try:
+            if fields is None:
+                with API_DECODE.time(endpoint=endpoint_label, mode="full"):
+                    return _decode_json(r, url)
+            with API_DECODE.time(endpoint=endpoint_label, mode="selective"):
+                return _decode_fields(r, fields, url)
+        except ApiError as e:
+            API_ERRORS.inc(endpoint=endpoint_label, error="timeout" if isinstance(e, ApiTimeoutError) else "decode")
+            raise
+
+    def _cache_key(self, endpoint, params=None, selective=False):
+        fields = _endpoint_fields(endpoint) if selective else None
+        if fields is not None:
+            # selective responses are stored apart from the full ones
+            params = dict(params or {}, fields=",".join(sorted(fields)))
+        return self.cache.make_key(endpoint, params)
+
+    def cached_query(self, endpoint, params=None, ttl=None, selective=False):
+        """query API endpoint through the on-disk cache;
+        `ttl` is the lifetime of the response in seconds (None: forever),
+        or a function of the response returning it"""
+        key = self._cache_key(endpoint, params, selective)
+        response = self.cache.get(key)
+        if response is None:
+            # processes sharing the cache wait for the one already fetching this response
+            with self.cache.lock(key):
+                response = self.cache.get(key)
+                if response is None:
+                    DISK_CACHE_REQUESTS.inc(result="miss")
+                    response = self.query_api(endpoint, params=params, selective=selective)
+                    if callable(ttl):
+                        ttl = ttl(response)
+                    self.cache.set(key, response, ttl=ttl)
+                    return response
+        DISK_CACHE_REQUESTS.inc(result="hit")
+        return response
+
+    def load_season_schedule(self, start_year):
+        """query API for the schedule of the year through the on-disk cache only"""
+        season_string = self._start_year_to_season_string(start_year)
+        return self.cached_query("schedule", params={"season": season_string}, ttl=SCHEDULE_TTL)
 
-    @st.cache
+    @memoize(maxsize=16, ttl=SCHEDULE_TTL)
     def get_season_schedule(self, start_year):
         """query API for the schedule of the year (to get valid gamePk)"""
-        season_string = self._start_year_to_season_string(start_year)
-        season_response = self.query_api("schedule", params={"season": season_string})
+        season_response = self.load_season_schedule(start_year)
         return season_response
-        
+
+    def load_schedule_index(self, start_year):
+        """index of the games of the season, kept in the on-disk cache"""
+        season_string = self._start_year_to_season_string(start_year)
+        key = self.cache.make_key("schedule_index", params={"season": season_string})
+        records = self.cache.get(key)
+        if records is None:
+            records = ScheduleIndex.from_schedule(self.load_season_schedule(start_year)).to_records()
+            self.cache.set(key, records, ttl=SCHEDULE_TTL)
+        return ScheduleIndex.from_records(records)
+
+    @memoize(maxsize=16, ttl=SCHEDULE_TTL)
+    def get_schedule_index(self, start_year):
+        return self.load_schedule_index(start_year)
+
+    def load_game(self, gamePk, selective=False):
+        """query API for a specific game through the on-disk cache only;
+        selective=True only keeps FEED_FIELDS, enough to parse the plays and metadata"""
+        return self.cached_query(f"game/{gamePk}/feed/live", ttl=_game_ttl, selective=selective)
+
+    def update_game(self, game_json):
+        """store a game feed updated outside of the API (i.e., patched by live.LiveGame)"""
+        key = self.cache.make_key(f"game/{game_json['gameData']['game']['pk']}/feed/live")
+        self.cache.set(key, game_json, ttl=_game_ttl(game_json))
+
+    def get_game_diff(self, gamePk, start_timecode):
+        """query API for the JSON patches of a game feed since start_timecode (metaData.timeStamp)"""
+        return self.query_api(f"game/{gamePk}/feed/live/diffPatch", params={"startTimecode": start_timecode})
+
     # query API for a specific game
-    @st.cache
+    @memoize(maxsize=32, ttl=_game_ttl)
     def get_game(self, gamePk):
-        game_response = self.query_api(f"game/{gamePk}/feed/live")
+        game_response = self.load_game(gamePk)
         return game_response
     
+    def load_media(self, gamePk):
+        """query API for the recap and highlights of a game through the on-disk cache only"""
+        return self.cached_query(f"game/{gamePk}/content", ttl=MEDIA_TTL)
+
+    @memoize(maxsize=32, ttl=MEDIA_TTL)
     def get_media(self, gamePk):
-        game_media = self.query_api(f"game/{gamePk}/content")
+        game_media = self.load_media(gamePk)
         return game_media
+
+    def load_media_index(self, gamePk):
+        """index of the recap and highlights of a game, kept in the on-disk cache"""
+        key = self.cache.make_key("media_index", params={"gamePk": gamePk})
+        records = self.cache.get(key)
+        if records is None:
+            records = MediaIndex.from_media(self.load_media(gamePk)).to_records()
+            self.cache.set(key, records, ttl=MEDIA_TTL)
+        return MediaIndex.from_records(records)
+
+    @memoize(maxsize=32, ttl=MEDIA_TTL)
+    def get_media_index(self, gamePk):
+        return self.load_media_index(gamePk)
+
+    def prefetch_media_index(self, gamePk):
+        """start get_media_index on the shared executor and return its future,
+        so the media arrives while the rest of the page renders"""
+        return get_executor().submit(self.get_media_index, gamePk)
     
-    @st.cache
+    @memoize(maxsize=256, ttl=STATS_TTL)
     def get_player_year_by_year(self, player_id):
-        year_by_year = self.query_api(f"people/{player_id}/stats?stats=yearByYear")
+        year_by_year = self.load_player_year_by_year(player_id)
         return year_by_year
-    
-    @st.cache
-    def get_teams(self):
-        teams = self.query_api(f"teams")
-        return teams
-    
-    @st.cache
-    def get_team_stats(self, team_id):
-        team_stats = self.query_api(f"teams?expand=team.stats&teamId={team_id}")
-        return team_stats
 
-    @st.cache
+    def load_player_year_by_year(self, player_id):
+        """query API for the stats of each season of a player through the on-disk cache only"""
+        return self.cached_query(f"people/{player_id}/stats?stats=yearByYear", ttl=STATS_TTL)
+
+    @memoize(maxsize=1, ttl=STATS_TTL)
+    def get_rosters(self):
+        """query API for the current roster of every team in one request"""
+        rosters = self.cached_query("teams", params={"expand": "team.roster"}, ttl=STATS_TTL)
+        return rosters
+
+    def load_league_stats(self, start_year):
+        """query API for the stats of every team of the season in one request, through the on-disk cache only"""
+        season_string = self._start_year_to_season_string(start_year)
+        return self.cached_query("teams", params={"expand": "team.stats", "season": season_string}, ttl=STATS_TTL)
+
+    @memoize(maxsize=16, ttl=STATS_TTL)
+    def get_league_stats(self, start_year):
+        league_stats = self.load_league_stats(start_year)
+        return league_stats
+
+    @memoize(maxsize=16, ttl=SCHEDULE_TTL)
     def get_all_season_gamePk(self, start_year):
         """get list of valid gamePk from season schedule"""
-        season_schedule = self.get_season_schedule(start_year)
-        gamePk_list = []
-        for date in season_schedule["dates"]:
-            for game in date["games"]:
-                gamePk_list.append(game["gamePk"])
-        return gamePk_list
-  
\ No newline at end of file
+        return self.get_schedule_index(start_year).gamePks
+
+    def download_games(self, gamePks=None, start_year=None, max_workers=DOWNLOAD_WORKERS, progress=None, selective=False):
+        """download game feeds concurrently, yielding (gamePk, game_json) as each one arrives.
+        Pass either a list of gamePks or the start_year of a season.
+        At most `max_workers` requests are open at once. Feeds already on disk are not fetched
+        again, so an interrupted download resumes where it stopped.
+        `progress(n_done, n_total)` is called after each game.
+        selective=True only decodes and stores the FEED_FIELDS of each feed (see load_game).
+        Games that failed are skipped and reported in an ApiError once the others are done.
+        """
+        if gamePks is None:
+            gamePks = schedule_to_gamePks(self.load_season_schedule(start_year))
+        yield from fetch_concurrently(
+            lambda gamePk: self.load_game(gamePk, selective), gamePks, max_workers=max_workers, progress=progress, name="games"
+        )
+
+    def download_player_year_by_year(self, player_ids, max_workers=DOWNLOAD_WORKERS, progress=None):
+        """download the year by year stats of players concurrently, yielding (player_id, year_by_year);
+        same behavior as download_games"""
+        yield from fetch_concurrently(
+            self.load_player_year_by_year, player_ids, max_workers=max_workers, progress=progress, name="players"
+        )
@@ -0,0 +1,148 @@
+"""Shot density maps binned on the server.
+
+Shots are binned on a grid over the normalized coordinates (see features.normalize_plays_coords),
+so a figure holds one value per cell however many shots it covers. Grids are counts, so the
+grids of several games, seasons or game types are merged by summing them.
+"""
+
+import numpy as np
+import plotly.graph_objects as go
+
+import metrics
+from cache import atomic_path
+from features import normalized_coords
+
+
+CHART_BUILD = metrics.histogram("chart_build_seconds", "Time to build the Plotly figures", ["chart"])
+
+
+# 5 x 5 ft cells over the 200 x 85 ft rink
+X_EDGES = np.linspace(-100, 100, 41)
+Y_EDGES = np.linspace(-42.5, 42.5, 18)
+SHAPE = (len(X_EDGES) - 1, len(Y_EDGES) - 1)
+
+
+class ShotDensity:
+    """Counts of shots and goals per cell, indexed [x_bin, y_bin].
+        density = ShotDensity.from_plays(plays_df)
+        season_density = ShotDensity.merge([density_2020, density_2021])
+    """
+    def __init__(self, shots=None, goals=None):
+        self.shots = np.zeros(SHAPE, dtype="int32") if shots is None else shots
+        self.goals = np.zeros(SHAPE, dtype="int32") if goals is None else goals
+
+    def __add__(self, other):
+        return ShotDensity(self.shots + other.shots, self.goals + other.goals)
+
+    @classmethod
+    def merge(cls, densities):
+        return sum(densities, cls())
+
+    @property
+    def n_shots(self):
+        return int(self.shots.sum())
+
+    @classmethod
+    def from_plays(cls, plays_df, side=True):
+        densities = group_densities(plays_df.assign(_all=0), by="_all", side=side)
+        return densities.get(0, cls())
+
+
+def _bin_positions(values, edges):
+    """index of the bin of each value; values beyond the edges fall in the outer bins"""
+    return np.clip(np.searchsorted(edges, values, side="right") - 1, 0, len(edges) - 2)
+
+
+def group_densities(plays_df, by, side=True):
+    """bin the shots of each group of plays (i.e., by="shooter_id"), returns {group: ShotDensity}.
+    plays_df needs the columns used by normalize_plays_coords and event_type_id;
+    side=False keeps each team on its own half, as the shotmap of a game."""
+    x_norm, y_norm = normalized_coords(plays_df, side=side)
+    keep = ~(np.isnan(x_norm) | np.isnan(y_norm)) & plays_df[by].notna().to_numpy()
+    codes, groups = plays_df[by][keep].factorize()
+    cells = (
+        codes * (SHAPE[0] * SHAPE[1])
+        + _bin_positions(x_norm[keep], X_EDGES) * SHAPE[1]
+        + _bin_positions(y_norm[keep], Y_EDGES)
+    )
+    size = len(groups) * SHAPE[0] * SHAPE[1]
+    is_goal = (plays_df["event_type_id"] == "GOAL").to_numpy()[keep]
+    shots = np.bincount(cells, minlength=size).astype("int32").reshape((len(groups),) + SHAPE)
+    goals = np.bincount(cells[is_goal], minlength=size).astype("int32").reshape((len(groups),) + SHAPE)
+    return {group: ShotDensity(shots[i], goals[i]) for i, group in enumerate(groups)}
+
+
+def save_densities(path, densities_by_name):
+    """store groups of densities in one npz file, i.e., {"R|shooter_id": {"8478402": density}}"""
+    arrays = {}
+    for name, densities in densities_by_name.items():
+        keys = list(densities)
+        arrays[f"{name}|keys"] = np.array(keys, dtype=str)
+        arrays[f"{name}|shots"] = np.stack([densities[key].shots for key in keys]) if keys else np.zeros((0,) + SHAPE, dtype="int32")
+        arrays[f"{name}|goals"] = np.stack([densities[key].goals for key in keys]) if keys else np.zeros((0,) + SHAPE, dtype="int32")
+    with atomic_path(path) as tmp_path:
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+
+
+def load_densities(path, name, keys=None):
+    """read back the densities of a group stored by save_densities, only the given keys if any"""
+    with np.load(path) as npz:
+        if f"{name}|keys" not in npz.files:
+            return {}
+        stored_keys = npz[f"{name}|keys"].tolist()
+        positions = range(len(stored_keys)) if keys is None else [stored_keys.index(key) for key in keys if key in stored_keys]
+        if not positions:
+            return {}
+        shots, goals = npz[f"{name}|shots"], npz[f"{name}|goals"]
+        return {stored_keys[i]: ShotDensity(shots[i], goals[i]) for i in positions}
+
+
+@CHART_BUILD.timed(chart="shot_density")
+def display_shot_density(density, goals=False):
+    """heatmap of the shots (or goals) of a density over the rink"""
+    counts = density.goals if goals else density.shots
+    fig = go.Figure(
+        go.Heatmap(
+            x=(X_EDGES[:-1] + X_EDGES[1:]) / 2,
+            y=(Y_EDGES[:-1] + Y_EDGES[1:]) / 2,
+            # heatmap rows are y values
+            z=np.where(counts > 0, counts, np.nan).T,
+            colorscale="YlOrRd",
+            opacity=0.75,
+            zsmooth="best",
+            hovertemplate="X: %{x}<br>Y: %{y}<br>" + ("Goals" if goals else "Shots") + ": %{z}<extra></extra>",
+        )
+    )
+
+    fig.update_layout(
+        xaxis=dict(
+            range=[-100, 100],
+            showgrid=False,
+            zeroline=False,
+        ),
+        yaxis=dict(
+            range=[-43, 43],
+            scaleanchor="x",
+            scaleratio=1,
+            showgrid=False,
+            zeroline=False,
+        )
+    )
+
+    fig.add_layout_image(
+        dict(
+            source="https://raw.githubusercontent.com/zilto/nice-play/main/src/assets/full_rink_c.png",
+            xref="x",
+            yref="y",
+            x=-100,
+            y=43,
+            sizex=200,
+            sizey=86,
+            sizing="stretch",
+            opacity=1,
+            layer="below"
+        )
+    )
+
+    return fig
@@ -0,0 +1,123 @@
+"""Batch extraction of shot features for whole seasons.
+    python feature_job.py --start-years 2020 2021 --output ./features
+
+Games are split across a process pool and the features are written as one parquet
+file per partition: <output>/game_season=<season>/game_type=<type>/features.parquet
+Each partition keeps a manifest of the game feeds it was built from (the
+metaData.timeStamp of each feed), so a rerun only rebuilds the partitions whose
+games changed (or were not finished).
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from data_query import ApiEngine, ApiError, STORAGE_PATH, schedule_to_gamePks
+from features import FeaturePipeline
+from utils import games_to_df, gamePk_to_season_and_type, compact_plays_df
+
+
+GAMES_PER_TASK = 50
+ID_COLUMNS = ["gamePk", "game_season", "game_type", "event_idx", "event_type_id"]
+
+
+def extract_features(storage_path, gamePks):
+    """compute the advanced features of games already downloaded under storage_path;
+    returns the features and the names of the dummy columns"""
+    api_engine = ApiEngine(storage_path)
+    plays_df = games_to_df([api_engine.load_game(gamePk, selective=True) for gamePk in gamePks], augment=True)
+    # the ids of the features, sent back to the parent process, are small ints and categories
+    plays_df, _ = compact_plays_df(plays_df)
+    pipeline = FeaturePipeline(plays_df)
+    features_df = pd.concat([plays_df[ID_COLUMNS], pipeline.transform(), pipeline.transform(["is_goal"])], axis=1)
+    return features_df, pipeline.dummy_columns
+
+
+def _partition_dir(output_path, game_season, game_type):
+    return os.path.join(output_path, f"game_season={game_season}", f"game_type={game_type}")
+
+
+def _read_manifest(partition_dir):
+    try:
+        with open(os.path.join(partition_dir, "_manifest.json"), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_partition(partition_dir, chunks, manifest):
+    features_df = pd.concat([features_df for features_df, _ in chunks], ignore_index=True)
+    # a dummy column is missing from the chunks where its value never occurs
+    dummy_columns = sorted(set(column for _, columns in chunks for column in columns))
+    features_df[dummy_columns] = features_df[dummy_columns].fillna(0).astype("uint8")
+    features_df = features_df.sort_values(["gamePk", "event_idx"], ignore_index=True)
+    # game_season and game_type are stored in the partition path
+    features_df = features_df.drop(columns=["game_season", "game_type"])
+
+    os.makedirs(partition_dir, exist_ok=True)
+    tmp_path = os.path.join(partition_dir, "features.parquet.tmp")
+    features_df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, os.path.join(partition_dir, "features.parquet"))
+    # the manifest is written last: a partition without it is rebuilt
+    with open(os.path.join(partition_dir, "_manifest.json"), "w") as f:
+        json.dump(manifest, f)
+
+
+def run(start_years, output_path, storage_path=STORAGE_PATH, max_workers=None, games_per_task=GAMES_PER_TASK):
+    """extract the features of every game of the given seasons into output_path"""
+    api_engine = ApiEngine(storage_path)
+
+    partitions = {}
+    # gamePk -> version of its feed, which stays the same when the feed is fetched again
+    stamps = {}
+    for start_year in start_years:
+        gamePks = schedule_to_gamePks(api_engine.load_season_schedule(start_year))
+        try:
+            for gamePk, game_json in api_engine.download_games(gamePks, selective=True, progress=lambda n, total: print(f"\r{start_year}: downloaded {n}/{total}", end="")):
+                stamps[gamePk] = game_json["metaData"]["timeStamp"]
+        except ApiError as e:
+            print(f"\n{e}")
+        print()
+        for gamePk in gamePks:
+            partitions.setdefault(gamePk_to_season_and_type(gamePk), []).append(gamePk)
+
+    stale = {}
+    for (game_season, game_type), gamePks in partitions.items():
+        # games that could not be downloaded are left out until the next run
+        manifest = {str(gamePk): stamps[gamePk] for gamePk in gamePks if gamePk in stamps}
+        partition_dir = _partition_dir(output_path, game_season, game_type)
+        if manifest and _read_manifest(partition_dir) != manifest:
+            stale[partition_dir] = manifest
+        else:
+            print(f"{partition_dir}: up to date")
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        tasks = {}
+        for partition_dir, manifest in stale.items():
+            gamePks = [int(gamePk) for gamePk in manifest]
+            for i in range(0, len(gamePks), games_per_task):
+                future = executor.submit(extract_features, storage_path, gamePks[i:i+games_per_task])
+                tasks[future] = partition_dir
+
+        n_tasks = {partition_dir: list(tasks.values()).count(partition_dir) for partition_dir in stale}
+        chunks = {partition_dir: [] for partition_dir in stale}
+        for future in as_completed(tasks):
+            partition_dir = tasks[future]
+            chunks[partition_dir].append(future.result())
+            if len(chunks[partition_dir]) == n_tasks[partition_dir]:
+                _write_partition(partition_dir, chunks.pop(partition_dir), stale[partition_dir])
+                print(f"{partition_dir}: rebuilt from {len(stale[partition_dir])} games")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract shot features for whole seasons.")
+    parser.add_argument("--start-years", type=int, nargs="+", required=True, help="first year of each season (i.e., 2021 for 2021-2022)")
+    parser.add_argument("--output", default="./features", help="directory of the partitioned features")
+    parser.add_argument("--storage-path", default=STORAGE_PATH, help="storage_path of the ApiEngine cache")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: number of CPUs)")
+    parser.add_argument("--games-per-task", type=int, default=GAMES_PER_TASK)
+    args = parser.parse_args()
+
+    run(args.start_years, args.output, storage_path=args.storage_path, max_workers=args.workers, games_per_task=args.games_per_task)
@@ -1,190 +1,249 @@
+from functools import cached_property
+
 import pandas as pd
 import numpy as np
 
 
-def normalize_plays_coords(plays_df, x_col="x_coord", y_col="y_coord", period=True, side=True):
-    def normalize_period_coords(plays_df, x_col="x_coord", y_col="y_coord"):
-        #mask for even periods
-        mask = (plays_df["period_idx"]%2==0)
-        plays_df.loc[mask, f"{x_col}_norm"] = -plays_df[f"{x_col}"]
-        plays_df.loc[mask, f"{y_col}_norm"] = -plays_df[f"{y_col}"]
-        return plays_df
-
-    def normalize_side_coords(plays_df, x_col="x_coord", y_col="y_coord"):
-        negative_side_df = plays_df.groupby(["gamePk", "team_initiative_id"]).filter(lambda x: x[f"{x_col}_norm"].mean() < 0)
-        plays_df.loc[negative_side_df.index, f"{x_col}_norm"] = -negative_side_df[f"{x_col}_norm"]
-        plays_df.loc[negative_side_df.index, f"{y_col}_norm"] = -negative_side_df[f"{y_col}_norm"]
-        return plays_df
-    
-    plays_df[[f"{x_col}_norm", f"{y_col}_norm"]] = plays_df[[f"{x_col}", f"{y_col}"]].copy()
+NET_POS = np.array([100-11, 0])
+
+
+def _to_float(series):
+    return series.to_numpy(dtype="float64", na_value=np.nan)
+
+
+def normalized_coords(plays_df, x_col="x_coord", y_col="y_coord", period=True, side=True):
+    """return the normalized x and y coordinates as numpy arrays (see normalize_plays_coords)"""
+    x_norm = plays_df[x_col].to_numpy(dtype="float64", na_value=np.nan, copy=True)
+    y_norm = plays_df[y_col].to_numpy(dtype="float64", na_value=np.nan, copy=True)
+
     if period:
-        plays_df = normalize_period_coords(plays_df, x_col=x_col, y_col=y_col)
+        #mask for even periods
+        mask = (plays_df["period_idx"] % 2 == 0).to_numpy()
+        x_norm[mask] = -x_norm[mask]
+        y_norm[mask] = -y_norm[mask]
+
     if side:
-        plays_df = normalize_side_coords(plays_df, x_col=x_col, y_col=y_col)
+        side_mean = (
+            pd.Series(x_norm, index=plays_df.index)
+            .groupby([plays_df["gamePk"], plays_df["team_initiative_id"]], sort=False, observed=True)
+            .transform("mean")
+        )
+        mask = (side_mean < 0).to_numpy()
+        x_norm[mask] = -x_norm[mask]
+        y_norm[mask] = -y_norm[mask]
+
+    return x_norm, y_norm
+
+
+def normalize_plays_coords(plays_df, x_col="x_coord", y_col="y_coord", period=True, side=True, inplace=False):
+    """add `{x_col}_norm` and `{y_col}_norm` columns:
+    - period: flip the coordinates of even periods, when teams switch sides
+    - side: flip the plays of teams that attack the negative side on average over the game
+    The columns are added to a copy of plays_df, or to plays_df itself if inplace=True.
+    """
+    x_norm, y_norm = normalized_coords(plays_df, x_col=x_col, y_col=y_col, period=period, side=side)
+    if not inplace:
+        plays_df = plays_df.copy()
+    plays_df[f"{x_col}_norm"] = x_norm
+    plays_df[f"{y_col}_norm"] = y_norm
     return plays_df
 
 
+def _clock_seconds(period_time):
+    """convert a column of MM:SS period times to seconds;
+    a period has at most 1200 distinct times, so only the unique values are parsed"""
+    codes, uniques = pd.factorize(period_time)
+    seconds = (pd.to_datetime(uniques, format="%M:%S") - pd.to_datetime("1900-01-01")).total_seconds()
+    # missing times have code -1, which picks the trailing NaN
+    seconds = np.append(seconds.to_numpy(), np.nan)
+    return pd.Series(seconds[codes], index=period_time.index)
 
-def basic_features(plays_df):
-    plays_df = normalize_plays_coords(plays_df)
-    dist_from_net = _dist_from_net(plays_df)
-    angle_from_net = _angle_from_net(plays_df)
-    is_goal = _is_goal(plays_df)
-    empty_net = _empty_net(plays_df)
-           
-    features_df = pd.concat([dist_from_net, angle_from_net, is_goal, empty_net], axis=1)
-    return features_df
-
-
-def _dist_from_net(plays_df):
-    net_pos = np.array([100-11, 0])
-    shot_vector = net_pos - plays_df[["x_coord_norm", "y_coord_norm"]]
-    dist_from_net = np.linalg.norm(shot_vector, ord=2, axis=1)
-    return pd.Series(dist_from_net, name="dist_from_net", index=plays_df.index)
-
-
-def _angle_from_net(plays_df, x_col="x_coord", y_col="y_coord"):
-    normalize_plays_coords(plays_df, x_col=x_col, y_col=y_col)
-    net_pos = np.array([100-11, 0])
-    shot_vector = net_pos - plays_df[[f"{x_col}_norm", f"{y_col}_norm"]]
-    cos_angle = shot_vector @ net_pos / (np.linalg.norm(net_pos, ord=2) * np.linalg.norm(shot_vector, ord=2, axis=1))
-    angle = np.degrees(np.arccos(cos_angle))
-    
-    plays_df["angle_from_net"] = pd.Series(angle, name="angle_from_net", index=plays_df.index)
-    plays_df.loc[plays_df[f"{y_col}_norm"]<0, "angle_from_net"] = -plays_df.angle_from_net
-    return pd.Series(plays_df.angle_from_net, name="angle_from_net", index=plays_df.index)
 
+def _elapsed_seconds(period_idx, game_type, period_seconds):
+    """add the length of the completed periods to the seconds elapsed in the current period"""
+    # small integer periods (see utils.compact_plays_df) would overflow
+    period_idx = period_idx.astype("int64")
+    previous_periods_seconds = (period_idx - 1) * 1200
+    overtime_mask = (period_idx - 1 > 3)
+    playoff_mask = (game_type == "P")
+    # 5 min overtime during the regular season, 20 min overtime during playoffs
+    previous_periods_seconds += np.where(overtime_mask & ~playoff_mask, (period_idx - 4) * 300, 0)
+    previous_periods_seconds += np.where(overtime_mask & playoff_mask, (period_idx - 4) * 1200, 0)
+    return np.round(period_seconds + previous_periods_seconds)
 
-def _is_goal(plays_df):
-    str_to_int = {"SHOT": 0, "GOAL": 1}
-    is_goal = plays_df.event_type_id.replace(str_to_int)
-    return pd.Series(is_goal, name="is_goal", index=plays_df.index)
 
+def _game_seconds(plays_df):
+    period_seconds = _clock_seconds(plays_df["period_time"])
+    seconds_elapsed = _elapsed_seconds(plays_df["period_idx"], plays_df["game_type"], period_seconds)
+    return pd.Series(seconds_elapsed, name="seconds_elapsed", index=plays_df.index)
 
-def _empty_net(plays_df):
-    return pd.Series(plays_df.empty_net_bool.astype(float), name="empty_net", index=plays_df.index)
 
+def _angle_from_net(x_norm, y_norm):
+    shot_vector = NET_POS - np.column_stack([x_norm, y_norm])
+    cos_angle = shot_vector @ NET_POS / (np.linalg.norm(NET_POS, ord=2) * np.linalg.norm(shot_vector, ord=2, axis=1))
+    angle = np.degrees(np.arccos(cos_angle))
+    return np.where(y_norm < 0, -angle, angle)
+
+
+class FeaturePipeline:
+    """Compute shot features from a plays DataFrame (utils.game_to_df; use augment=True
+    for the features based on the previous event).
+    Intermediate values such as the normalized coordinates, the clock seconds and
+    the same period mask are computed once and shared between features.
+    plays_df is never modified.
+        pipeline = FeaturePipeline(plays_df)
+        features_df = pipeline.transform(["dist_from_net", "angle_from_net"])
+    """
+    BASIC_FEATURES = ["dist_from_net", "angle_from_net", "is_goal", "empty_net"]
+    ADVANCED_FEATURES = [
+        "seconds_elapsed", "coords", "dist_from_net", "angle_from_net", "shot_type", "empty_net",
+        "previous_event_type", "previous_x_coord", "previous_y_coord", "seconds_from_previous",
+        "dist_from_previous", "rebound", "angle_change", "speed",
+    ]
+    # one-hot encoded: their columns are the values that occur in plays_df
+    DUMMY_FEATURES = ["shot_type", "previous_event_type"]
+
+    def __init__(self, plays_df):
+        self.plays_df = plays_df
+        self.index = plays_df.index
+
+    def transform(self, features=None):
+        """return a DataFrame with the requested features (default: ADVANCED_FEATURES);
+        `shot_type`, `previous_event_type` and `coords` expand to several columns"""
+        if features is None:
+            features = self.ADVANCED_FEATURES
+        return pd.concat([getattr(self, f"_feature_{name}")() for name in features], axis=1)
+
+    @property
+    def dummy_columns(self):
+        """names of the columns of DUMMY_FEATURES"""
+        return [column for name in self.DUMMY_FEATURES for column in getattr(self, f"{name}_dummies").columns]
+
+    # intermediate values
+    @cached_property
+    def coords_norm(self):
+        return normalized_coords(self.plays_df)
+
+    @cached_property
+    def previous_coords_norm(self):
+        return normalized_coords(self.plays_df, x_col="previous_event_x_coord", y_col="previous_event_y_coord")
+
+    @cached_property
+    def period_seconds(self):
+        return _clock_seconds(self.plays_df["period_time"])
+
+    @cached_property
+    def previous_period_seconds(self):
+        return _clock_seconds(self.plays_df["previous_event_period_time"])
+
+    @cached_property
+    def period_mask(self):
+        """the previous event happened in the same period"""
+        same_period = self.plays_df["period_idx"] == self.plays_df["previous_event_period"]
+        return same_period.to_numpy(dtype=bool, na_value=False)
+
+    @cached_property
+    def angle_from_net(self):
+        return _angle_from_net(*self.coords_norm)
+
+    @cached_property
+    def dist_from_previous(self):
+        movement_x = _to_float(self.plays_df["x_coord"]) - _to_float(self.plays_df["previous_event_x_coord"])
+        movement_y = _to_float(self.plays_df["y_coord"]) - _to_float(self.plays_df["previous_event_y_coord"])
+        dists = np.linalg.norm(np.column_stack([movement_x, movement_y]), ord=2, axis=1)
+        return pd.Series(np.where(self.period_mask, dists, np.nan), name="dist_from_previous", index=self.index)
+
+    @cached_property
+    def seconds_from_previous(self):
+        time_diff = np.round(self.period_seconds - self.previous_period_seconds).where(self.period_mask)
+        return pd.Series(time_diff, name="seconds_from_previous", index=self.index)
+
+    @cached_property
+    def rebound(self):
+        rebound_mask = self.plays_df["previous_event_type"].isin(["SHOT", "GOAL"]).to_numpy()
+        return pd.Series(np.where(self.period_mask & rebound_mask, 1, 0), name="rebound", index=self.index)
+
+    @cached_property
+    def shot_type_dummies(self):
+        shot_type = self.plays_df["shot_type"]
+        if isinstance(shot_type.dtype, pd.CategoricalDtype):
+            # one column per shot type that occurs, as for strings
+            shot_type = shot_type.cat.remove_unused_categories()
+        return pd.get_dummies(shot_type)
+
+    @cached_property
+    def previous_event_type_dummies(self):
+        previous_event = self.plays_df["previous_event_type"].astype(object).where(self.period_mask)
+        previous_event = previous_event.replace({"GAME_OFFICIAL":"OTHER", "PERIOD_END":"OTHER", "PERIOD_READY":"OTHER", "CHALLENGE":"OTHER"})
+        return pd.get_dummies(previous_event)
+
+    # features
+    def _feature_seconds_elapsed(self):
+        seconds_elapsed = _elapsed_seconds(self.plays_df["period_idx"], self.plays_df["game_type"], self.period_seconds)
+        return pd.Series(seconds_elapsed, name="seconds_elapsed", index=self.index)
+
+    def _feature_coords(self):
+        x_norm, y_norm = self.coords_norm
+        coords_df = pd.DataFrame({
+            "period_idx": self.plays_df["period_idx"].astype("int64"),
+            "x_coord": _to_float(self.plays_df["x_coord"]),
+            "y_coord": _to_float(self.plays_df["y_coord"]),
+        }, index=self.index)
+        coords_df["x_coord_norm"] = x_norm
+        coords_df["y_coord_norm"] = y_norm
+        return coords_df
+
+    def _feature_dist_from_net(self):
+        shot_vector = NET_POS - np.column_stack(self.coords_norm)
+        dist_from_net = np.linalg.norm(shot_vector, ord=2, axis=1)
+        return pd.Series(dist_from_net, name="dist_from_net", index=self.index)
+
+    def _feature_angle_from_net(self):
+        return pd.Series(self.angle_from_net, name="angle_from_net", index=self.index)
+
+    def _feature_is_goal(self):
+        is_goal = (self.plays_df["event_type_id"] == "GOAL").astype("int64")
+        return pd.Series(is_goal, name="is_goal", index=self.index)
+
+    def _feature_empty_net(self):
+        return pd.Series(_to_float(self.plays_df["empty_net_bool"]), name="empty_net", index=self.index)
+
+    def _feature_shot_type(self):
+        return self.shot_type_dummies
+
+    def _feature_previous_event_type(self):
+        return self.previous_event_type_dummies
+
+    def _feature_previous_x_coord(self):
+        previous_x = pd.Series(_to_float(self.plays_df["previous_event_x_coord"]), index=self.index).fillna(0).where(self.period_mask)
+        return pd.Series(previous_x, name="previous_x_coord", index=self.index)
+
+    def _feature_previous_y_coord(self):
+        previous_y = pd.Series(_to_float(self.plays_df["previous_event_y_coord"]), index=self.index).fillna(0).where(self.period_mask)
+        return pd.Series(previous_y, name="previous_y_coord", index=self.index)
+
+    def _feature_seconds_from_previous(self):
+        return self.seconds_from_previous
+
+    def _feature_dist_from_previous(self):
+        return self.dist_from_previous
+
+    def _feature_rebound(self):
+        return self.rebound
+
+    def _feature_angle_change(self):
+        previous_angle = _angle_from_net(*self.previous_coords_norm)
+        angle_change = np.where(self.rebound == 1, self.angle_from_net - previous_angle, 0)
+        return pd.Series(angle_change, name="angle_change", index=self.index).fillna(0)
+
+    def _feature_speed(self):
+        speed = self.dist_from_previous / self.seconds_from_previous
+        return pd.Series(speed, name="speed", index=self.index).replace([np.inf, -np.inf, np.nan], 0)
 
-def advanced_features(plays_df):
-    plays_df = normalize_plays_coords(plays_df)
-    
-    subset_df = plays_df[["period_idx", "x_coord", "y_coord", "x_coord_norm", "y_coord_norm"]]
-    
-    seconds_elapsed = _game_seconds(plays_df)
-    dist_from_net = _dist_from_net(plays_df)
-    angle_from_net = _angle_from_net(plays_df)
-    shot_type = _shot_type(plays_df)
-    empty_net = _empty_net(plays_df)
-    previous_event_type = _previous_event_type(plays_df)
-    previous_x = _previous_x_coords(plays_df)
-    previous_y = _previous_y_coords(plays_df)
-    seconds_from_previous = _seconds_from_previous(plays_df)
-    dist_from_previous = _dist_from_previous(plays_df)
-    rebound = _is_rebound(plays_df)
-    angle_change = _angle_change(plays_df)
-    speed = dist_from_previous / seconds_from_previous 
-    speed = pd.Series(speed, name="speed", index=plays_df.index).replace([np.inf, -np.inf, np.nan], 0)
-    
-    features_df = pd.concat([
-        seconds_elapsed,
-        subset_df,
-        dist_from_net,
-        angle_from_net,
-        shot_type,
-        empty_net,
-        previous_event_type, 
-        previous_x, previous_y,
-        seconds_from_previous,
-        dist_from_previous,
-        rebound,
-        angle_change,
-        speed,
-        ],
-        axis=1
-    )
-    
-    return features_df
 
+def basic_features(plays_df):
+    return FeaturePipeline(plays_df).transform(FeaturePipeline.BASIC_FEATURES)
 
-def _game_seconds(plays_df):
-    plays_df["period_time"] = pd.to_datetime(plays_df["period_time"], format="%M:%S")
-    plays_df["period_seconds"] = (plays_df["period_time"] - pd.to_datetime("1900-01-01")).dt.total_seconds()
-    
-    regular_period_mask = (plays_df["period_idx"] - 1 <= 3)
-    plays_df.period_seconds.loc[regular_period_mask] += (plays_df["period_idx"] - 1) * 1200
-    
-    regular_overtime_mask = (plays_df["period_idx"] - 1 > 3) & (plays_df["game_type"] != "P")
-    plays_df.period_seconds.loc[regular_overtime_mask] += (plays_df["period_idx"] - 1) * 1200
-    plays_df.period_seconds.loc[regular_overtime_mask] += (plays_df["period_idx"] - 4) * 300
-    
-    playoff_overtime_mask = (plays_df["period_idx"] - 1 > 3) & (plays_df["game_type"] == "P")
-    plays_df.period_seconds.loc[playoff_overtime_mask] += (plays_df["period_idx"] - 1) * 1200
-    plays_df.period_seconds.loc[playoff_overtime_mask] += (plays_df["period_idx"] - 4) * 1200
-    
-    # if plays_df["period_idx"] - 1 <= 3:
-    #     previous_periods_seconds = (plays_df["period_idx"] - 1) * 1200
-    # if plays_df["period_idx"] - 1 > 3:
-    #     previous_periods_seconds = 3 * 1200 # 3 full periods
-    #     n_overtime_completed = plays_df["period_idx"] - 4
-    #     if plays_df["game_type"] == "P":
-    #         previous_periods_seconds += n_overtime_completed * 1200 # 20 min overtime during playoffs
-    #     else:
-    #         previous_periods_seconds += n_overtime_completed * 300 # 3 min overtime during playoffs
-    
-    #seconds_elapsed = np.round(period_seconds + previous_periods_seconds)
-    return pd.Series(np.round(plays_df.period_seconds), name="seconds_elapsed", index=plays_df.index)
-
-
-def _shot_type(plays_df):
-    return pd.get_dummies(plays_df.shot_type)
-
-
-def _previous_event_type(plays_df):
-    period_mask = (plays_df.period_idx == plays_df.previous_event_period)
-    previous_event = pd.Series(plays_df.loc[period_mask, "previous_event_type"], name="previous_event_type", index=plays_df.index)
-    previous_event = previous_event.replace({"GAME_OFFICIAL":"OTHER", "PERIOD_END":"OTHER", "PERIOD_READY":"OTHER", "CHALLENGE":"OTHER"})
-    return pd.get_dummies(previous_event)
-
-
-def _previous_x_coords(plays_df):
-    period_mask = (plays_df.period_idx == plays_df.previous_event_period)
-    previous_x = plays_df.loc[period_mask, "previous_event_x_coord"].fillna(0)
-    return pd.Series(previous_x, name="previous_x_coord", index=plays_df.index)
-
-
-def _previous_y_coords(plays_df):
-    period_mask = (plays_df.period_idx == plays_df.previous_event_period)
-    previous_y = plays_df.loc[period_mask, "previous_event_y_coord"].fillna(0)
-    return pd.Series(previous_y, name="previous_y_coord", index=plays_df.index)
-
-
-def _seconds_from_previous(plays_df):
-    plays_df["period_time"] = pd.to_datetime(plays_df["period_time"], format="%M:%S")
-    plays_df["previous_event_period_time"] = pd.to_datetime(plays_df["previous_event_period_time"], format="%M:%S")
-    period_mask = (plays_df.period_idx == plays_df.previous_event_period)
-    time_diff = (plays_df.loc[period_mask,"period_time"] - plays_df.loc[period_mask,"previous_event_period_time"]).dt.total_seconds()
-    return pd.Series(np.round(time_diff), name="seconds_from_previous", index=plays_df.index)
-
-
-def _dist_from_previous(plays_df):
-    period_mask = (plays_df.period_idx == plays_df.previous_event_period)
-    movement_vector = plays_df.loc[period_mask, ["x_coord", "y_coord"]] - plays_df.loc[period_mask, ["previous_event_x_coord", "previous_event_y_coord"]].values
-    dists = np.linalg.norm(movement_vector, ord=2, axis=1)
-    return pd.Series(dists, name="dist_from_previous", index=movement_vector.index)
-
-
-def _is_rebound(plays_df):
-    period_mask = (plays_df.period_idx == plays_df.previous_event_period)
-    rebound_mask = (plays_df.previous_event_type.isin(["SHOT", "GOAL"]))
-    plays_df["rebound"] = np.where(period_mask & rebound_mask, 1, 0)
-    return pd.Series(plays_df.rebound, name="rebound", index=plays_df.index)
-
-
-def _angle_change(plays_df):
-    plays_df = normalize_plays_coords(plays_df, x_col="previous_event_x_coord", y_col="previous_event_y_coord")
-    current_angle = _angle_from_net(plays_df).copy()
-    previous_angle = _angle_from_net(plays_df, x_col="previous_event_x_coord", y_col="previous_event_y_coord").rename("prev_angle").copy()
-    plays_df["rebound"] = _is_rebound(plays_df)
-    plays_df.loc[plays_df.rebound==1, "angle_change"] = current_angle - previous_angle
-    plays_df.angle_change = plays_df.angle_change.fillna(0)
-    return pd.Series(plays_df.angle_change, name="angle_change", index=plays_df.index)
+
+def advanced_features(plays_df):
+    return FeaturePipeline(plays_df).transform(FeaturePipeline.ADVANCED_FEATURES)
@@ -0,0 +1,170 @@
+"""Incremental updates of games in progress.
+
+The feed of a live game is downloaded once. Each refresh then fetches only the
+changes since the last timestamp (feed/live/diffPatch, a list of JSON patches),
+applies them to the feed and parses only the plays they touched.
+"""
+import copy
+import re
+
+import pandas as pd
+
+from utils import game_to_df, index_plays_by_event_idx
+
+
+ALL_PLAYS_PATH = re.compile(r"^/liveData/plays/allPlays/(\d+|-)(/.*)?$")
+
+
+def _split_pointer(path):
+    """split a JSON pointer (RFC 6901) into its unescaped keys"""
+    return [key.replace("~1", "/").replace("~0", "~") for key in path.split("/")[1:]]
+
+
+def _resolve(document, keys):
+    for key in keys:
+        document = document[int(key)] if isinstance(document, list) else document[key]
+    return document
+
+
+def _add(parent, key, value):
+    if isinstance(parent, list):
+        if key == "-":
+            parent.append(value)
+        else:
+            parent.insert(int(key), value)
+    else:
+        parent[key] = value
+
+
+def _remove(parent, key):
+    if isinstance(parent, list):
+        return parent.pop(int(key))
+    return parent.pop(key)
+
+
+def apply_patch(document, operations):
+    """apply JSON patch operations (RFC 6902) to the document in place"""
+    for operation in operations:
+        keys = _split_pointer(operation["path"])
+        if not keys:
+            raise ValueError("patching the whole document is not supported")
+        parent = _resolve(document, keys[:-1])
+        op = operation["op"]
+        if op == "add":
+            _add(parent, keys[-1], operation["value"])
+        elif op == "replace":
+            if isinstance(parent, list):
+                parent[int(keys[-1])] = operation["value"]
+            else:
+                parent[keys[-1]] = operation["value"]
+        elif op == "remove":
+            _remove(parent, keys[-1])
+        elif op in ("move", "copy"):
+            from_keys = _split_pointer(operation["from"])
+            from_parent = _resolve(document, from_keys[:-1])
+            if op == "move":
+                value = _remove(from_parent, from_keys[-1])
+            else:
+                value = copy.deepcopy(_resolve(from_parent, from_keys[-1:]))
+            _add(parent, keys[-1], value)
+        elif op == "test":
+            if _resolve(parent, keys[-1:]) != operation["value"]:
+                raise ValueError(f"JSON patch test failed at {operation['path']}")
+        else:
+            raise ValueError(f"unknown JSON patch operation '{op}'")
+    return document
+
+
+def _shifts_plays(operation, match, n_plays):
+    """whether an operation moves plays seen before the refresh to other positions of allPlays"""
+    if operation["op"] == "move" and ALL_PLAYS_PATH.match(operation["from"]):
+        return True
+    if match is None or match.group(2) is not None:
+        return False
+    if operation["op"] in ("remove", "move"):
+        return True
+    # plays appended after the ones seen are parsed as new plays
+    return operation["op"] in ("add", "copy") and match.group(1) != "-" and int(match.group(1)) < n_plays
+
+
+class LiveGame:
+    """Plays of a game in progress, kept up to date from the changes of the feed.
+        live_game = LiveGame(api_engine, gamePk)
+        new_df, changed = live_game.refresh()
+    `plays_df` holds the shots parsed with game_to_df(augment=True).
+    A game_json passed in is copied, since patches modify the feed in place; its plays
+    can be passed already parsed as `plays_df`, which is replaced but never modified.
+    """
+    def __init__(self, api_engine, gamePk, game_json=None, plays_df=None):
+        self.api_engine = api_engine
+        self.gamePk = gamePk
+        self._reset(api_engine.load_game(gamePk) if game_json is None else copy.deepcopy(game_json), plays_df)
+
+    def _reset(self, game_json, plays_df=None):
+        self.game_json = game_json
+        self.all_plays = game_json["liveData"]["plays"]["allPlays"]
+        self.plays_index = index_plays_by_event_idx(self.all_plays)
+        self.plays_df = game_to_df(game_json, augment=True) if plays_df is None else plays_df
+
+    @property
+    def timecode(self):
+        return self.game_json["metaData"]["timeStamp"]
+
+    @property
+    def last_event_idx(self):
+        """eventIdx of the last play seen, -1 before the first one"""
+        return self.all_plays[-1]["about"]["eventIdx"] if self.all_plays else -1
+
+    @property
+    def is_final(self):
+        return self.game_json["gameData"]["status"]["abstractGameState"] == "Final"
+
+    def refresh(self):
+        """apply the changes of the feed since the last refresh.
+        Returns the shots that were appended and whether earlier plays changed;
+        when they did, plays_df is updated too and charts should be redrawn from it.
+        """
+        n_plays_before = len(self.all_plays)
+        patches = self.api_engine.get_game_diff(self.gamePk, self.timecode)
+        if not patches:
+            return self.plays_df.iloc[:0], False
+
+        touched = set()
+        for patch in patches:
+            for operation in patch["diff"]:
+                match = ALL_PLAYS_PATH.match(operation["path"])
+                # plays inserted, removed or moved shift the list: parse the whole game again
+                if _shifts_plays(operation, match, n_plays_before):
+                    game_json = self.api_engine.query_api(f"game/{self.gamePk}/feed/live")
+                    self.api_engine.update_game(game_json)
+                    self._reset(game_json)
+                    return self.plays_df, True
+                if match and match.group(1) != "-":
+                    touched.add(int(match.group(1)))
+            apply_patch(self.game_json, patch["diff"])
+        self.api_engine.update_game(self.game_json)
+
+        new_plays = self.all_plays[n_plays_before:]
+        for play_json in new_plays:
+            self.plays_index[play_json["about"]["eventIdx"]] = play_json
+
+        # a changed play also changes the previous event columns of the play after it
+        changed_positions = {i for i in touched if i < n_plays_before}
+        changed_positions |= {i + 1 for i in changed_positions if i + 1 < n_plays_before}
+        changed_plays = [self.all_plays[i] for i in sorted(changed_positions)]
+        for play_json in changed_plays:
+            self.plays_index[play_json["about"]["eventIdx"]] = play_json
+
+        new_df = game_to_df(self.game_json, augment=True, play_json_list=new_plays, plays_index=self.plays_index)
+        changed = False
+        if changed_plays:
+            changed_df = game_to_df(self.game_json, augment=True, play_json_list=changed_plays, plays_index=self.plays_index)
+            changed_idx = [play_json["about"]["eventIdx"] for play_json in changed_plays]
+            plays_df = self.plays_df[~self.plays_df["event_idx"].isin(changed_idx)]
+            self.plays_df = pd.concat([plays_df, changed_df], ignore_index=True).sort_values("event_idx", ignore_index=True)
+            changed = True
+
+        # an empty frame has no dtypes, it would turn the integer columns into floats
+        if not new_df.empty:
+            self.plays_df = pd.concat([self.plays_df, new_df], ignore_index=True)
+        return new_df, changed
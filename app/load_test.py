@@ -0,0 +1,138 @@
+"""Concurrent sessions moving through the pages of the app, timed in one process.
+    python load_test.py --mock --latency 0.05 --sessions 20 --steps 8
+    python load_test.py --base-url http://localhost:8000/api/v1 --sessions 50 --output load.json
+
+Each session is a thread opening pages of the MultiApp one after the other, as Streamlit
+runs the script of each browser session on a thread of the server process: sessions share
+the memoized results and the on-disk cache (a fresh one under a temporary directory unless
+--storage-path is given), and compete for the same GIL. The page functions run outside of
+`streamlit run`, so widgets return their default value and nothing is sent to a browser:
+render times cover loading, parsing and building the charts of each page, not the transfer.
+With --mock, the API is mock_api.py served in the same process (see its latency options).
+
+The report gives the p50/p95/p99 render time of each page and of all of them, and the
+throughput in renders per second.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+
+# same pages as app.py
+PAGES = [
+    ("Home", "pages.home"),
+    ("Game Explorer", "pages.game"),
+    ("Player Drilldown", "pages.player"),
+    ("Team Records", "pages.team"),
+]
+PERCENTILES = [50, 95, 99]
+
+
+def run_session(pages, steps, seed, renders, errors):
+    """open `steps` pages picked at random, starting from the first one;
+    append (page, seconds) to renders and (page, error) to errors"""
+    from app_multipage import MultiApp
+    try:
+        from streamlit.runtime.scriptrunner import StopException, RerunException
+    except ImportError:
+        from streamlit.script_runner import StopException, RerunException
+
+    rnd = random.Random(seed)
+    title, func = pages[0]
+    for _ in range(steps):
+        start = time.perf_counter()
+        try:
+            MultiApp._load(title, func)()
+        except (StopException, RerunException):
+            # st.stop and st.experimental_rerun end the run of a page
+            pass
+        except Exception as e:
+            errors.append((title, repr(e)))
+        renders.append((title, time.perf_counter() - start))
+        title, func = rnd.choice(pages)
+
+
+def run(pages, sessions, steps, seed=0):
+    """run the sessions concurrently; returns the renders, errors and wall time"""
+    renders, errors = [], []
+    threads = [
+        threading.Thread(target=run_session, args=(pages, steps, seed + i, renders, errors), name=f"session-{i}")
+        for i in range(sessions)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return renders, errors, time.perf_counter() - start
+
+
+def _summary(durations):
+    durations = np.asarray(durations)
+    row = {f"p{q}": float(np.percentile(durations, q)) for q in PERCENTILES}
+    row.update(renders=len(durations), mean=float(durations.mean()), max=float(durations.max()))
+    return row
+
+
+def report(renders, wall_time):
+    """latency percentiles of each page and of every render, and the throughput"""
+    rows = {}
+    for page in dict.fromkeys(title for title, _ in renders):
+        rows[page] = _summary([duration for title, duration in renders if title == page])
+    rows["all pages"] = _summary([duration for _, duration in renders])
+    rows["all pages"]["throughput (renders/s)"] = len(renders) / wall_time
+    return rows
+
+
+def print_report(rows, errors, wall_time):
+    print(f"{'page':20s} {'renders':>8s} " + " ".join(f"{f'p{q} (s)':>9s}" for q in PERCENTILES) + f" {'mean (s)':>9s}")
+    for page, row in rows.items():
+        print(f"{page:20s} {row['renders']:8d} " + " ".join(f"{row[f'p{q}']:9.3f}" for q in PERCENTILES) + f" {row['mean']:9.3f}")
+    print(f"{rows['all pages']['throughput (renders/s)']:.1f} renders/s over {wall_time:.1f}s, {len(errors)} errors")
+    for page, error in errors[:10]:
+        print(f"  {page}: {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the app pages with concurrent sessions.")
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent sessions")
+    parser.add_argument("--steps", type=int, default=8, help="pages opened by each session")
+    parser.add_argument("--pages", nargs="+", choices=[title for title, _ in PAGES], default=[title for title, _ in PAGES])
+    parser.add_argument("--base-url", default=None, help="NHL API base url (default: NHL_API_BASE_URL or the real API)")
+    parser.add_argument("--mock", action="store_true", help="serve mock_api.py in process and use it")
+    parser.add_argument("--latency", type=float, default=0.05, help="latency of the mock API in seconds")
+    parser.add_argument("--jitter", type=float, default=0.05, help="random extra latency of the mock API in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of mock API requests failing with a 503")
+    parser.add_argument("--storage-path", default=None, help="cache directory (default: a new temporary one)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="write the report as JSON")
+    args = parser.parse_args()
+
+    # read when data_query is imported, by the first page that needs it
+    if args.mock:
+        import mock_api
+        server, args.base_url = mock_api.start_server(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    if args.base_url:
+        os.environ["NHL_API_BASE_URL"] = args.base_url
+    os.environ["STORAGE_PATH"] = args.storage_path or tempfile.mkdtemp(prefix="load_test_")
+
+    import streamlit.logger
+    # streamlit warns on every command run outside of `streamlit run`
+    streamlit.logger.set_log_level("error")
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+
+    pages = [page for page in PAGES if page[0] in args.pages]
+    print(f"{args.sessions} sessions x {args.steps} pages, API {os.environ.get('NHL_API_BASE_URL', 'default')}, cache {os.environ['STORAGE_PATH']}")
+    renders, errors, wall_time = run(pages, args.sessions, args.steps, args.seed)
+    rows = report(renders, wall_time)
+    print_report(rows, errors, wall_time)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"sessions": args.sessions, "steps": args.steps, "wall_time": wall_time, "pages": rows, "errors": errors}, f, indent=2)
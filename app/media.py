@@ -0,0 +1,77 @@
+class MediaIndex:
+    """Recap and highlights of a game, built once from the game/{id}/content json.
+    Each highlight is matched to its event (event_stats_id, the about.eventId of the plays)
+    and maps the name of each playback (i.e., FLASH_1200K_640X360) to its url.
+        index = MediaIndex.from_media(api_engine.get_media(2021020001))
+        for highlight in index.highlights(types=["GOAL"]):
+            st.video(index.highlight_url(highlight))
+    """
+    # 1200K fits the video panel, other bitrates are used when it is missing
+    DEFAULT_PLAYBACK = "FLASH_1200K_640X360"
+
+    def __init__(self, recap, highlights):
+        self.recap = recap
+        self.highlights_list = highlights
+        self._by_event = {h["event_stats_id"]: h for h in highlights if h["event_stats_id"] is not None}
+
+    @staticmethod
+    def _playbacks(media_item):
+        """playback name -> url, from the highest to the lowest bitrate"""
+        playbacks = [p for p in media_item.get("playbacks", []) if p.get("url")]
+        playbacks.sort(key=lambda p: int(p.get("width") or 0) * int(p.get("height") or 0), reverse=True)
+        return {p["name"]: p["url"] for p in playbacks}
+
+    @classmethod
+    def from_media(cls, game_media):
+        media = game_media.get("media", {})
+        recap = {}
+        for epg in media.get("epg", []):
+            if epg.get("title") == "Recap" and epg.get("items"):
+                recap = cls._playbacks(epg["items"][0])
+
+        highlights = []
+        for item in media.get("milestones", {}).get("items", []):
+            if not item.get("highlight"):
+                continue
+            event_stats_id = item.get("statsEventId")
+            highlights.append(dict(
+                event_stats_id=int(event_stats_id) if event_stats_id else None,
+                type=item.get("type"),
+                ordinal_num=item.get("ordinalNum"),
+                period_time=item.get("periodTime"),
+                title=item["highlight"].get("title"),
+                description=item["highlight"].get("description"),
+                playbacks=cls._playbacks(item["highlight"]),
+            ))
+        return cls(recap, highlights)
+
+    @classmethod
+    def from_records(cls, records):
+        return cls(records["recap"], records["highlights"])
+
+    def to_records(self):
+        return {"recap": self.recap, "highlights": self.highlights_list}
+
+    @classmethod
+    def _pick(cls, playbacks, playback=None):
+        if not playbacks:
+            return None
+        return playbacks.get(playback or cls.DEFAULT_PLAYBACK) or playbacks.get(cls.DEFAULT_PLAYBACK) or next(iter(playbacks.values()))
+
+    def recap_url(self, playback=None):
+        """url of the recap, or None if it isn't published yet"""
+        return self._pick(self.recap, playback)
+
+    def highlights(self, types=("GOAL", "SHOT")):
+        return [h for h in self.highlights_list if h["type"] in types and h["playbacks"]]
+
+    def highlight_url(self, highlight, playback=None):
+        return self._pick(highlight["playbacks"], playback)
+
+    def by_event(self, event_stats_id):
+        """highlight of a play, or None"""
+        return self._by_event.get(event_stats_id)
+
+    @staticmethod
+    def label(highlight):
+        return f"{highlight['ordinal_num']} - {highlight['title']}"
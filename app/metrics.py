@@ -0,0 +1,207 @@
+"""In-process metrics exported in the Prometheus text format.
+    API_LATENCY = histogram("api_request_seconds", "Latency of API requests", ["endpoint"])
+    with API_LATENCY.time(endpoint="schedule"):
+        ...
+    start_http_server(9100)     # serves GET /metrics
+    write_file("metrics.prom")  # or for a node_exporter textfile collector
+
+The app starts the server when METRICS_PORT is set and writes the file after each
+page render when METRICS_FILE is set (see export_from_env).
+"""
+import contextlib
+import functools
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects the labels {self.labelnames}, got {tuple(labels)}")
+        return tuple((name, labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self.samples().items()):
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(key)} {value}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, n = self._values.get(key, ((0,) * len(self.buckets), 0.0, 0))
+            counts = tuple(count + (value <= bound) for count, bound in zip(counts, self.buckets))
+            self._values[key] = (counts, total + value, n + 1)
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """observe the duration of the block, even if it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def timed(self, **labels):
+        """decorator observing the duration of each call"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _render_sample(self, key, value):
+        counts, total, n = value
+        lines = [
+            f"{self.name}_bucket{_format_labels(key + (('le', repr(float(bound))),))} {count}"
+            for bound, count in zip(self.buckets, counts)
+        ]
+        # observations above the last bucket only count in +Inf
+        lines.append(f"{self.name}_bucket{_format_labels(key + (('le', '+Inf'),))} {n}")
+        lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(key)} {n}")
+        return lines
+
+
+# metrics of the process, by name
+REGISTRY = {}
+_registry_lock = threading.Lock()
+
+
+def _register(cls, name, *args, **kwargs):
+    """return the metric registered under name, creating it on first use (modules can be reloaded)"""
+    with _registry_lock:
+        if name not in REGISTRY:
+            REGISTRY[name] = cls(name, *args, **kwargs)
+        return REGISTRY[name]
+
+
+def counter(name, documentation, labelnames=()):
+    return _register(Counter, name, documentation, labelnames)
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram, name, documentation, labelnames, buckets)
+
+
+def render():
+    """all the metrics in the Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = list(REGISTRY.values())
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def write_file(path):
+    """write the metrics atomically, so a collector never reads a partial file"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        f.write(render())
+    os.replace(tmp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+
+
+def start_http_server(port, addr="0.0.0.0"):
+    """serve the metrics on a daemon thread; later calls return the running server"""
+    global _server
+    with _registry_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+        return _server
+
+
+def export_from_env():
+    """start the server on METRICS_PORT and write METRICS_FILE, when they are set"""
+    if os.environ.get("METRICS_PORT"):
+        start_http_server(int(os.environ["METRICS_PORT"]))
+    if os.environ.get("METRICS_FILE"):
+        write_file(os.environ["METRICS_FILE"])
+
+
+def summary():
+    """one row per metric and labels: counters give their value, histograms their count and mean"""
+    with _registry_lock:
+        metrics = list(REGISTRY.values())
+    rows = []
+    for metric in metrics:
+        for key, value in sorted(metric.samples().items()):
+            row = {"metric": metric.name, "labels": ", ".join(f"{name}={label}" for name, label in key)}
+            if isinstance(metric, Histogram):
+                _, total, n = value
+                row.update(count=n, total=round(total, 4), mean=round(total / n, 4) if n else None)
+            else:
+                row.update(count=value, total=None, mean=None)
+            rows.append(row)
+    return rows
@@ -0,0 +1,176 @@
+"""Local stand-in of the NHL API endpoints used by ApiEngine, to run and load test the app offline.
+    python mock_api.py --port 8000 --latency 0.05 --error-rate 0.01
+    NHL_API_BASE_URL=http://localhost:8000/api/v1 streamlit run app.py
+
+Responses are synthetic (see synthetic.py): the schedule of any season, the feed/live and
+content of its games, the teams with their roster or season stats, and the year by year
+stats of the players of the rosters. With --recordings, responses stored by an ApiEngine
+(its api_cache directory) are served first, so real games can be replayed.
+Each request waits `latency` seconds (plus up to `jitter`) and fails with a 503 with
+probability `error_rate`.
+"""
+import argparse
+import datetime
+import functools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+from cache import DiskCache
+import synthetic
+
+
+API_PREFIX = "/api/v1"
+GAMES_PER_SEASON = 1312
+
+
+class MockApi:
+    """Responses of the mocked endpoints, by path and query params"""
+    ROUTES = [
+        (re.compile(r"^/schedule$"), "schedule"),
+        (re.compile(r"^/game/(\d+)/feed/live$"), "feed_live"),
+        (re.compile(r"^/game/(\d+)/feed/live/diffPatch$"), "diff_patch"),
+        (re.compile(r"^/game/(\d+)/content$"), "content"),
+        (re.compile(r"^/people/(\d+)/stats$"), "people_stats"),
+        (re.compile(r"^/teams$"), "teams"),
+    ]
+
+    def __init__(self, games_per_season=GAMES_PER_SEASON, n_plays=350, recordings=None, seed=0):
+        self.games_per_season = games_per_season
+        self.n_plays = n_plays
+        self.recordings = DiskCache(recordings) if recordings else None
+        self.seed = seed
+
+    @functools.lru_cache(maxsize=8)
+    def schedule_json(self, start_year):
+        return synthetic.generate_schedule(start_year, self.games_per_season, seed=self.seed)
+
+    @functools.lru_cache(maxsize=8)
+    def _schedule_games(self, start_year):
+        return {game["gamePk"]: game for date in self.schedule_json(start_year)["dates"] for game in date["games"]}
+
+    @functools.lru_cache(maxsize=256)
+    def game_json(self, gamePk):
+        """the feed of a game of the schedule, with the same teams and start time"""
+        game = self._schedule_games(int(str(gamePk)[:4])).get(gamePk)
+        if game is None:
+            return None
+        teams = {team[0]: team for team in synthetic.TEAMS}
+        return synthetic.generate_game(
+            gamePk, self.n_plays, game["gameType"], start_time=datetime.datetime.fromisoformat(game["gameDate"][:-1]),
+            home=teams[game["teams"]["home"]["team"]["id"]], away=teams[game["teams"]["away"]["team"]["id"]], seed=self.seed,
+        )
+
+    def _recorded(self, path, params):
+        """a response stored by an ApiEngine, whether it passed the query as params or in the endpoint;
+        recordings are replayed even once their TTL is over (i.e., games recorded while live)"""
+        endpoint = path.lstrip("/")
+        candidates = [(endpoint, params)]
+        if params:
+            query = "&".join(f"{name}={value}" for name, value in params.items())
+            candidates.append((f"{endpoint}?{query}", None))
+        for candidate in candidates:
+            response = self.recordings.get(DiskCache.make_key(*candidate), expired=True)
+            if response is not None:
+                return response
+        return None
+
+    def respond(self, path, params):
+        """(status, json) of a request"""
+        if self.recordings is not None:
+            response = self._recorded(path, params)
+            if response is not None:
+                return 200, response
+        for pattern, name in self.ROUTES:
+            match = pattern.match(path)
+            if match:
+                response = getattr(self, f"_{name}")(*match.groups(), **params)
+                return (404, {"message": f"Object not found: {path}"}) if response is None else (200, response)
+        return 404, {"message": f"Unknown endpoint: {path}"}
+
+    def _schedule(self, season=None, **params):
+        return self.schedule_json(int((season or "2021")[:4]))
+
+    def _feed_live(self, gamePk, **params):
+        return self.game_json(int(gamePk))
+
+    def _diff_patch(self, gamePk, **params):
+        # synthetic games are final: nothing changes
+        return [] if self.game_json(int(gamePk)) is not None else None
+
+    def _content(self, gamePk, **params):
+        game_json = self.game_json(int(gamePk))
+        return None if game_json is None else synthetic.generate_media(game_json)
+
+    def _people_stats(self, player_id, stats=None, **params):
+        return synthetic.generate_year_by_year(int(player_id), seed=self.seed)
+
+    def _teams(self, expand=None, season=None, teamId=None, **params):
+        teams_json = synthetic.generate_teams(expand, season, seed=self.seed)
+        if teamId is not None:
+            teams_json["teams"] = [team for team in teams_json["teams"] if str(team["id"]) == str(teamId)]
+        return teams_json
+
+
+def make_handler(mock_api, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+    rnd = random.Random(seed)
+    rnd_lock = threading.Lock()
+
+    class MockApiHandler(BaseHTTPRequestHandler):
+        # keep-alive, as the ApiEngine session pools its connections
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            path = url.path[len(API_PREFIX):] if url.path.startswith(API_PREFIX) else url.path
+            with rnd_lock:
+                delay = latency + rnd.uniform(0, jitter)
+                failed = rnd.random() < error_rate
+            time.sleep(delay)
+            if failed:
+                status, response = 503, {"message": "Service unavailable (mock error)"}
+            else:
+                status, response = mock_api.respond(path, dict(parse_qsl(url.query)))
+            body = json.dumps(response).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MockApiHandler
+
+
+def start_server(port=0, addr="127.0.0.1", latency=0.0, jitter=0.0, error_rate=0.0, **kwargs):
+    """serve the mock on a daemon thread; returns the server and its base url (for NHL_API_BASE_URL)"""
+    handler = make_handler(MockApi(**kwargs), latency, jitter, error_rate)
+    server = ThreadingHTTPServer((addr, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-api", daemon=True).start()
+    return server, f"http://{addr}:{server.server_address[1]}{API_PREFIX}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve synthetic or recorded NHL API responses.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--addr", default="127.0.0.1")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to each response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more seconds, at random")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 503")
+    parser.add_argument("--games-per-season", type=int, default=GAMES_PER_SEASON)
+    parser.add_argument("--plays", type=int, default=350, help="plays of each synthetic game")
+    parser.add_argument("--recordings", default=None, help="api_cache directory of an ApiEngine, served first")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.addr, args.port), make_handler(
+        MockApi(args.games_per_season, args.plays, args.recordings), args.latency, args.jitter, args.error_rate,
+    ))
+    print(f"serving the NHL API mock on http://{args.addr}:{args.port}{API_PREFIX}")
+    server.serve_forever()
@@ -1,15 +1,28 @@
-import json
+import datetime
+import os
+import time
 
 import streamlit as st
 import numpy as np
 import pandas as pd
-from plotly.subplots import make_subplots
 import plotly.express as px
 import plotly.graph_objects as go
 
 from features import normalize_plays_coords, _game_seconds
-from utils import parse_gamePk, get_metadata, game_to_df, get_highlight_title
-from data_query import ApiEngine
+from utils import get_metadata
+from cache import memoize
+from data_query import ApiEngine, ApiError, STORAGE_PATH, SCHEDULE_TTL
+from density import CHART_BUILD, ShotDensity, display_shot_density
+from warehouse import PlaysWarehouse
+from live import LiveGame
+from media import MediaIndex
+from schedule import ScheduleIndex
+from warmer import get_warmer
+import xg
+
+
+# seconds between the reruns of a page showing a game in progress (0: only on interaction)
+LIVE_REFRESH_SECONDS = float(os.environ.get("LIVE_REFRESH_SECONDS", 30))
 
 
 def display_details(metadata_dict):
@@ -62,21 +75,37 @@ def display_stats(game_json, player_id):
     return title, stats_df
 
 
-def get_recap_url(game_media):
-    all_recaps = list(filter(lambda x: x["title"] == "Recap", game_media["media"]["epg"]))[0]
-    recap = list(filter(lambda x: x["name"] == "FLASH_1200K_640X360", all_recaps["items"][0]["playbacks"]))[0]
-    recap_url = recap["url"]
-    return recap_url
+SHOTMAP_HOVER_DATA = ["period_idx", "period_time", "shooter_name", "shot_type"]
+TIMELINE_HOVER_DATA = ["event_type_id", "period_idx"]
+
+
+def shotmap_points(game_df):
+    return normalize_plays_coords(game_df, side=False)
+
+
+def timeline_points(game_df):
+    color = game_df.team_initiative_id.copy()
+    color.loc[game_df.event_type_id=="GOAL"] = "Goal"
+    return game_df.assign(seconds=_game_seconds(game_df), color=color)
 
 
-def get_highlight_url(highlight):
-    h = list(filter(lambda x: x["name"] == "FLASH_1200K_640X360", highlight["highlight"]["playbacks"]))[0]
-    highlight_url = h["url"]
-    return highlight_url
+def extend_scatter(fig, points_df, x, y, color, hover_data):
+    """append points to the traces of a px.scatter figure (one trace per color);
+    return False if a point belongs to a trace the figure doesn't have yet"""
+    traces = {trace.name: trace for trace in fig.data}
+    if not set(points_df[color].unique()) <= set(traces):
+        return False
+    for name, group_df in points_df.groupby(color):
+        trace = traces[name]
+        trace.x = np.concatenate([trace.x, group_df[x].to_numpy()])
+        trace.y = np.concatenate([trace.y, group_df[y].to_numpy()])
+        trace.customdata = np.concatenate([trace.customdata, group_df[hover_data].to_numpy()])
+    return True
 
 
+@CHART_BUILD.timed(chart="shotmap")
 def display_shotmap(game_df):
-    norm_df = normalize_plays_coords(game_df, side=False)
+    norm_df = shotmap_points(game_df)
     
     fig = px.scatter(
         data_frame=norm_df,
@@ -85,7 +114,8 @@ def display_shotmap(game_df):
         range_x=[-100,100],
         range_y=[-43,43],
         color="team_initiative_id",
-        hover_data=["period_idx", "period_time", "shooter_name", "shot_type"],
+        # xG when a model scored the shots
+        hover_data=SHOTMAP_HOVER_DATA + (["xg"] if "xg" in norm_df else []),
         labels={
             "team_initiative_id": "Teams",
             "x_coord_norm": "X",
@@ -93,7 +123,8 @@ def display_shotmap(game_df):
             "period_idx": "Period",
             "period_time": "Period Time",
             "shooter_name": "Player",
-            "shot_type": "Shot Type"
+            "shot_type": "Shot Type",
+            "xg": "xG"
         },
         # color-blind friendly palette from https://mikemol.github.io/technique/colorblind/2018/02/11/color-safe-palette.html
         color_discrete_sequence=["#009E73", "#E69F00", "#CC79A7"]
@@ -142,21 +173,20 @@ def display_shotmap(game_df):
     return fig
 
 
+@CHART_BUILD.timed(chart="timeline")
 def display_timeline(game_df):
-    seconds = _game_seconds(game_df)
-    color = game_df.team_initiative_id.copy()
-    color.loc[game_df.event_type_id=="GOAL"] = "Goal"
+    timeline_df = timeline_points(game_df)
     fig = px.scatter(
-        data_frame=game_df,
-        x=seconds,
+        data_frame=timeline_df,
+        x="seconds",
         y="team_initiative_id",
         range_x=["00:00", "20:00"],
-        color=color,
-        hover_data=["event_type_id", "period_idx"],
+        color="color",
+        hover_data=TIMELINE_HOVER_DATA,
         labels={
             "team_initiative_id": "Teams",
             "period_idx": "Game Period",
-            "x": "Game Time (sec)",
+            "seconds": "Game Time (sec)",
             "event_type_id": "Event",
             "color": "Teams"
         },
@@ -182,36 +212,89 @@ def display_timeline(game_df):
     return fig
 
 
-def page(): 
-    api_engine = ApiEngine("./")
-    with open("C:/.coding/hockey_webapp/hockey_webapp/demo_json/game_20202021_2020020001.json", "r") as f:
-        game_json = json.load(f)
-        
-    with open("C:/.coding/hockey_webapp/hockey_webapp/demo_json/game_media.json", "r") as f:
-        game_media = json.load(f)    
-        
-    game_summary = display_summary(game_json)
+@memoize(maxsize=8, ttl=SCHEDULE_TTL)
+def load_schedule_index(api_engine, start_years):
+    """index of the games of every selected season"""
+    return ScheduleIndex.concat([api_engine.get_schedule_index(start_year) for start_year in start_years])
+
 
+def live_charts(api_engine, warehouse, game_json):
+    """plays, shotmap and timeline of a game in progress;
+    each rerun only fetches, parses and plots the plays since the previous one"""
+    gamePk = game_json["gameData"]["game"]["pk"]
+    live_state = st.session_state.get("live_game")
+    if live_state is None or live_state["game"].gamePk != gamePk:
+        # the first parse is shared with the other sessions and the cache warmer
+        live_state = {"game": LiveGame(api_engine, gamePk, game_json, plays_df=warehouse.get_game_plays(game_json))}
+        redraw = True
+    else:
+        new_df, redraw = live_state["game"].refresh()
+        if not redraw and not new_df.empty:
+            redraw = not (
+                extend_scatter(live_state["shotmap"], shotmap_points(new_df), "x_coord_norm", "y_coord_norm", "team_initiative_id", SHOTMAP_HOVER_DATA)
+                and extend_scatter(live_state["timeline"], timeline_points(new_df), "seconds", "team_initiative_id", "color", TIMELINE_HOVER_DATA)
+            )
+    if redraw:
+        live_state["shotmap"] = display_shotmap(live_state["game"].plays_df)
+        live_state["timeline"] = display_timeline(live_state["game"].plays_df)
+    st.session_state["live_game"] = live_state
+    return live_state["game"].plays_df, live_state["shotmap"], live_state["timeline"]
+
+
+def page(): 
+    api_engine = ApiEngine(STORAGE_PATH)
+    warehouse = PlaysWarehouse(os.path.join(api_engine.storage_path, "warehouse"))
     with st.sidebar:
         st.text("")
         st.subheader("Select Game")
 
-        year_select = st.selectbox("Select Year", options=[y for y in range(2021, 2020, -1)])
-        gamePk_list = api_engine.get_all_season_gamePk(int(year_select))
-        gamePk_select = 2021020001
-        gamePk_select = st.selectbox("Select Game", options=gamePk_list, format_func=parse_gamePk)
+        years_select = st.multiselect(
+            "Select Seasons",
+            options=[y for y in range(2021, 2014, -1)],
+            default=[2021],
+            format_func=lambda y: f"{y}-{y+1}",
+        )
+        schedule_index = load_schedule_index(api_engine, tuple(sorted(years_select or [2021])))
+        # games likely to be opened next are loaded in the background
+        warmer = get_warmer(api_engine, warehouse)
+        warmer.warm_today(schedule_index)
+        
+        team_filter = st.multiselect("Filter by Team", options=schedule_index.teams)
+        if st.checkbox("Today's games only"):
+            start_date = end_date = datetime.date.today()
+        else:
+            date_range = st.date_input("Filter by Date", value=[])
+            start_date = date_range[0] if len(date_range) > 0 else None
+            end_date = date_range[-1] if len(date_range) > 0 else None
+        games_df = schedule_index.filter(start_date=start_date, end_date=end_date, teams=team_filter)
+        
+        gamePk_select = st.selectbox("Select Game", options=games_df["gamePk"].tolist(), format_func=schedule_index.label)
+
+        if st.button("Query Game") and gamePk_select is not None:
+            st.session_state["gamePk"] = int(gamePk_select)
+
+        # the queried game stays selected across reruns, the selected one is shown until then
+        gamePk = st.session_state.get("gamePk", gamePk_select)
 
-        if st.button("Query Game"):
-            game_json = api_engine.get_game(int(gamePk_select))
-            game_media = api_engine.get_media(int(gamePk_select))
-            game_summary = display_summary(game_json)
+    if gamePk is None:
+        st.info("No game matches the filters.")
+        return
+    # the media is fetched while the game is loaded and the charts are drawn
+    media_future = api_engine.prefetch_media_index(gamePk)
+    try:
+        game_json = api_engine.get_game(gamePk)
+    except ApiError as e:
+        st.error(f"Could not load game {gamePk}: {e}")
+        return
+    warmer.warm_neighbours(games_df["gamePk"].tolist(), gamePk)
+    game_summary = display_summary(game_json)
 
     ### 1.GAME RECAP ###
     st.subheader("Game Recap")     
     left_col, right_col = st.columns([1, 1])         
     with left_col:
-        recap_url = get_recap_url(game_media)
-        st.video(recap_url)
+        # filled once the rest of the page is drawn
+        recap_placeholder = st.empty()
     with right_col:
         st.markdown(game_summary)
         
@@ -219,22 +302,63 @@ def page():
     st.subheader("Shotmap")  
     # st.info("In a hockey game, team switch sides each period. The shotmap displays the normalized coordinates, keeping each team on the same side the whole game.")
     shotmap_container = st.container()
+    xg_totals = None
     with shotmap_container:
-        game_df = game_to_df(game_json)
-        shotmap = display_shotmap(game_df)
-        timeline = display_timeline(game_df)
+        if game_json["gameData"]["status"]["abstractGameState"] == "Live":
+            try:
+                game_df, shotmap, timeline = live_charts(api_engine, warehouse, game_json)
+            except ApiError as e:
+                st.error(f"Could not refresh game {game_json['gameData']['game']['pk']}: {e}")
+                st.stop()
+            # any rerun fetches the plays since the previous one
+            st.button("Refresh")
+            xg_model = xg.get_model()
+            if xg_model is not None:
+                # not score_game: a corrected play keeps the number of plays of the game
+                xg_totals = xg.team_totals(game_df, xg.score_plays(xg_model, game_df))
+        else:
+            game_df = warehouse.get_game_plays(game_json)
+            xg_model = xg.get_model()
+            if xg_model is not None:
+                game_xg = xg.score_game(xg_model, game_json["gameData"]["game"]["pk"], game_df)
+                game_df = game_df.assign(xg=game_xg.round(3))
+                xg_totals = xg.team_totals(game_df, game_xg)
+            if st.radio("Shotmap Mode", options=["Shots", "Density"]) == "Density":
+                # same coordinates as the shots of display_shotmap, each team on its own half
+                shotmap = display_shot_density(ShotDensity.from_plays(game_df, side=False))
+            else:
+                shotmap = display_shotmap(game_df)
+            timeline = display_timeline(game_df)
         
         st.plotly_chart(shotmap, use_container_width=True)
         st.plotly_chart(timeline, use_container_width=True)
+        if xg_totals is not None:
+            st.markdown("Expected Goals (xG)")
+            st.table(xg_totals)
         
     ### 3.GOAL VIDEO ###
-    
-    highlights = [h for h in game_media["media"]["milestones"]["items"] if h["type"] in ["GOAL", "SHOT"]]
-    highlight_select = st.selectbox("Select Media", options=highlights, format_func=get_highlight_title)
-    
-    highlight_url = get_highlight_url(highlight_select)
-    st.video(highlight_url)
-    st.write(highlight_select["highlight"]["description"])
+    try:
+        media_index = media_future.result()
+    except ApiError as e:
+        recap_placeholder.info(f"Could not load the videos of this game: {e}")
+        media_index = MediaIndex({}, [])
+    else:
+        recap_url = media_index.recap_url()
+        if recap_url is None:
+            recap_placeholder.info("No recap published yet.")
+        else:
+            recap_placeholder.video(recap_url)
+
+    highlights = media_index.highlights(types=["GOAL", "SHOT"])
+    if highlights:
+        highlight_select = st.selectbox("Select Media", options=highlights, format_func=MediaIndex.label)
+        st.video(media_index.highlight_url(highlight_select))
+        st.write(highlight_select["description"])
+
+    if game_json["gameData"]["status"]["abstractGameState"] == "Live" and LIVE_REFRESH_SECONDS > 0:
+        # the page stays drawn meanwhile; the rerun only fetches the plays since this one
+        time.sleep(LIVE_REFRESH_SECONDS)
+        st.experimental_rerun()
     
     
     ### 4.STARS ###
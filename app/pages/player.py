@@ -1,16 +1,19 @@
-import json
+import os
 
 import streamlit as st
 import pandas as pd
 
-from data_query import ApiEngine
+from cache import memoize
+from careers import load_player_seasons
+from data_query import ApiEngine, ApiError, STORAGE_PATH, STATS_TTL
 from utils import parse_year_to_season
+from warehouse import PlaysWarehouse
+from density import display_shot_density
 
 
-@st.cache
-def generate_roster_df():
-    with open("C:/.coding/hockey_webapp/hockey_webapp/demo_json/team_rosters.json", "r") as f:
-        ROSTER = json.load(f)
+@memoize(maxsize=1, ttl=STATS_TTL)
+def generate_roster_df(api_engine):
+    ROSTER = api_engine.get_rosters()
     
     records = []
     for team in ROSTER["teams"]:
@@ -29,25 +32,42 @@ def generate_roster_df():
     return pd.DataFrame.from_records(records)
 
 
-def get_player_years(year_by_year):
-    years_json = year_by_year["stats"][0]
-    assert "splits" in years_json
-    
+@memoize(maxsize=4, ttl=STATS_TTL)
+def load_roster_seasons(api_engine, player_ids):
+    """NHL seasons of every player of the roster, downloaded once for all players"""
+    return load_player_seasons(api_engine, player_ids)
+
+
+def get_player_years(player_seasons_df):
+    """label the NHL seasons of a player from the careers table (see careers.py)"""
     years_dict = {}
-    for split in years_json["splits"]:
-        # 133 is the NHL league ID
-        if split["league"].get("id", -1) == 133:
-            season = split["season"]
-            years_dict[season] = f'{season[:4]} - {split["team"]["name"]}'
+    for season, team_name in zip(player_seasons_df["season"], player_seasons_df["team_name"]):
+        years_dict[season] = f'{season[:4]} - {team_name}'
     
     return years_dict
             
 
+def display_shot_history(shots_df):
+    """shots and goals per season"""
+    history_df = shots_df.groupby(["game_season", "game_type"]).agg(
+        games=("gamePk", "nunique"),
+        shots=("event_type_id", "size"),
+        goals=("event_type_id", lambda x: (x == "GOAL").sum()),
+    )
+    history_df["shooting %"] = (100 * history_df.goals / history_df.shots).round(1)
+    return history_df
+
+
 def page():  
-    api_engine = ApiEngine("./")
+    api_engine = ApiEngine(STORAGE_PATH)
+    warehouse = PlaysWarehouse(os.path.join(api_engine.storage_path, "warehouse"))
     
     with st.sidebar:
-        ROSTER_DF = generate_roster_df()
+        try:
+            ROSTER_DF = generate_roster_df(api_engine)
+        except ApiError as e:
+            st.error(f"Could not load the rosters: {e}")
+            return
         
         st.text("")
         st.subheader("Select Player")
@@ -72,13 +92,34 @@ def page():
         if st.button("Query Player"):
             st.write(player_select)
     
+    if player_select is None:
+        st.info("No player matches the filters.")
+        return
     st.subheader("Player Summary")
+    player_id = ROSTER_DF.loc[ROSTER_DF.player_name==player_select, "player_id"].values[0]
+    shots_df = warehouse.query(
+        shooter=player_id,
+        columns=["gamePk", "game_season", "game_type", "event_type_id", "x_coord", "y_coord"],
+    )
+    if shots_df.empty:
+        st.info("No shots stored for this player yet.")
+    else:
+        st.dataframe(display_shot_history(shots_df))
+        # binned on the server: the figure size doesn't grow with the number of shots
+        st.plotly_chart(display_shot_density(warehouse.shot_density(shooter=player_id)), use_container_width=True)
     
     st.subheader("Player Drilldown")
-    #year_by_year = api_engine.get_player_year_by_year(ROSTER_DF.loc[ROSTER_DF.player_name==player_select, "player_id"].values[0])
-    with open("C:/.coding/hockey_webapp/hockey_webapp/demo_json/player_yearbyyear.json", "r") as f:
-        year_by_year = json.load(f)
-    years_dict = get_player_years(year_by_year)
+    # switching players reads from the table, without any request
+    with st.spinner("Loading the careers of the roster..."):
+        SEASONS_DF, failed = load_roster_seasons(api_engine, tuple(ROSTER_DF.player_id))
+    if failed:
+        st.warning(f"Could not load the stats of {len(failed)} players.")
+        if st.button("Retry"):
+            load_roster_seasons.cache_clear()
+            st.experimental_rerun()
+    player_seasons_df = SEASONS_DF[SEASONS_DF.player_id == player_id]
+    years_dict = get_player_years(player_seasons_df)
     st.selectbox("Select Year", options=list(years_dict.values()))
+    st.dataframe(player_seasons_df.drop(columns=["player_id", "sequence_number"]).dropna(axis=1, how="all"))
     
     
\ No newline at end of file
@@ -1,44 +1,57 @@
-import streamlit as st
-
-import json
+import os
 
 import streamlit as st
 import pandas as pd
 
-from data_query import ApiEngine
+from cache import memoize
+from data_query import ApiEngine, ApiError, STORAGE_PATH, STATS_TTL
 from utils import parse_year_to_season
+from team_stats import league_stats_to_df, stat_columns, compare_teams, team_card
+from warehouse import PlaysWarehouse
+from density import display_shot_density
+
+
+# stats compared by default
+DEFAULT_STATS = ["gamesPlayed", "wins", "losses", "ot", "pts", "goalsPerGame", "goalsAgainstPerGame", "powerPlayPercentage", "penaltyKillPercentage", "shotsPerGame", "shotsAllowed", "faceOffWinPercentage", "shootingPctg", "savePctg"]
+
+
+@memoize(maxsize=8, ttl=STATS_TTL)
+def load_team_stats(api_engine, start_year):
+    """stats of every team of the season, from a single request"""
+    return league_stats_to_df(api_engine.get_league_stats(start_year))
+
 
+def page():
+    api_engine = ApiEngine(STORAGE_PATH)
+    warehouse = PlaysWarehouse(os.path.join(api_engine.storage_path, "warehouse"))
 
-@st.cache
-def generate_teams_df(teams_json):    
-    records = []
-    for team in teams_json["teams"]:
-        team_record = dict(
-            team_id=team["id"],
-            team_name=team["teamName"],
-            team_full_name=team["name"],
-            team_triCode=team["abbreviation"],
-        )
-        records.append(team_record)
-    
-    return pd.DataFrame.from_records(records)
-            
-
-def page():  
-    api_engine = ApiEngine("./")
-    
     with st.sidebar:
-        teams_json = api_engine.get_teams()
-        TEAMS_DF = generate_teams_df(teams_json)
-        
-        st.text("")       
-        team_select = st.selectbox("Select Team", options=sorted(TEAMS_DF.team_full_name))
-
-        if st.button("Query Team"):
-            st.write(team_select)
-    
+        year_select = st.selectbox("Select Season", options=[y for y in range(2021, 2014, -1)])
+        try:
+            TEAMS_DF = load_team_stats(api_engine, year_select)
+        except ApiError as e:
+            st.error(f"Could not load the team stats of {year_select}-{year_select+1}: {e}")
+            return
+
+        st.text("")
+        team_select = st.selectbox("Select Team", options=TEAMS_DF.team_full_name)
+    team_triCode = TEAMS_DF.loc[TEAMS_DF.team_full_name==team_select, "team_triCode"].values[0]
+
     st.subheader("Team Drill Down")
-    stats_json = api_engine.get_team_stats(str(TEAMS_DF.loc[TEAMS_DF.team_full_name==team_select, "team_id"].values[0]))
-    st.json(stats_json)
-    
-    
\ No newline at end of file
+    st.dataframe(team_card(TEAMS_DF, team_triCode))
+
+    st.subheader("Compare Teams")
+    compare_select = st.multiselect("Teams", options=list(TEAMS_DF.team_triCode), default=[team_triCode])
+    all_stats = stat_columns(TEAMS_DF)
+    stats_select = st.multiselect("Stats", options=all_stats, default=[stat for stat in DEFAULT_STATS if stat in all_stats])
+    if compare_select and stats_select:
+        st.dataframe(compare_teams(TEAMS_DF, compare_select, stats_select))
+
+    st.subheader("Shot Density")
+    density = warehouse.shot_density(team=team_triCode, seasons=parse_year_to_season(year_select))
+    if density.n_shots == 0:
+        st.info("No shots stored for this team and season yet.")
+    else:
+        st.plotly_chart(display_shot_density(density), use_container_width=True)
+
+
@@ -0,0 +1,95 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+
+class ScheduleIndex:
+    """Games of one or more seasons, built once from the schedule json.
+    Games are sorted by date so date ranges are found by binary search,
+    and each team maps to the positions of its games.
+        index = ScheduleIndex.from_schedule(api_engine.get_season_schedule(2021))
+        games_df = index.filter(start_date="2021-10-12", end_date="2021-10-31", teams=["Toronto Maple Leafs"])
+    """
+    COLUMNS = ["gamePk", "date", "game_type", "status", "home_id", "home_name", "away_id", "away_name"]
+
+    def __init__(self, games_df):
+        self.games_df = games_df.sort_values(["date", "gamePk"], ignore_index=True)
+        self._dates = self.games_df["date"].to_numpy(dtype=str)
+        self._team_positions = {}
+        for side in ["home_name", "away_name"]:
+            for team, positions in self.games_df.groupby(side).indices.items():
+                self._team_positions.setdefault(team, []).append(positions)
+        self._team_positions = {team: np.sort(np.concatenate(positions)) for team, positions in self._team_positions.items()}
+        self._labels = dict(zip(self.games_df["gamePk"], self._format_labels(self.games_df)))
+
+    @classmethod
+    def from_schedule(cls, season_schedule):
+        records = []
+        for date in season_schedule["dates"]:
+            for game in date["games"]:
+                records.append(dict(
+                    gamePk=game["gamePk"],
+                    date=date["date"],
+                    game_type=game["gameType"],
+                    status=game["status"]["abstractGameState"],
+                    home_id=game["teams"]["home"]["team"]["id"],
+                    home_name=game["teams"]["home"]["team"]["name"],
+                    away_id=game["teams"]["away"]["team"]["id"],
+                    away_name=game["teams"]["away"]["team"]["name"],
+                ))
+        return cls.from_records(records)
+
+    @classmethod
+    def from_records(cls, records):
+        return cls(pd.DataFrame.from_records(records, columns=cls.COLUMNS))
+
+    @classmethod
+    def concat(cls, indexes):
+        """merge the indexes of several seasons"""
+        return cls(pd.concat([index.games_df for index in indexes], ignore_index=True))
+
+    def to_records(self):
+        return self.games_df.to_dict(orient="records")
+
+    @staticmethod
+    def _format_labels(games_df):
+        return games_df["date"] + " - " + games_df["away_name"] + " @ " + games_df["home_name"] + " (" + games_df["game_type"] + ")"
+
+    @property
+    def teams(self):
+        return sorted(self._team_positions)
+
+    @property
+    def gamePks(self):
+        return self.games_df["gamePk"].tolist()
+
+    def label(self, gamePk):
+        """describe a game for selectors (i.e., 2021-10-12 - Montréal Canadiens @ Toronto Maple Leafs (R))"""
+        return self._labels.get(gamePk, str(gamePk))
+
+    def _date_positions(self, start_date=None, end_date=None):
+        start = 0 if start_date is None else np.searchsorted(self._dates, str(start_date), side="left")
+        stop = len(self._dates) if end_date is None else np.searchsorted(self._dates, str(end_date), side="right")
+        return np.arange(start, stop)
+
+    def filter(self, start_date=None, end_date=None, teams=None, game_types=None):
+        """return the games within the dates (inclusive), played by any of the teams and of the given types"""
+        positions = self._date_positions(start_date, end_date)
+        if teams:
+            team_positions = [self._team_positions.get(team, np.array([], dtype=int)) for team in teams]
+            positions = np.intersect1d(positions, np.concatenate(team_positions))
+        games_df = self.games_df.iloc[positions]
+        if game_types:
+            games_df = games_df[games_df["game_type"].isin(game_types)]
+        return games_df
+
+    def by_date_range(self, start_date, end_date):
+        return self.filter(start_date=start_date, end_date=end_date)
+
+    def by_team(self, team):
+        return self.filter(teams=[team])
+
+    def today(self):
+        today = datetime.date.today().isoformat()
+        return self.filter(start_date=today, end_date=today)
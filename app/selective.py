@@ -0,0 +1,85 @@
+"""Decode only some fields of a JSON document.
+
+Fields are dotted paths of object keys (i.e., "liveData.plays.allPlays"); a field keeps
+its whole subtree. stream_fields parses a response as it is read and only builds the
+selected subtrees, so the full document is never in memory. select_fields gives the same
+result from a document already decoded, and is the fallback when ijson isn't installed.
+"""
+import sys
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+def _set_path(document, path, value):
+    keys = path.split(".")
+    for key in keys[:-1]:
+        document = document.setdefault(key, {})
+    document[keys[-1]] = value
+
+
+def select_fields(document, fields):
+    """copy the given fields of a decoded document into a new one (subtrees are shared)"""
+    selected = {}
+    for path in fields:
+        value = document
+        for key in path.split("."):
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            _set_path(selected, path, value)
+    # same key order as the document, like a streamed decode
+    return _reorder(selected, document)
+
+
+def _reorder(selected, document):
+    if not isinstance(selected, dict) or not isinstance(document, dict) or selected is document:
+        return selected
+    return {key: _reorder(selected[key], document[key]) for key in document if key in selected}
+
+
+def stream_fields(fileobj, fields):
+    """decode the given fields of the JSON document read from a binary file object"""
+    if ijson is None:
+        raise ImportError("stream_fields requires ijson")
+    fields = set(fields)
+    document = {}
+    stack = None
+    for prefix, event, value in ijson.parse(fileobj, use_float=True):
+        if stack is None:
+            # outside of a selected subtree: only look for the start of one
+            if prefix in fields and event not in ("map_key", "end_map", "end_array"):
+                if event == "start_map":
+                    stack, path = [{}], prefix
+                elif event == "start_array":
+                    stack, path = [[]], prefix
+                else:
+                    _set_path(document, prefix, value)
+            continue
+
+        if event == "map_key":
+            # interned like the keys of json.loads, so repeated keys share one string
+            key = sys.intern(value)
+            continue
+        if event in ("end_map", "end_array"):
+            container = stack.pop()
+            if not stack:
+                _set_path(document, path, container)
+                stack = None
+            continue
+
+        if event == "start_map":
+            value = {}
+        elif event == "start_array":
+            value = []
+        parent = stack[-1]
+        if isinstance(parent, list):
+            parent.append(value)
+        else:
+            parent[key] = value
+        if event in ("start_map", "start_array"):
+            stack.append(value)
+    return document
@@ -0,0 +1,315 @@
+"""Synthetic NHL API responses, to benchmark and test the app offline.
+
+The feeds follow the structure of the game/{gamePk}/feed/live endpoint closely enough
+for utils, features and the pages to parse them. They are deterministic: the same
+gamePk and seed always give the same feed. The schedule, content, teams and
+people/{id}/stats responses are generated too, and mock_api.py serves all of them.
+    game_json = generate_game(2021020001, n_plays=350)
+    season = generate_season(2021, n_games=1312)
+"""
+import datetime
+import random
+
+
+TEAMS = [
+    (1, "New Jersey Devils", "Devils", "NJD"), (2, "New York Islanders", "Islanders", "NYI"),
+    (3, "New York Rangers", "Rangers", "NYR"), (4, "Philadelphia Flyers", "Flyers", "PHI"),
+    (5, "Pittsburgh Penguins", "Penguins", "PIT"), (6, "Boston Bruins", "Bruins", "BOS"),
+    (7, "Buffalo Sabres", "Sabres", "BUF"), (8, "Montréal Canadiens", "Canadiens", "MTL"),
+    (9, "Ottawa Senators", "Senators", "OTT"), (10, "Toronto Maple Leafs", "Maple Leafs", "TOR"),
+    (12, "Carolina Hurricanes", "Hurricanes", "CAR"), (13, "Florida Panthers", "Panthers", "FLA"),
+    (14, "Tampa Bay Lightning", "Lightning", "TBL"), (15, "Washington Capitals", "Capitals", "WSH"),
+    (16, "Chicago Blackhawks", "Blackhawks", "CHI"), (17, "Detroit Red Wings", "Red Wings", "DET"),
+    (18, "Nashville Predators", "Predators", "NSH"), (19, "St. Louis Blues", "Blues", "STL"),
+    (20, "Calgary Flames", "Flames", "CGY"), (21, "Colorado Avalanche", "Avalanche", "COL"),
+    (22, "Edmonton Oilers", "Oilers", "EDM"), (23, "Vancouver Canucks", "Canucks", "VAN"),
+    (24, "Anaheim Ducks", "Ducks", "ANA"), (25, "Dallas Stars", "Stars", "DAL"),
+    (26, "Los Angeles Kings", "Kings", "LAK"), (28, "San Jose Sharks", "Sharks", "SJS"),
+    (29, "Columbus Blue Jackets", "Blue Jackets", "CBJ"), (30, "Minnesota Wild", "Wild", "MIN"),
+    (52, "Winnipeg Jets", "Jets", "WPG"), (53, "Arizona Coyotes", "Coyotes", "ARI"),
+    (54, "Vegas Golden Knights", "Golden Knights", "VGK"), (55, "Seattle Kraken", "Kraken", "SEA"),
+]
+
+# relative frequency of the events of a game
+EVENT_WEIGHTS = {
+    "FACEOFF": 60, "HIT": 45, "SHOT": 60, "MISSED_SHOT": 25, "BLOCKED_SHOT": 30, "GIVEAWAY": 15,
+    "TAKEAWAY": 12, "STOP": 40, "PENALTY": 8, "GOAL": 6,
+}
+SHOT_TYPES = ["Wrist Shot", "Slap Shot", "Snap Shot", "Backhand", "Tip-In", "Deflected", "Wrap-around"]
+GAME_TYPE_CODES = {"PR": "01", "R": "02", "P": "03", "A": "04"}
+SKATERS_PER_TEAM = 20
+
+
+def _team_json(team):
+    team_id, name, team_name, tri_code = team
+    return {"id": team_id, "name": name, "teamName": team_name, "abbreviation": tri_code, "triCode": tri_code}
+
+
+def _roster(team, rnd):
+    """skaters and goalies of a team, with stable ids"""
+    team_id = team[0]
+    skaters = [{"id": 8470000 + team_id * 100 + i, "fullName": f"{team[2]} Skater {i}"} for i in range(SKATERS_PER_TEAM)]
+    goalies = [{"id": 8470000 + team_id * 100 + 90 + i, "fullName": f"{team[2]} Goalie {i}"} for i in range(2)]
+    return skaters, rnd.choice(goalies)
+
+
+def _coordinates(rnd, attacking_right):
+    """shots come mostly from the offensive zone of the team"""
+    x = rnd.triangular(25, 99, 75)
+    y = rnd.triangular(-42, 42, 0)
+    return {"x": float(round(x if attacking_right else -x)), "y": float(round(y))}
+
+
+def generate_game(gamePk, n_plays=350, game_type="R", start_time=None, home=None, away=None, status="Final", seed=0):
+    """feed/live json of a game with n_plays plays"""
+    rnd = random.Random(gamePk * 1000 + seed)
+    home = home or TEAMS[rnd.randrange(len(TEAMS))]
+    away = away or rnd.choice([team for team in TEAMS if team != home])
+    start_time = start_time or datetime.datetime(int(str(gamePk)[:4]), 10, 12, 23, 0)
+    season = f"{str(gamePk)[:4]}{int(str(gamePk)[:4]) + 1}"
+    rosters = {home[3]: _roster(home, rnd), away[3]: _roster(away, rnd)}
+    events, weights = list(EVENT_WEIGHTS), list(EVENT_WEIGHTS.values())
+
+    n_periods = 4 if rnd.random() < 0.2 else 3
+    plays, plays_by_period, scoring_plays, penalty_plays = [], [], [], []
+    goals = {home[3]: 0, away[3]: 0}
+    shots = {home[3]: 0, away[3]: 0}
+    for period in range(1, n_periods + 1):
+        n_period_plays = n_plays // n_periods + (1 if period <= n_plays % n_periods else 0)
+        seconds = sorted(rnd.randrange(0, 1200 if period <= 3 else 300) for _ in range(n_period_plays))
+        period_plays = []
+        for second in seconds:
+            event_idx = len(plays)
+            event_type = rnd.choices(events, weights)[0] if period_plays else "FACEOFF"
+            team = rnd.choice([home, away])
+            skaters, goalie = rosters[team[3]]
+            opponent_goalie = rosters[(away if team == home else home)[3]][1]
+            # home attacks right during odd periods
+            attacking_right = (team == home) == (period % 2 == 1)
+            play = {
+                "result": {"event": event_type.replace("_", " ").title(), "eventCode": f"X{event_idx}", "eventTypeId": event_type, "description": ""},
+                "about": {
+                    "eventIdx": event_idx,
+                    "eventId": 50 + event_idx,
+                    "period": period,
+                    "periodType": "REGULAR" if period <= 3 else "OVERTIME",
+                    "ordinalNum": ["1st", "2nd", "3rd", "OT"][period - 1],
+                    "periodTime": f"{second // 60:02d}:{second % 60:02d}",
+                    "periodTimeRemaining": f"{(1200 - second) // 60:02d}:{(1200 - second) % 60:02d}",
+                    "dateTime": (start_time + datetime.timedelta(minutes=25 * (period - 1), seconds=second)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "goals": dict(away=goals[away[3]], home=goals[home[3]]),
+                },
+                "coordinates": {},
+            }
+            if event_type != "STOP":
+                play["team"] = {"id": team[0], "name": team[1], "link": f"/api/v1/teams/{team[0]}", "triCode": team[3]}
+                play["coordinates"] = _coordinates(rnd, attacking_right) if rnd.random() > 0.02 else {}
+                play["players"] = [{"player": rnd.choice(skaters), "playerType": "PlayerID"}]
+            if event_type in ("SHOT", "GOAL"):
+                shots[team[3]] += 1
+                play["result"]["secondaryType"] = rnd.choice(SHOT_TYPES)
+                play["players"] = [
+                    {"player": rnd.choice(skaters), "playerType": "Scorer" if event_type == "GOAL" else "Shooter"},
+                    {"player": opponent_goalie, "playerType": "Goalie"},
+                ]
+            if event_type == "GOAL":
+                goals[team[3]] += 1
+                play["result"]["strength"] = {"code": "EVEN", "name": "Even"}
+                play["result"]["emptyNet"] = rnd.random() < 0.05
+                play["about"]["goals"] = dict(away=goals[away[3]], home=goals[home[3]])
+                scoring_plays.append(event_idx)
+            if event_type == "PENALTY":
+                penalty_plays.append(event_idx)
+            plays.append(play)
+            period_plays.append(event_idx)
+        plays_by_period.append({"startIndex": period_plays[0] if period_plays else 0, "plays": period_plays, "endIndex": period_plays[-1] if period_plays else 0})
+
+    def team_stats(team):
+        return {"teamSkaterStats": {
+            "goals": goals[team[3]], "pim": rnd.randrange(0, 20), "shots": shots[team[3]],
+            "powerPlayPercentage": "0.0", "powerPlayGoals": 0.0, "powerPlayOpportunities": 0.0,
+            "faceOffWinPercentage": "50.0", "blocked": rnd.randrange(5, 25), "takeaways": rnd.randrange(2, 12),
+            "giveaways": rnd.randrange(2, 15), "hits": rnd.randrange(10, 40),
+        }}
+
+    def boxscore_team(team):
+        skaters, goalie = rosters[team[3]]
+        return {
+            "team": _team_json(team),
+            "teamStats": team_stats(team),
+            "players": {f"ID{player['id']}": {"person": player, "stats": {}} for player in skaters + [goalie]},
+        }
+
+    stars = rnd.sample(rosters[home[3]][0] + rosters[away[3]][0], 3)
+    return {
+        "copyright": "synthetic",
+        "gamePk": gamePk,
+        "link": f"/api/v1/game/{gamePk}/feed/live",
+        "metaData": {"wait": 10, "timeStamp": (start_time + datetime.timedelta(hours=3)).strftime("%Y%m%d_%H%M%S")},
+        "gameData": {
+            "game": {"pk": gamePk, "season": season, "type": game_type},
+            "datetime": {"dateTime": start_time.strftime("%Y-%m-%dT%H:%M:%SZ")},
+            "status": {"abstractGameState": status, "codedGameState": "7" if status == "Final" else "3", "detailedState": status},
+            "teams": {"away": _team_json(away), "home": _team_json(home)},
+            "venue": {"name": f"{home[1]} Arena"},
+        },
+        "liveData": {
+            "plays": {
+                "allPlays": plays,
+                "scoringPlays": scoring_plays,
+                "penaltyPlays": penalty_plays,
+                "playsByPeriod": plays_by_period,
+                "currentPlay": plays[-1] if plays else {},
+            },
+            "linescore": {"currentPeriod": n_periods, "hasShootout": False},
+            "boxscore": {"teams": {"away": boxscore_team(away), "home": boxscore_team(home)}},
+            "decisions": {"firstStar": stars[0], "secondStar": stars[1], "thirdStar": stars[2]},
+        },
+    }
+
+
+def season_gamePks(start_year, n_games=1312, game_type="R"):
+    return [int(f"{start_year}{GAME_TYPE_CODES[game_type]}{i:04d}") for i in range(1, n_games + 1)]
+
+
+def generate_schedule(start_year, n_games=1312, game_type="R", seed=0):
+    """schedule json of a season, games spread over the days from October 12th"""
+    rnd = random.Random(start_year * 1000 + seed)
+    dates = {}
+    for i, gamePk in enumerate(season_gamePks(start_year, n_games, game_type)):
+        date = (datetime.date(start_year, 10, 12) + datetime.timedelta(days=i // 8)).isoformat()
+        home, away = rnd.sample(TEAMS, 2)
+        dates.setdefault(date, []).append({
+            "gamePk": gamePk,
+            "gameType": game_type,
+            "season": f"{start_year}{start_year + 1}",
+            "gameDate": f"{date}T23:00:00Z",
+            "status": {"abstractGameState": "Final"},
+            "teams": {"away": {"team": {"id": away[0], "name": away[1]}}, "home": {"team": {"id": home[0], "name": home[1]}}},
+        })
+    return {"dates": [{"date": date, "games": games} for date, games in dates.items()]}
+
+
+def generate_season(start_year, n_games=1312, n_plays=350, game_type="R", seed=0):
+    """feed/live json of every game of a schedule"""
+    games = []
+    for date in generate_schedule(start_year, n_games, game_type, seed)["dates"]:
+        for game in date["games"]:
+            home = next(team for team in TEAMS if team[0] == game["teams"]["home"]["team"]["id"])
+            away = next(team for team in TEAMS if team[0] == game["teams"]["away"]["team"]["id"])
+            start_time = datetime.datetime.fromisoformat(game["gameDate"][:-1])
+            games.append(generate_game(game["gamePk"], n_plays, game_type, start_time, home, away, seed=seed))
+    return games
+
+
+# bitrates of the video playbacks (see media.MediaIndex)
+PLAYBACKS = [("FLASH_192K_320X180", 320, 180), ("FLASH_450K_400X224", 400, 224), ("FLASH_1200K_640X360", 640, 360), ("FLASH_1800K_960X540", 960, 540)]
+
+
+def _playbacks(path):
+    return [{"name": name, "width": str(width), "height": str(height), "url": f"https://synthetic.invalid/{path}/{name}.mp4"} for name, width, height in PLAYBACKS]
+
+
+def generate_media(game_json):
+    """game/{gamePk}/content json of a game: a recap and a highlight per goal"""
+    gamePk = game_json["gamePk"]
+    milestones = []
+    for play in game_json["liveData"]["plays"]["allPlays"]:
+        if play["result"]["eventTypeId"] != "GOAL":
+            continue
+        title = f"{play['players'][0]['player']['fullName']} scores"
+        milestones.append({
+            "type": "GOAL",
+            "statsEventId": str(play["about"]["eventId"]),
+            "ordinalNum": play["about"]["ordinalNum"],
+            "periodTime": play["about"]["periodTime"],
+            "highlight": {"title": title, "description": f"{title} ({play['team']['triCode']})", "playbacks": _playbacks(f"{gamePk}/{play['about']['eventId']}")},
+        })
+    return {
+        "link": f"/api/v1/game/{gamePk}/content",
+        "media": {
+            "epg": [{"title": "Recap", "items": [{"playbacks": _playbacks(f"{gamePk}/recap")}]}],
+            "milestones": {"items": milestones},
+        },
+    }
+
+
+def _ordinal(n):
+    suffix = "th" if 10 <= n % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+    return f"{n}{suffix}"
+
+
+def _season_team_stats(start_year, seed=0):
+    """teamStats splits of every team: the values, then the rankings"""
+    rnd = random.Random(start_year * 7919 + seed)
+    values = {}
+    for team in TEAMS:
+        wins = rnd.randrange(20, 60)
+        ot = rnd.randrange(3, 15)
+        losses = 82 - wins - ot
+        goals, goals_against = rnd.uniform(2.3, 4.0), rnd.uniform(2.3, 4.0)
+        values[team[0]] = {
+            "gamesPlayed": 82, "wins": wins, "losses": losses, "ot": ot, "pts": 2 * wins + ot,
+            "ptPctg": f"{100 * (2 * wins + ot) / 164:.1f}", "goalsPerGame": round(goals, 3), "goalsAgainstPerGame": round(goals_against, 3),
+            "powerPlayPercentage": f"{rnd.uniform(12, 28):.1f}", "penaltyKillPercentage": f"{rnd.uniform(72, 88):.1f}",
+            "shotsPerGame": round(rnd.uniform(27, 36), 4), "shotsAllowed": round(rnd.uniform(27, 36), 4),
+            "faceOffWinPercentage": f"{rnd.uniform(45, 55):.1f}", "shootingPctg": round(rnd.uniform(8, 12), 1), "savePctg": round(rnd.uniform(0.89, 0.93), 3),
+        }
+    rankings = {team_id: {} for team_id in values}
+    for stat in values[TEAMS[0][0]]:
+        if stat == "gamesPlayed":
+            continue
+        # fewer is better for these
+        reverse = stat not in ("losses", "goalsAgainstPerGame", "shotsAllowed")
+        ranked = sorted(values, key=lambda team_id: float(values[team_id][stat]), reverse=reverse)
+        for rank, team_id in enumerate(ranked, start=1):
+            rankings[team_id][stat] = _ordinal(rank)
+    return values, rankings
+
+
+def generate_teams(expand=None, season=None, seed=0):
+    """teams json, with the current roster of each team (expand="team.roster")
+    or its stats of the season (expand="team.stats", season="20212022")"""
+    teams = []
+    if expand == "team.stats":
+        values, rankings = _season_team_stats(int((season or "2021")[:4]), seed)
+    for team in TEAMS:
+        team_json = _team_json(team)
+        if expand == "team.roster":
+            skaters, _ = _roster(team, random.Random(team[0]))
+            goalies = [{"id": 8470000 + team[0] * 100 + 90 + i, "fullName": f"{team[2]} Goalie {i}"} for i in range(2)]
+            positions = ["Center", "Left Wing", "Right Wing", "Defenseman"]
+            team_json["roster"] = {"roster": [
+                {"person": player, "position": {"name": positions[i % len(positions)]}} for i, player in enumerate(skaters)
+            ] + [{"person": goalie, "position": {"name": "Goalie"}} for goalie in goalies]}
+        if expand == "team.stats":
+            team_json["teamStats"] = [{"type": {"displayName": "statsSingleSeason"}, "splits": [
+                {"stat": values[team[0]], "team": _team_json(team)},
+                {"stat": rankings[team[0]], "team": _team_json(team)},
+            ]}]
+        teams.append(team_json)
+    return {"teams": teams}
+
+
+def generate_year_by_year(player_id, last_year=2021, seed=0):
+    """people/{id}/stats?stats=yearByYear json of a player of a synthetic roster"""
+    rnd = random.Random(player_id * 31 + seed)
+    team_id = (player_id - 8470000) // 100
+    team = next((team for team in TEAMS if team[0] == team_id), TEAMS[0])
+    goalie = (player_id - 8470000) % 100 >= 90
+    splits = []
+    for i, start_year in enumerate(range(last_year - rnd.randrange(1, 8), last_year + 1)):
+        games = rnd.randrange(10, 83)
+        if goalie:
+            stat = {"games": games, "wins": rnd.randrange(0, games + 1), "savePercentage": round(rnd.uniform(0.88, 0.93), 3)}
+        else:
+            goals, assists = rnd.randrange(0, 40), rnd.randrange(0, 50)
+            stat = {"games": games, "goals": goals, "assists": assists, "points": goals + assists}
+        splits.append({
+            "season": f"{start_year}{start_year + 1}",
+            "sequenceNumber": 1,
+            "league": {"id": 133, "name": "National Hockey League"},
+            "team": {"id": team[0], "name": team[1]},
+            "stat": stat,
+        })
+    return {"stats": [{"type": {"displayName": "yearByYear"}, "splits": splits}]}
@@ -0,0 +1,69 @@
+"""Stats of every team of a season, as one table.
+    stats_df = league_stats_to_df(api_engine.get_league_stats(2021))
+    compare_teams(stats_df, ["TOR", "MTL"])
+"""
+import re
+
+import pandas as pd
+
+
+TEAM_COLUMNS = ["team_id", "team_name", "team_full_name", "team_triCode"]
+# rankings are ordinals (i.e., "1st", "32nd")
+_ORDINAL = re.compile(r"^(\d+)(?:st|nd|rd|th)$")
+
+
+def _to_rank(value):
+    match = _ORDINAL.match(str(value).strip())
+    return int(match.group(1)) if match else None
+
+
+def league_stats_to_df(teams_json):
+    """one row per team of the teams?expand=team.stats response, with a column per stat
+    and a `{stat}_rank` column for its ranking in the league;
+    the first split of teamStats holds the values, the second one the rankings"""
+    records = []
+    for team in teams_json["teams"]:
+        record = dict(
+            team_id=team["id"],
+            team_name=team["teamName"],
+            team_full_name=team["name"],
+            team_triCode=team["abbreviation"],
+        )
+        for team_stats in team.get("teamStats", []):
+            splits = team_stats.get("splits", [])
+            if splits:
+                record.update(splits[0].get("stat", {}))
+            if len(splits) > 1:
+                record.update({f"{name}_rank": _to_rank(value) for name, value in splits[1].get("stat", {}).items()})
+        records.append(record)
+
+    stats_df = pd.DataFrame.from_records(records)
+    if stats_df.empty:
+        return pd.DataFrame(columns=TEAM_COLUMNS)
+    # percentages come as strings (i.e., "21.5")
+    for column in stats_df.columns.difference(TEAM_COLUMNS):
+        stats_df[column] = pd.to_numeric(stats_df[column], errors="coerce")
+    return stats_df.sort_values("team_full_name", ignore_index=True)
+
+
+def stat_columns(stats_df):
+    """names of the stats of the table, without their ranking"""
+    return [column for column in stats_df.columns if column not in TEAM_COLUMNS and not column.endswith("_rank")]
+
+
+def compare_teams(stats_df, team_triCodes, stats=None):
+    """table of the stats (rows) of the given teams (columns)"""
+    if stats is None:
+        stats = stat_columns(stats_df)
+    teams_df = stats_df.set_index("team_triCode").reindex(list(team_triCodes))
+    return teams_df[list(stats)].T
+
+
+def team_card(stats_df, team_triCode):
+    """value and ranking of each stat of a team"""
+    row = stats_df.loc[stats_df.team_triCode == team_triCode].iloc[0]
+    stats = stat_columns(stats_df)
+    return pd.DataFrame({
+        "value": [row[stat] for stat in stats],
+        "rank": [row.get(f"{stat}_rank") for stat in stats],
+    }, index=stats)
@@ -0,0 +1,9 @@
+"""Tests of the app modules, on synthetic feeds (see synthetic.py).
+    pip install pytest
+    python -m pytest app/tests
+"""
+import os
+import sys
+
+# the modules of the app import each other by name, as when streamlit runs app.py from app/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
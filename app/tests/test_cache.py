@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+
+import pytest
+
+from cache import DiskCache, atomic_path, memoize
+
+
+def test_disk_cache_get_set(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    key = DiskCache.make_key("schedule", {"season": "20212022"})
+    assert key == DiskCache.make_key("schedule", {"season": "20212022"})
+    assert key != DiskCache.make_key("schedule", {"season": "20202021"})
+    assert cache.get(key) is None
+
+    cache.set(key, {"dates": []})
+    assert cache.get(key) == {"dates": []}
+    # another instance on the same directory, as another replica
+    assert DiskCache(str(tmp_path)).get(key) == {"dates": []}
+
+
+def test_disk_cache_ttl(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    cache.set("live", {"status": "Live"}, ttl=0.05)
+    cache.set("final", {"status": "Final"})
+    assert cache.get("live") == {"status": "Live"}
+    time.sleep(0.06)
+    assert cache.get("live") is None
+    assert cache.get("final") == {"status": "Final"}
+
+
+def test_disk_cache_unreadable_entry_is_a_miss(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    cache.set("key", {"a": 1})
+    with open(cache._path("key"), "w") as f:
+        f.write('{"expires_at": null, "da')
+    assert cache.get("key") is None
+
+
+def test_disk_cache_concurrent_writes(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    values = [{"writer": i, "plays": list(range(2000))} for i in range(8)]
+    seen, errors = [], []
+
+    def write(value):
+        try:
+            for _ in range(20):
+                cache.set("key", value)
+                seen.append(cache.get("key"))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(value,)) for value in values]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    # readers only ever see whole entries
+    assert all(value in values for value in seen)
+    assert os.listdir(os.path.dirname(cache._path("key"))) == ["key.json"]
+
+
+def test_atomic_path_keeps_the_target_on_failure(tmp_path):
+    path = str(tmp_path / "index.parquet")
+    with atomic_path(path) as tmp:
+        with open(tmp, "w") as f:
+            f.write("first")
+    with pytest.raises(RuntimeError):
+        with atomic_path(path) as tmp:
+            with open(tmp, "w") as f:
+                f.write("partial")
+            raise RuntimeError
+    assert open(path).read() == "first"
+    assert os.listdir(tmp_path) == ["index.parquet"]
+
+
+def test_memoize_evicts_least_recently_used():
+    calls = []
+
+    @memoize(maxsize=2)
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    assert [square(1), square(2), square(1), square(3)] == [1, 4, 1, 9]
+    # 2 was the least recently used when 3 was added
+    assert square(1) == 1 and square(2) == 4
+    assert calls == [1, 2, 3, 2]
+    assert square.cache_info() == dict(hits=2, misses=4, size=2, maxsize=2)
+
+
+def test_memoize_key():
+    calls = []
+
+    @memoize(maxsize=4, key=lambda game: game["pk"])
+    def get_pk(game):
+        calls.append(game)
+        return game["pk"]
+
+    get_pk({"pk": 1, "plays": [1]})
+    get_pk({"pk": 1, "plays": [1, 2]})
+    assert len(calls) == 1
+
+
+def test_memoize_ttl_expires_results():
+    calls = []
+
+    @memoize(maxsize=4, ttl=0.05)
+    def now(x):
+        calls.append(x)
+        return len(calls)
+
+    assert now("a") == now("a") == 1
+    time.sleep(0.06)
+    assert now("a") == 2
+    assert now.cache_info()["size"] == 1
+
+
+def test_memoize_ttl_of_the_result():
+    calls = []
+
+    # as data_query._game_ttl: final games never expire, games in progress do
+    @memoize(maxsize=4, ttl=lambda game: None if game["final"] else 0)
+    def get_game(gamePk, final):
+        calls.append(gamePk)
+        return {"gamePk": gamePk, "final": final}
+
+    get_game(1, True)
+    get_game(1, True)
+    get_game(2, False)
+    get_game(2, False)
+    assert calls == [1, 2, 2]
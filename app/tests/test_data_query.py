@@ -0,0 +1,57 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import data_query
+from data_query import ApiEngine, ApiError, fetch_concurrently
+
+
+BODIES = {
+    "/html": ("text/html", b"<html><body>502 Bad Gateway</body></html>"),
+    "/truncated": ("application/json", b'{"gamePk": 1, "liveData": {"plays'),
+    "/game/1/feed/live": ("text/html", b"<html>Service unavailable</html>"),
+}
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        content_type, body = BODIES.get(self.path, ("application/json", json.dumps({"path": self.path}).encode()))
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def api_url(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(data_query, "API_URL", f"http://127.0.0.1:{server.server_address[1]}")
+    yield
+    server.shutdown()
+
+
+@pytest.mark.parametrize("endpoint", ["html", "truncated"])
+def test_query_api_invalid_json_raises_api_error(api_url, endpoint):
+    with pytest.raises(ApiError) as e:
+        ApiEngine.query_api(endpoint)
+    assert e.value.url.endswith(endpoint)
+
+
+def test_query_api_selective_invalid_json_raises_api_error(api_url):
+    with pytest.raises(ApiError):
+        ApiEngine.query_api("game/1/feed/live", selective=True)
+
+
+def test_fetch_concurrently_skips_invalid_responses(api_url):
+    results = {}
+    with pytest.raises(ApiError, match="Could not download 2 pages"):
+        for key, response in fetch_concurrently(ApiEngine.query_api, ["a", "html", "b", "truncated", "c"], max_workers=2, name="pages"):
+            results[key] = response
+    assert results == {key: {"path": f"/{key}"} for key in ["a", "b", "c"]}
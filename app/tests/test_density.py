@@ -0,0 +1,36 @@
+import numpy as np
+
+import synthetic
+from density import ShotDensity, X_EDGES, group_densities
+from features import normalize_plays_coords
+from utils import game_to_df
+
+
+def _plays_df():
+    return game_to_df(synthetic.generate_game(2021020001, n_plays=300), augment=True)
+
+
+def test_group_densities_counts_every_shot():
+    plays_df = _plays_df()
+    densities = group_densities(plays_df, by="team_initiative_id")
+    has_coords = plays_df[["x_coord", "y_coord"]].notna().all(axis=1)
+    assert set(densities) == set(plays_df["team_initiative_id"])
+    for team, density in densities.items():
+        team_mask = has_coords & (plays_df["team_initiative_id"] == team)
+        assert density.n_shots == team_mask.sum()
+        assert density.goals.sum() == (team_mask & (plays_df["event_type_id"] == "GOAL")).sum()
+    assert ShotDensity.merge(densities.values()).n_shots == ShotDensity.from_plays(plays_df).n_shots
+
+
+def test_density_on_the_shotmap_half_of_each_team():
+    plays_df = _plays_df()
+    # the shotmap of the game page
+    points_df = normalize_plays_coords(plays_df, side=False)
+    sides = points_df.groupby("team_initiative_id")["x_coord_norm"].mean()
+    # the teams attack opposite halves
+    assert (sides > 0).sum() == 1
+    for team, team_df in points_df.groupby("team_initiative_id"):
+        density = ShotDensity.from_plays(plays_df[plays_df["team_initiative_id"] == team], side=False)
+        x_centers = (X_EDGES[:-1] + X_EDGES[1:]) / 2
+        density_mean_x = (density.shots.sum(axis=1) * x_centers).sum() / density.n_shots
+        assert np.sign(density_mean_x) == np.sign(team_df["x_coord_norm"].mean())
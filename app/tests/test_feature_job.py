@@ -0,0 +1,17 @@
+import synthetic
+from data_query import ApiEngine
+from feature_job import extract_features
+from features import FeaturePipeline
+from utils import games_to_df
+
+
+def test_extract_features_dummy_columns(tmp_path):
+    api_engine = ApiEngine(str(tmp_path))
+    games = [synthetic.generate_game(2021020001 + i, n_plays=150) for i in range(3)]
+    for game_json in games:
+        api_engine.cache.set(api_engine._cache_key(f"game/{game_json['gamePk']}/feed/live", selective=True), game_json)
+
+    features_df, dummy_columns = extract_features(str(tmp_path), [game_json["gamePk"] for game_json in games])
+    dummies_df = FeaturePipeline(games_to_df(games, augment=True)).transform(FeaturePipeline.DUMMY_FEATURES)
+    assert dummy_columns == list(dummies_df.columns)
+    assert set(dummy_columns) <= set(features_df.columns)
@@ -0,0 +1,52 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import synthetic
+from features import FeaturePipeline, normalize_plays_coords, advanced_features
+from utils import game_json_to_plays_list, game_to_df, games_to_df
+
+import legacy_features
+
+
+def _games(game_type="R"):
+    type_code = "03" if game_type == "P" else "02"
+    return [synthetic.generate_game(int(f"2021{type_code}{i:04d}"), n_plays=250, game_type=game_type) for i in range(10, 20)]
+
+
+@pytest.fixture(params=["R", "P"])
+def plays_df(request):
+    plays_df = games_to_df(_games(request.param), augment=True)
+    # overtime periods count differently in the regular season and the playoffs
+    assert (plays_df["period_idx"] == 4).any()
+    return plays_df
+
+
+def test_game_to_df_matches_records():
+    for game_json in _games():
+        records_df = pd.DataFrame.from_records(game_json_to_plays_list(game_json, augment=True))
+        pd.testing.assert_frame_equal(game_to_df(game_json, augment=True), records_df, check_dtype=False)
+
+
+def test_normalize_plays_coords_matches_legacy(plays_df):
+    for kwargs in [{}, dict(side=False), dict(period=False), dict(x_col="previous_event_x_coord", y_col="previous_event_y_coord")]:
+        expected_df = legacy_features.normalize_plays_coords(plays_df.copy(), **kwargs)
+        pd.testing.assert_frame_equal(normalize_plays_coords(plays_df, **kwargs), expected_df)
+
+
+def test_advanced_features_matches_legacy(plays_df):
+    with warnings.catch_warnings():
+        # the legacy code assigns through chained indexing
+        warnings.simplefilter("ignore")
+        expected_df = legacy_features.advanced_features(plays_df.copy())
+    features_df = advanced_features(plays_df)
+    assert list(features_df.columns) == list(expected_df.columns)
+    pd.testing.assert_frame_equal(features_df, expected_df, check_dtype=False)
+
+
+def test_pipeline_does_not_modify_plays(plays_df):
+    before_df = plays_df.copy()
+    FeaturePipeline(plays_df).transform(FeaturePipeline.ADVANCED_FEATURES + ["is_goal"])
+    pd.testing.assert_frame_equal(plays_df, before_df)
@@ -0,0 +1,99 @@
+import copy
+
+import pandas as pd
+import pytest
+
+import synthetic
+from live import LiveGame, apply_patch
+from utils import game_to_df
+
+
+GAMEPK = 2021020001
+ALL_PLAYS = "/liveData/plays/allPlays"
+
+
+def test_apply_patch():
+    document = {"a": {"b": [1, 2, 3]}, "c": "x"}
+    apply_patch(document, [
+        {"op": "add", "path": "/a/b/-", "value": 4},
+        {"op": "add", "path": "/a/b/0", "value": 0},
+        {"op": "replace", "path": "/c", "value": "y"},
+        {"op": "remove", "path": "/a/b/1"},
+        {"op": "copy", "from": "/a/b/0", "path": "/d"},
+        {"op": "move", "from": "/c", "path": "/e"},
+        {"op": "test", "path": "/d", "value": 0},
+    ])
+    assert document == {"a": {"b": [0, 2, 3, 4]}, "d": 0, "e": "y"}
+    with pytest.raises(ValueError):
+        apply_patch(document, [{"op": "test", "path": "/d", "value": 1}])
+
+
+class FakeApiEngine:
+    """serves a game feed and the patches leading to its next version"""
+    def __init__(self, game_json, patches, updated_json):
+        self.game_json = game_json
+        self.patches = patches
+        self.updated_json = updated_json
+
+    def load_game(self, gamePk):
+        return self.game_json
+
+    def get_game_diff(self, gamePk, start_timecode):
+        patches, self.patches = self.patches, []
+        return patches
+
+    def query_api(self, endpoint):
+        return copy.deepcopy(self.updated_json)
+
+    def update_game(self, game_json):
+        pass
+
+
+def _live_game(n_plays=200):
+    return synthetic.generate_game(GAMEPK, n_plays=n_plays, status="Live")
+
+
+def _assert_same_plays(plays_df, game_json):
+    expected_df = game_to_df(game_json, augment=True)
+    pd.testing.assert_frame_equal(plays_df.reset_index(drop=True), expected_df)
+
+
+def _refresh(before_json, diff, updated_json):
+    live_game = LiveGame(FakeApiEngine(before_json, [{"diff": diff}], updated_json), GAMEPK)
+    return live_game, live_game.refresh()
+
+
+def test_refresh_appends_new_plays():
+    updated_json = _live_game()
+    before_json = copy.deepcopy(updated_json)
+    new_plays = before_json["liveData"]["plays"]["allPlays"][150:]
+    del before_json["liveData"]["plays"]["allPlays"][150:]
+    n_shots_before = len(game_to_df(before_json, augment=True))
+
+    live_game, (new_df, changed) = _refresh(before_json, [{"op": "add", "path": f"{ALL_PLAYS}/-", "value": play} for play in new_plays], updated_json)
+    assert not changed
+    assert len(new_df) == len(game_to_df(updated_json, augment=True)) - n_shots_before
+    _assert_same_plays(live_game.plays_df, updated_json)
+
+
+def test_refresh_replaced_play():
+    before_json = _live_game()
+    updated_json = copy.deepcopy(before_json)
+    position = next(i for i, play in enumerate(updated_json["liveData"]["plays"]["allPlays"]) if play["result"]["eventTypeId"] == "SHOT")
+    updated_json["liveData"]["plays"]["allPlays"][position]["coordinates"] = {"x": 80.0, "y": -3.0}
+
+    live_game, (new_df, changed) = _refresh(before_json, [{"op": "replace", "path": f"{ALL_PLAYS}/{position}/coordinates", "value": {"x": 80.0, "y": -3.0}}], updated_json)
+    assert changed and new_df.empty
+    _assert_same_plays(live_game.plays_df, updated_json)
+
+
+def test_refresh_play_inserted_mid_list_resets():
+    # a play added back after a review, before plays already seen
+    updated_json = _live_game()
+    before_json = copy.deepcopy(updated_json)
+    inserted = before_json["liveData"]["plays"]["allPlays"].pop(50)
+
+    live_game, (new_df, changed) = _refresh(before_json, [{"op": "add", "path": f"{ALL_PLAYS}/50", "value": inserted}], updated_json)
+    assert changed
+    _assert_same_plays(live_game.plays_df, updated_json)
+    assert live_game.game_json == updated_json
@@ -0,0 +1,20 @@
+import synthetic
+from cache import DiskCache
+from mock_api import MockApi
+
+
+def test_replays_expired_recordings(tmp_path):
+    recordings = DiskCache(str(tmp_path))
+    game_json = synthetic.generate_game(2021020001, n_plays=50, status="Live")
+    # recorded while live: expired since
+    recordings.set(DiskCache.make_key("game/2021020001/feed/live"), game_json, ttl=-1)
+    schedule_json = synthetic.generate_schedule(2021, n_games=10)
+    recordings.set(DiskCache.make_key("schedule?season=20212022"), schedule_json, ttl=-1)
+
+    api = MockApi(games_per_season=10, recordings=str(tmp_path))
+    assert api.respond("/game/2021020001/feed/live", {}) == (200, game_json)
+    # the query in the endpoint, as ApiEngine passes some of them
+    assert api.respond("/schedule", {"season": "20212022"}) == (200, schedule_json)
+    # not recorded: generated
+    status, response = api.respond("/game/2021020002/feed/live", {})
+    assert status == 200 and response["gamePk"] == 2021020002
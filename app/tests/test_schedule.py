@@ -0,0 +1,56 @@
+import datetime
+
+import synthetic
+from schedule import ScheduleIndex
+
+
+def _index(start_year=2021, n_games=200):
+    return ScheduleIndex.from_schedule(synthetic.generate_schedule(start_year, n_games))
+
+
+def _scan(games_df, start_date=None, end_date=None, teams=None, game_types=None):
+    """the games matching the filters, checked one by one"""
+    mask = games_df["date"].map(lambda date: (start_date is None or date >= start_date) and (end_date is None or date <= end_date))
+    if teams:
+        mask &= games_df["home_name"].isin(teams) | games_df["away_name"].isin(teams)
+    if game_types:
+        mask &= games_df["game_type"].isin(game_types)
+    return sorted(games_df.loc[mask, "gamePk"])
+
+
+def test_filter_matches_a_scan():
+    index = _index()
+    team, other_team = index.teams[:2]
+    for kwargs in [
+        dict(),
+        dict(start_date="2021-10-15", end_date="2021-10-20"),
+        dict(start_date="2021-10-15"),
+        dict(end_date="2021-10-13"),
+        dict(teams=[team]),
+        dict(teams=[team, other_team], start_date="2021-10-14", end_date="2021-11-01"),
+        dict(game_types=["P"]),
+        dict(start_date="2022-01-01"),
+    ]:
+        assert sorted(index.filter(**kwargs)["gamePk"]) == _scan(index.games_df, **kwargs), kwargs
+
+
+def test_records_round_trip_and_concat():
+    index, next_index = _index(2020), _index(2021)
+    assert ScheduleIndex.from_records(index.to_records()).games_df.equals(index.games_df)
+
+    both = ScheduleIndex.concat([next_index, index])
+    assert both.gamePks == index.gamePks + next_index.gamePks
+    assert list(both.games_df["date"]) == sorted(both.games_df["date"])
+
+
+def test_label():
+    index = _index()
+    game = index.games_df.iloc[0]
+    assert index.label(game["gamePk"]) == f"{game['date']} - {game['away_name']} @ {game['home_name']} (R)"
+    assert index.label(1) == "1"
+
+
+def test_today():
+    today = datetime.date.today()
+    index = _index(today.year if today.month >= 10 else today.year - 1, n_games=1312)
+    assert sorted(index.today()["gamePk"]) == _scan(index.games_df, today.isoformat(), today.isoformat())
@@ -0,0 +1,34 @@
+import io
+import json
+
+import pandas as pd
+import pytest
+
+import selective
+import synthetic
+from data_query import FEED_FIELDS
+from utils import game_to_df, get_metadata
+
+
+@pytest.fixture
+def game_json():
+    return synthetic.generate_game(2021020001, n_plays=300)
+
+
+@pytest.mark.skipif(selective.ijson is None, reason="ijson is not installed")
+def test_stream_fields_matches_select_fields(game_json):
+    fields = list(FEED_FIELDS) + ["gameData.missing", "liveData.plays.currentPlay.about"]
+    streamed = selective.stream_fields(io.BytesIO(json.dumps(game_json).encode("utf-8")), fields)
+    assert streamed == selective.select_fields(game_json, fields)
+    assert json.dumps(streamed) == json.dumps(selective.select_fields(game_json, fields))
+
+
+def test_select_fields():
+    document = {"a": {"b": 1, "c": [1, {"d": 2}]}, "e": "x", "f": {"g": None}}
+    assert selective.select_fields(document, ["e", "a.c", "f.g", "a.missing", "e.not_a_dict"]) == {"a": {"c": [1, {"d": 2}]}, "e": "x", "f": {"g": None}}
+
+
+def test_feed_fields_parse_like_the_full_feed(game_json):
+    selected = selective.select_fields(game_json, FEED_FIELDS)
+    pd.testing.assert_frame_equal(game_to_df(selected, augment=True), game_to_df(game_json, augment=True))
+    assert get_metadata.__wrapped__(selected) == get_metadata.__wrapped__(game_json)
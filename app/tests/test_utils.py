@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+import synthetic
+from features import FeaturePipeline
+from utils import games_to_df, compact_plays_df, expand_plays_df
+
+
+def _plays_df():
+    return games_to_df([synthetic.generate_game(2021020001 + i, n_plays=200) for i in range(3)], augment=True)
+
+
+def _values(series):
+    """values of a column comparable across dtypes: None for missing, floats for numbers"""
+    return [None if pd.isna(value) else float(value) if isinstance(value, (int, float, np.number)) and not isinstance(value, bool) else value
+            for value in series.astype(object)]
+
+
+def test_compact_plays_df_round_trip():
+    plays_df = _plays_df()
+    compact_df, players_df = compact_plays_df(plays_df)
+    assert compact_df.memory_usage(deep=True).sum() < plays_df.memory_usage(deep=True).sum() / 2
+
+    expanded_df = expand_plays_df(compact_df, players_df)
+    assert list(expanded_df.columns) == list(plays_df.columns)
+    for name in ["shooter_id", "goalie_id"]:
+        expanded_df[name] = expanded_df[name].astype(object).map(lambda player_id: None if pd.isna(player_id) else str(player_id))
+    for name in ["game_time", "previous_event_time"]:
+        expanded_df[name] = expanded_df[name].dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+    for name in plays_df.columns:
+        assert _values(expanded_df[name]) == _values(plays_df[name]), name
+
+
+def test_compact_plays_df_column_subset():
+    plays_df = _plays_df()[["gamePk", "shooter_id", "event_type_id", "x_coord"]]
+    compact_df, players_df = compact_plays_df(plays_df)
+    assert list(compact_df.columns) == list(plays_df.columns)
+    assert players_df.empty
+    assert str(compact_df["shooter_id"].dtype) == "Int32"
+
+
+def test_features_of_compact_plays():
+    plays_df = _plays_df()
+    compact_df, _ = compact_plays_df(plays_df)
+    expected_df = FeaturePipeline(plays_df).transform(FeaturePipeline.ADVANCED_FEATURES + ["is_goal"])
+    features_df = FeaturePipeline(compact_df).transform(FeaturePipeline.ADVANCED_FEATURES + ["is_goal"])
+    pd.testing.assert_frame_equal(features_df, expected_df, check_dtype=False, check_column_type=False)
@@ -0,0 +1,99 @@
+import threading
+
+import numpy as np
+
+import synthetic
+from utils import game_to_df
+from warehouse import PlaysWarehouse
+
+
+def _warehouse(tmp_path, gamePks):
+    warehouse = PlaysWarehouse(str(tmp_path / "warehouse"))
+    for gamePk in gamePks:
+        warehouse.ingest_game(synthetic.generate_game(gamePk, n_plays=120))
+    return warehouse
+
+
+def test_query_without_game_type_skips_season_index(tmp_path):
+    warehouse = _warehouse(tmp_path, [2021020001, 2021020002])
+    warehouse.build_index("20212022")
+
+    plays_df = warehouse.query(seasons="20212022", columns=["gamePk", "event_idx"])
+    assert sorted(plays_df["gamePk"].unique()) == [2021020001, 2021020002]
+    assert len(warehouse.query(columns=["gamePk"])) == len(plays_df)
+
+
+def test_concurrent_build_index(tmp_path):
+    warehouse = _warehouse(tmp_path, [2021020001 + i for i in range(4)])
+    errors = []
+
+    def build():
+        try:
+            warehouse.build_index("20212022")
+        except Exception as e:
+            errors.append(e)
+
+    for _ in range(5):
+        # as after a game is stored, so that every thread starts a build
+        open(warehouse._stale_index_path("20212022"), "w").close()
+        threads = [threading.Thread(target=build) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+
+    index_df = warehouse.load_index("20212022")
+    assert sorted(index_df["gamePk"].unique()) == [2021020001 + i for i in range(4)]
+    assert warehouse.shot_density(seasons="20212022").n_shots > 0
+
+
+def test_concurrent_ingest_of_one_game(tmp_path):
+    # as the page and the cache warmer threads, or the ingest_season command, storing the same game
+    warehouse = PlaysWarehouse(str(tmp_path / "warehouse"))
+    game_json = synthetic.generate_game(2021020001, n_plays=120)
+    errors = []
+
+    def ingest():
+        try:
+            for _ in range(5):
+                warehouse.ingest_game(game_json)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=ingest) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(warehouse.load_game(2021020001)) == len(game_to_df(game_json, augment=True))
+    assert not list((tmp_path / "warehouse").rglob("*.tmp"))
+
+
+def test_filtered_shot_density_matches_precomputed(tmp_path):
+    warehouse = _warehouse(tmp_path, [2021020001 + i for i in range(4)])
+    gamePks = [2021020001 + i for i in range(4)]
+    shooter_id = warehouse.query(columns=["shooter_id"], event_type="SHOT")["shooter_id"].iloc[0]
+    team = warehouse.query(columns=["team_initiative_id"])["team_initiative_id"].iloc[0]
+
+    for kwargs in [dict(shooter=shooter_id), dict(team=team)]:
+        # binned from a compact query result, and read from the densities of the season index
+        filtered = warehouse.shot_density(gamePks=gamePks, **kwargs)
+        precomputed = warehouse.shot_density(seasons="20212022", **kwargs)
+        assert filtered.n_shots > 0
+        np.testing.assert_array_equal(filtered.shots, precomputed.shots)
+        np.testing.assert_array_equal(filtered.goals, precomputed.goals)
+
+
+def test_game_in_progress_parsed_once_per_version(tmp_path):
+    # as the cache warmer and then the page opening a live game
+    warehouse = PlaysWarehouse(str(tmp_path / "warehouse"))
+    game_json = synthetic.generate_game(2021020901, n_plays=120, status="Live")
+    plays_df = warehouse.get_game_plays(game_json)
+    assert warehouse.get_game_plays(game_json) is plays_df
+    assert not warehouse.has_game(2021020901)
+
+    updated_json = synthetic.generate_game(2021020901, n_plays=130, status="Live")
+    updated_json["metaData"]["timeStamp"] = "20991231_000000"
+    assert len(warehouse.get_game_plays(updated_json)) == len(game_to_df(updated_json, augment=True))
@@ -0,0 +1,127 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import synthetic
+import xg
+from utils import game_to_df
+
+
+FEATURES = ["dist_from_net", "angle_from_net", "empty_net"]
+
+
+def _random_tree(rng, depth=4):
+    n_nodes = 2 ** (depth + 1) - 1
+    children = np.arange(n_nodes) * 2 + 1
+    return dict(
+        feature=rng.integers(len(FEATURES), size=n_nodes).tolist(),
+        threshold=rng.normal(20, 30, size=n_nodes).tolist(),
+        left=np.where(children < n_nodes, children, -1).tolist(),
+        right=np.where(children < n_nodes, children + 1, -1).tolist(),
+        value=rng.normal(0, 0.5, size=n_nodes).tolist(),
+        missing_left=rng.integers(2, size=n_nodes).astype(bool).tolist(),
+    )
+
+
+def _tree_value(tree, row, comparison):
+    """walk down one tree for one row"""
+    node = 0
+    while tree["left"][node] >= 0:
+        x, threshold = row[tree["feature"][node]], tree["threshold"][node]
+        if np.isnan(x):
+            go_left = tree["missing_left"][node]
+        else:
+            go_left = x < threshold if comparison == "<" else x <= threshold
+        node = tree["left"][node] if go_left else tree["right"][node]
+    return tree["value"][node]
+
+
+def _features_df(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    features_df = pd.DataFrame({
+        "dist_from_net": rng.uniform(0, 100, n).round(),
+        "angle_from_net": rng.uniform(-90, 90, n).round(),
+        "empty_net": rng.integers(2, size=n).astype(float),
+    })
+    features_df.loc[::7, "angle_from_net"] = np.nan
+    return features_df
+
+
+def test_linear_model():
+    features_df = _features_df()
+    model = xg.LinearModel(FEATURES, [-0.05, 0.01, 2.0], intercept=-0.5)
+    raw = features_df.fillna(0).to_numpy() @ np.array([-0.05, 0.01, 2.0]) - 0.5
+    np.testing.assert_allclose(model.predict(features_df), 1 / (1 + np.exp(-raw)))
+    # missing columns are zeros
+    np.testing.assert_allclose(model.predict(features_df.drop(columns=["empty_net"])), model.predict(features_df.assign(empty_net=0.0)))
+
+
+@pytest.mark.parametrize("comparison", ["<=", "<"])
+@pytest.mark.parametrize("aggregate", ["sum", "mean"])
+def test_tree_ensemble_matches_a_walk_per_row(comparison, aggregate):
+    rng = np.random.default_rng(1)
+    trees = [_random_tree(rng) for _ in range(10)]
+    model = xg.TreeEnsemble(FEATURES, trees, base_score=-1.0, aggregate=aggregate, comparison=comparison)
+    features_df = _features_df()
+    # thresholds hit exactly, so that the comparison matters
+    features_df.loc[::5, "dist_from_net"] = trees[0]["threshold"][0]
+
+    X = features_df.to_numpy()
+    raw = np.array([sum(_tree_value(tree, row, comparison) for tree in trees) for row in X])
+    if aggregate == "mean":
+        raw /= len(trees)
+    np.testing.assert_allclose(model.predict(features_df), 1 / (1 + np.exp(-(raw - 1.0))))
+
+
+def test_model_json_round_trip(tmp_path):
+    rng = np.random.default_rng(2)
+    features_df = _features_df()
+    for model in [
+        xg.LinearModel(FEATURES, [-0.05, 0.01, 2.0], intercept=-0.5),
+        xg.TreeEnsemble(FEATURES, [_random_tree(rng) for _ in range(3)], comparison="<"),
+    ]:
+        path = str(tmp_path / "model.json")
+        xg.save_model(model, path)
+        np.testing.assert_allclose(xg.load_model(path).predict(features_df), model.predict(features_df))
+    with pytest.raises(ValueError):
+        xg.model_from_dict({"type": "svm", "features": FEATURES})
+
+
+def test_get_model_reloads_a_changed_file(tmp_path):
+    path = str(tmp_path / "model.json")
+    assert xg.get_model(path) is None
+    xg.save_model(xg.LinearModel(FEATURES, [0, 0, 0], intercept=0.0), path)
+    first = xg.get_model(path)
+    assert xg.get_model(path) is first
+
+    xg.save_model(xg.LinearModel(FEATURES, [0, 0, 0], intercept=1.0), path)
+    os.utime(path, (os.path.getatime(path), os.path.getmtime(path) + 10))
+    second = xg.get_model(path)
+    assert second.intercept == 1.0 and second.name != first.name
+
+
+def test_score_plays_and_team_totals():
+    plays_df = game_to_df(synthetic.generate_game(2021020001, n_plays=300), augment=True)
+    model = xg.LinearModel(xg.BASELINE_FEATURES, np.full(len(xg.BASELINE_FEATURES), 0.01), -2.5, pipeline_features=xg.BASELINE_FEATURES)
+    scores = xg.score_plays(model, plays_df)
+    assert scores.index.equals(plays_df.index)
+    assert ((scores > 0) & (scores < 1)).all()
+
+    totals_df = xg.team_totals(plays_df, scores)
+    assert totals_df["shots"].sum() == len(plays_df)
+    assert totals_df["xG"].sum() == pytest.approx(scores.sum(), abs=0.01)
+    assert xg.score_plays(model, plays_df.iloc[:0]).empty
+
+
+def test_fit_logistic_recovers_coefficients():
+    rng = np.random.default_rng(3)
+    features_df = _features_df(n=20000, seed=4).fillna(0)
+    coefficients, intercept = np.array([-0.04, 0.005, 1.5]), -0.5
+    p = 1 / (1 + np.exp(-(features_df.to_numpy() @ coefficients + intercept)))
+    features_df["is_goal"] = (rng.uniform(size=len(p)) < p).astype(int)
+
+    model = xg.fit_logistic(features_df, FEATURES, l2=0.0)
+    np.testing.assert_allclose(model.coefficients, coefficients, atol=0.1 * np.abs(coefficients).max())
+    assert model.intercept == pytest.approx(intercept, abs=0.15)
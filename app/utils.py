@@ -1,6 +1,8 @@
-import streamlit as st
+import numpy as np
 import pandas as pd
 
+from cache import memoize
+
 def parse_gamePk(gamePk):
     """
     https://statsapi.web.nhl.com/api/v1/gameTypes
@@ -34,6 +36,16 @@ def parse_year_to_season(start_year):
         return str(start_year) + str(start_year+1)
 
 
+# gamePk game type digits to the type found in gameData.game
+GAME_TYPE_CODES = {"01": "PR", "02": "R", "03": "P", "04": "A"}
+
+
+def gamePk_to_season_and_type(gamePk):
+    """return the season and game type of a gamePk (i.e., 2021020001 -> ("20212022", "R"))"""
+    start_year = int(str(gamePk)[:4])
+    return parse_year_to_season(start_year), GAME_TYPE_CODES[str(gamePk)[4:6]]
+
+
 def play_json_to_play_dict(play_json):
     # returns nothing if the event is not of type SHOT or GOAL
     if play_json["result"]["eventTypeId"] not in ["SHOT", "GOAL"]:
@@ -81,53 +93,66 @@ def play_json_to_play_dict(play_json):
     return play_dict
 
 
-def augment_with_previous_event(all_plays_list, plays_dict_list):
+def index_plays_by_event_idx(all_plays_list):
+    """map each eventIdx to its play; build it once per game"""
+    return {play_json["about"]["eventIdx"]: play_json for play_json in all_plays_list}
+
+
+def previous_event_prefix(n_back):
+    """column prefix of the event `n_back` events earlier (previous_event, previous_2_event, ...)"""
+    if n_back == 1:
+        return "previous_event"
+    return f"previous_{n_back}_event"
+
+
+def previous_event_dict(plays_index, event_idx, n_back=1):
+    """describe the event `n_back` events before event_idx, looked up in the plays index"""
+    prefix = previous_event_prefix(n_back)
+    previous_event_idx = event_idx - n_back
+    previous_event = {
+        f"{prefix}_idx": previous_event_idx,
+        f"{prefix}_stats_id": None,
+        f"{prefix}_period": None,
+        f"{prefix}_period_time": None,
+        f"{prefix}_time": None,
+        f"{prefix}_type": None,
+        f"{prefix}_x_coord": None,
+        f"{prefix}_y_coord": None,
+    }
+    
+    play_json = plays_index.get(previous_event_idx)
+    if play_json is not None:
+        previous_event[f"{prefix}_type"] = play_json["result"]["eventTypeId"]
+        previous_event[f"{prefix}_stats_id"] = play_json["about"]["eventId"]
+        previous_event[f"{prefix}_period"] = int(play_json["about"]["period"])
+        previous_event[f"{prefix}_period_time"] = play_json["about"]["periodTime"]
+        previous_event[f"{prefix}_time"] = play_json["about"]["dateTime"]
+        previous_event[f"{prefix}_x_coord"] = play_json["coordinates"].get("x")
+        previous_event[f"{prefix}_y_coord"] = play_json["coordinates"].get("y")
+    
+    return previous_event
+
+
+def augment_with_previous_event(all_plays_list, plays_dict_list, n_previous=1):
+    """add the `n_previous` events preceding each play to its dict"""
+    plays_index = index_plays_by_event_idx(all_plays_list)
+    
     augmented_plays_dict = []
     for play_dict in plays_dict_list:
-        current_event_idx = play_dict["event_idx"]
-        previous_event_idx = current_event_idx - 1
-        
-        previous_event = {
-            "previous_event_idx": previous_event_idx,
-            "previous_event_stats_id": None,
-            "previous_event_period": None,
-            "previous_event_period_time": None,
-            "previous_event_time": None,
-            "previous_event_type": None,
-            "previous_event_x_coord": None,
-            "previous_event_y_coord": None,
-        }
-        
-        for play_json in all_plays_list:
-            if play_json["about"]["eventIdx"] == previous_event_idx:
-                previous_event["previous_event_type"] = play_json["result"]["eventTypeId"]
-                previous_event["previous_event_stats_id"] = play_json["about"]["eventId"]
-                previous_event["previous_event_period"] = int(play_json["about"]["period"])
-                previous_event["previous_event_period_time"] = play_json["about"]["periodTime"]
-                previous_event["previous_event_time"] = play_json["about"]["dateTime"]
-                previous_event["previous_event_x_coord"] = play_json["coordinates"].get("x")
-                previous_event["previous_event_y_coord"] = play_json["coordinates"].get("y")
-                
-                break
-            
-        play_dict.update(previous_event)
+        for n_back in range(1, n_previous + 1):
+            play_dict.update(previous_event_dict(plays_index, play_dict["event_idx"], n_back))
         augmented_plays_dict.append(play_dict)
         
     return augmented_plays_dict
 
 
-def game_json_to_plays_list(game_json, augment=False):
+def game_json_to_plays_list(game_json, augment=False, n_previous=1):
     all_plays_list = game_json["liveData"]["plays"]["allPlays"]
     plays_dict_list = list(filter(None, [play_json_to_play_dict(play) for play in all_plays_list]))
     if augment:
-        plays_dict_list = augment_with_previous_event(all_plays_list, plays_dict_list)
+        plays_dict_list = augment_with_previous_event(all_plays_list, plays_dict_list, n_previous=n_previous)
     
-    game_metadata = {
-        "gamePk": game_json["gameData"]["game"]["pk"],
-        "game_season": game_json["gameData"]["game"]["season"],
-        "game_type": game_json["gameData"]["game"]["type"],
-        "game_start_time": game_json["gameData"]["datetime"].get("dateTime")
-    }
+    game_metadata = game_json_to_metadata(game_json)
     
     plays_with_metadata = []
     for play_dict in plays_dict_list:
@@ -136,7 +161,12 @@ def game_json_to_plays_list(game_json, augment=False):
         
     return plays_with_metadata
 
-@st.cache
+def game_json_key(game_json):
+    """cheap identifier of a game feed: its gamePk and the time it was last updated"""
+    return game_json["gameData"]["game"]["pk"], game_json["metaData"]["timeStamp"]
+
+
+@memoize(maxsize=64, key=game_json_key)
 def get_metadata(game_json):
     metadata_dict = {
         # game metadata
@@ -194,12 +224,229 @@ def get_metadata(game_json):
     return metadata_dict
 
 
-def get_highlight_title(highlight):
-    idx = highlight["ordinalNum"]
-    title = highlight["highlight"].get("title")
-    return f"{idx} - {title}"
+SHOT_EVENT_TYPES = ("SHOT", "GOAL")
+
+PLAY_COLUMNS = [
+    "event_idx", "event_stats_id", "event_type_id", "period_idx", "period_type",
+    "game_time", "period_time", "shot_type", "team_initiative_id", "team_initiative_name",
+    "x_coord", "y_coord", "shooter_id", "shooter_name", "goalie_id", "goalie_name",
+    "strength", "empty_net_bool",
+]
+
+
+def game_json_to_metadata(game_json):
+    return {
+        "gamePk": game_json["gameData"]["game"]["pk"],
+        "game_season": game_json["gameData"]["game"]["season"],
+        "game_type": game_json["gameData"]["game"]["type"],
+        "game_start_time": game_json["gameData"]["datetime"].get("dateTime")
+    }
+
+
+def plays_to_columns(all_plays_list):
+    """extract the SHOT and GOAL plays into one list per column (same columns as play_json_to_play_dict)"""
+    columns = {name: [] for name in PLAY_COLUMNS}
+    event_idx, event_stats_id, event_type_id = columns["event_idx"], columns["event_stats_id"], columns["event_type_id"]
+    period_idx, period_type, game_time = columns["period_idx"], columns["period_type"], columns["game_time"]
+    period_time, shot_type = columns["period_time"], columns["shot_type"]
+    team_id, team_name = columns["team_initiative_id"], columns["team_initiative_name"]
+    x_coord, y_coord = columns["x_coord"], columns["y_coord"]
+    shooter_id, shooter_name = columns["shooter_id"], columns["shooter_name"]
+    goalie_id, goalie_name = columns["goalie_id"], columns["goalie_name"]
+    strength, empty_net = columns["strength"], columns["empty_net_bool"]
+    
+    for play_json in all_plays_list:
+        result = play_json["result"]
+        if result["eventTypeId"] not in SHOT_EVENT_TYPES:
+            continue
+        about = play_json["about"]
+        team = play_json["team"]
+        coordinates = play_json["coordinates"]
+        
+        event_idx.append(about["eventIdx"])
+        event_stats_id.append(about["eventId"])
+        event_type_id.append(result["eventTypeId"])
+        period_idx.append(about["period"])
+        period_type.append(about["periodType"])
+        game_time.append(about["dateTime"])
+        period_time.append(about["periodTime"])
+        shot_type.append(result.get("secondaryType"))
+        team_id.append(team.get("triCode"))
+        team_name.append(team.get("name"))
+        x_coord.append(coordinates.get("x", np.nan))
+        y_coord.append(coordinates.get("y", np.nan))
+        strength.append(result["strength"]["code"] if result.get("strength") else None)
+        empty_net.append(result.get("emptyNet"))
+        
+        # same attribution logic as play_json_to_play_dict
+        shooter = None
+        goalie = None
+        for player in play_json.get("players") or ():
+            if player["playerType"] in ["Shooter", "Scorer"]:
+                shooter = player["player"]
+            if player["playerType"] == "Goalie":
+                goalie = player["player"]
+        shooter_id.append(str(shooter["id"]) if shooter else None)
+        shooter_name.append(shooter["fullName"] if shooter else None)
+        goalie_id.append(str(goalie["id"]) if goalie else None)
+        goalie_name.append(goalie["fullName"] if goalie else None)
+    
+    return columns
+
+
+def previous_event_columns(plays_index, event_idx_list, n_back=1):
+    """same values as previous_event_dict, as one list per column"""
+    prefix = previous_event_prefix(n_back)
+    names = ["idx", "stats_id", "period", "period_time", "time", "type", "x_coord", "y_coord"]
+    columns = {f"{prefix}_{name}": [] for name in names}
+    (previous_idx, previous_stats_id, previous_period, previous_period_time,
+     previous_time, previous_type, previous_x, previous_y) = columns.values()
+    
+    for event_idx in event_idx_list:
+        previous_event_idx = event_idx - n_back
+        previous_idx.append(previous_event_idx)
+        play_json = plays_index.get(previous_event_idx)
+        if play_json is None:
+            for column in (previous_stats_id, previous_period, previous_period_time, previous_time, previous_type):
+                column.append(None)
+            previous_x.append(np.nan)
+            previous_y.append(np.nan)
+            continue
+        about = play_json["about"]
+        previous_type.append(play_json["result"]["eventTypeId"])
+        previous_stats_id.append(about["eventId"])
+        previous_period.append(int(about["period"]))
+        previous_period_time.append(about["periodTime"])
+        previous_time.append(about["dateTime"])
+        previous_x.append(play_json["coordinates"].get("x", np.nan))
+        previous_y.append(play_json["coordinates"].get("y", np.nan))
+    
+    return columns
+
+
+def game_json_to_columns(game_json, augment=False, n_previous=1, play_json_list=None, plays_index=None):
+    """columnar version of game_json_to_plays_list;
+    returns the play columns and the game metadata, stored once per game.
+    play_json_list restricts the columns to some plays of the game; their previous
+    events are still looked up among all plays (pass plays_index to reuse an index)"""
+    all_plays_list = game_json["liveData"]["plays"]["allPlays"]
+    columns = plays_to_columns(all_plays_list if play_json_list is None else play_json_list)
+    if augment:
+        if plays_index is None:
+            plays_index = index_plays_by_event_idx(all_plays_list)
+        for n_back in range(1, n_previous + 1):
+            columns.update(previous_event_columns(plays_index, columns["event_idx"], n_back))
+    return columns, game_json_to_metadata(game_json)
+
+
+def _columns_to_df(columns, game_metadata, n_plays):
+    for name in ["x_coord", "y_coord"] + [name for name in columns if name.endswith(("_x_coord", "_y_coord"))]:
+        columns[name] = np.array(columns[name], dtype="float64")
+    # metadata is repeated for each play of its game
+    for name, values in game_metadata.items():
+        columns[name] = np.repeat(np.array(values, dtype="int64" if name == "gamePk" else object), n_plays)
+    return pd.DataFrame(columns)
+
+
+def games_to_df(game_json_list, augment=False, n_previous=1):
+    """build a single plays DataFrame for many games;
+    columns are filled across games and the frame is built once"""
+    columns = None
+    game_metadata = {name: [] for name in ["gamePk", "game_season", "game_type", "game_start_time"]}
+    n_plays = []
+    for game_json in game_json_list:
+        game_columns, metadata = game_json_to_columns(game_json, augment=augment, n_previous=n_previous)
+        if columns is None:
+            columns = game_columns
+        else:
+            for name, values in game_columns.items():
+                columns[name].extend(values)
+        for name, value in metadata.items():
+            game_metadata[name].append(value)
+        n_plays.append(len(game_columns["event_idx"]))
+    
+    if columns is None:
+        columns = {name: [] for name in PLAY_COLUMNS}
+    return _columns_to_df(columns, game_metadata, n_plays)
+
+
+def game_to_df(game_json, augment=False, n_previous=1, play_json_list=None, plays_index=None):
+    """plays DataFrame of a game; see game_json_to_columns for play_json_list and plays_index"""
+    columns, metadata = game_json_to_columns(
+        game_json, augment=augment, n_previous=n_previous, play_json_list=play_json_list, plays_index=plays_index
+    )
+    game_metadata = {name: [value] for name, value in metadata.items()}
+    return _columns_to_df(columns, game_metadata, [len(columns["event_idx"])])
+
+
+# compact dtypes of the plays columns (see compact_plays_df)
+COMPACT_DTYPES = {
+    "event_idx": "int16",
+    "event_stats_id": "int16",
+    "period_idx": "int8",
+    "previous_event_idx": "Int16",
+    "previous_event_stats_id": "Int16",
+    "previous_event_period": "Int8",
+    "gamePk": "int32",
+    "shooter_id": "Int32",
+    "goalie_id": "Int32",
+    "empty_net_bool": "boolean",
+}
+CATEGORY_COLUMNS = [
+    "event_type_id", "period_type", "period_time", "shot_type", "team_initiative_id", "team_initiative_name",
+    "strength", "previous_event_period_time", "previous_event_type", "game_season", "game_type", "game_start_time",
+]
+DATETIME_COLUMNS = ["game_time", "previous_event_time"]
+COORD_COLUMNS = ["x_coord", "y_coord", "previous_event_x_coord", "previous_event_y_coord"]
+PLAYER_NAME_COLUMNS = [("shooter_id", "shooter_name"), ("goalie_id", "goalie_name")]
+
+
+def _compact_coords(coords):
+    """coordinates are whole feet within the rink: int8, or float32 if some aren't"""
+    values = coords.to_numpy(dtype="float64", na_value=np.nan)
+    known = values[~np.isnan(values)]
+    if np.all(known == np.round(known)) and np.all(np.abs(known) <= 127):
+        return coords.astype("float64").astype("Int8")
+    return coords.astype("float32")
+
+
+def compact_plays_df(plays_df):
+    """shrink a plays DataFrame (game_to_df) to small integers, categories and datetimes;
+    player names are moved to a table shared by all rows.
+    Returns the compact plays and the players (player_id index, player_name column).
+    Any subset of the columns is accepted, i.e., a warehouse query result.
+    The features module accepts either frame; use expand_plays_df to get the names back.
+    """
+    name_columns = [(id_column, name_column) for id_column, name_column in PLAYER_NAME_COLUMNS if name_column in plays_df]
+    players_df = pd.concat(
+        [plays_df[list(columns)].set_axis(["player_id", "player_name"], axis=1) for columns in name_columns]
+        or [pd.DataFrame(columns=["player_id", "player_name"])]
+    ).dropna(subset=["player_id"]).drop_duplicates("player_id")
+    players_df = players_df.astype({"player_id": "int32"}).set_index("player_id").sort_index()
+
+    compact = {}
+    for name, column in plays_df.drop(columns=[name_column for _, name_column in name_columns]).items():
+        if name in COMPACT_DTYPES:
+            if name in ("shooter_id", "goalie_id"):
+                # player ids are parsed as strings
+                column = pd.to_numeric(column)
+            compact[name] = column.astype(COMPACT_DTYPES[name])
+        elif name in CATEGORY_COLUMNS:
+            compact[name] = column.astype("category")
+        elif name in DATETIME_COLUMNS:
+            compact[name] = pd.to_datetime(column, utc=True)
+        elif name in COORD_COLUMNS:
+            compact[name] = _compact_coords(column)
+        else:
+            compact[name] = column
+    return pd.DataFrame(compact, index=plays_df.index), players_df
+
 
-def game_to_df(game_json, augment=False):
-    game_plays_list = game_json_to_plays_list(game_json, augment=augment)
-    game_plays_df = pd.DataFrame.from_records(game_plays_list)
-    return game_plays_df
\ No newline at end of file
+def expand_plays_df(compact_df, players_df):
+    """add back the shooter and goalie names of a frame from compact_plays_df"""
+    plays_df = compact_df.copy()
+    names = players_df["player_name"]
+    for id_column, name_column in PLAYER_NAME_COLUMNS:
+        if id_column in plays_df:
+            plays_df.insert(plays_df.columns.get_loc(id_column) + 1, name_column, plays_df[id_column].map(names))
+    return plays_df
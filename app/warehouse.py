@@ -0,0 +1,378 @@
+"""Local columnar store of parsed plays.
+    python warehouse.py --start-years 2020 2021
+
+The plays of each final game are stored once, as produced by game_to_df(augment=True):
+<root>/game_season=<season>/game_type=<type>/gamePk=<gamePk>/plays.parquet
+Queries only open the partitions matching their season, game type and gamePk
+filters and only read the requested columns. Each season also keeps a small index
+of the games where each team, player and event type appears, so that filtering
+on them only opens the matching games, and the shot densities of each team and
+shooter per game type (see density.py).
+"""
+import argparse
+import datetime
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from cache import atomic_path, file_lock, memoize
+from data_query import ApiEngine, ApiError, STORAGE_PATH
+from density import ShotDensity, group_densities, save_densities, load_densities
+from utils import game_to_df, game_json_key, gamePk_to_season_and_type, compact_plays_df
+
+
+PARTITION_SCHEMA = pa.schema([
+    ("game_season", pa.string()),
+    ("game_type", pa.string()),
+    ("gamePk", pa.int64()),
+])
+
+FILE_SCHEMA = pa.schema([
+    ("event_idx", pa.int64()),
+    ("event_stats_id", pa.int64()),
+    ("event_type_id", pa.string()),
+    ("period_idx", pa.int64()),
+    ("period_type", pa.string()),
+    ("game_time", pa.string()),
+    ("period_time", pa.string()),
+    ("shot_type", pa.string()),
+    ("team_initiative_id", pa.string()),
+    ("team_initiative_name", pa.string()),
+    ("x_coord", pa.float64()),
+    ("y_coord", pa.float64()),
+    ("shooter_id", pa.string()),
+    ("shooter_name", pa.string()),
+    ("goalie_id", pa.string()),
+    ("goalie_name", pa.string()),
+    ("strength", pa.string()),
+    ("empty_net_bool", pa.bool_()),
+    ("previous_event_idx", pa.int64()),
+    ("previous_event_stats_id", pa.float64()),
+    ("previous_event_period", pa.float64()),
+    ("previous_event_period_time", pa.string()),
+    ("previous_event_time", pa.string()),
+    ("previous_event_type", pa.string()),
+    ("previous_event_x_coord", pa.float64()),
+    ("previous_event_y_coord", pa.float64()),
+    ("game_start_time", pa.string()),
+])
+
+# columns of the season index, to find the games matching a query
+INDEX_COLUMNS = ["gamePk", "team_initiative_id", "shooter_id", "goalie_id", "event_type_id", "game_start_time"]
+
+# columns needed to bin the shots of a season
+DENSITY_COLUMNS = ["gamePk", "game_type", "period_idx", "team_initiative_id", "shooter_id", "event_type_id", "x_coord", "y_coord"]
+
+# same column order as game_to_df
+COLUMNS = [name for name in FILE_SCHEMA.names if name != "game_start_time"] + ["gamePk", "game_season", "game_type", "game_start_time"]
+
+
+def is_final(game_json):
+    return game_json["gameData"]["status"]["abstractGameState"] == "Final"
+
+
+@memoize(maxsize=16, key=game_json_key)
+def parse_game(game_json):
+    """plays of a game not stored in the warehouse, parsed once per version of its feed"""
+    return game_to_df(game_json, augment=True)
+
+
+def _day_after(date):
+    return (datetime.date.fromisoformat(str(date)[:10]) + datetime.timedelta(days=1)).isoformat()
+
+
+def _as_list(values):
+    if isinstance(values, (list, tuple, set)):
+        return list(values)
+    return [values]
+
+
+class PlaysWarehouse:
+    """Parquet store of the plays of final games, partitioned by season, game type and gamePk.
+        warehouse = PlaysWarehouse("./warehouse")
+        warehouse.ingest_game(game_json)
+        shots_df = warehouse.query(shooter=8478402, columns=["gamePk", "x_coord", "y_coord"])
+    """
+    def __init__(self, root):
+        self.root = root
+        self.partitioning = ds.partitioning(PARTITION_SCHEMA, flavor="hive")
+        self.schema = pa.unify_schemas([FILE_SCHEMA, PARTITION_SCHEMA])
+
+    def _season_dir(self, game_season):
+        return os.path.join(self.root, f"game_season={game_season}")
+
+    def _game_path(self, gamePk):
+        game_season, game_type = gamePk_to_season_and_type(gamePk)
+        return os.path.join(self._season_dir(game_season), f"game_type={game_type}", f"gamePk={gamePk}", "plays.parquet")
+
+    def _game_lock_path(self, gamePk):
+        # next to the plays of the game, which are the only file read from its partition
+        return os.path.join(os.path.dirname(self._game_path(gamePk)), "_plays.lock")
+
+    def _index_path(self, game_season):
+        return os.path.join(self._season_dir(game_season), "_index.parquet")
+
+    def _density_path(self, game_season):
+        return os.path.join(self._season_dir(game_season), "_density.npz")
+
+    def _stale_index_path(self, game_season):
+        return os.path.join(self._season_dir(game_season), "_index_stale")
+
+    def _seasons(self):
+        if not os.path.isdir(self.root):
+            return []
+        return [entry.name.split("=", 1)[1] for entry in os.scandir(self.root) if entry.name.startswith("game_season=")]
+
+    def has_game(self, gamePk):
+        return os.path.exists(self._game_path(gamePk))
+
+    def ingest_game(self, game_json, plays_df=None):
+        """store the plays of a final game; pass plays_df if it was already parsed with augment=True"""
+        if not is_final(game_json):
+            raise ValueError("only final games are stored in the warehouse")
+        if plays_df is None:
+            plays_df = game_to_df(game_json, augment=True)
+
+        gamePk = game_json["gameData"]["game"]["pk"]
+        game_season, _ = gamePk_to_season_and_type(gamePk)
+        path = self._game_path(gamePk)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(plays_df[FILE_SCHEMA.names], schema=FILE_SCHEMA, preserve_index=False)
+        with atomic_path(path) as tmp_path:
+            pq.write_table(table, tmp_path)
+        # marked after the game is written, so an index built concurrently is rebuilt again
+        open(self._stale_index_path(game_season), "w").close()
+
+    def get_game_plays(self, game_json):
+        """return the plays of a game: final games are read from the warehouse and stored
+        on their first request, games in progress are parsed from the feed"""
+        if not is_final(game_json):
+            return parse_game(game_json)
+        gamePk = game_json["gameData"]["game"]["pk"]
+        plays_df = self.load_game(gamePk)
+        if plays_df is None:
+            # a game is parsed once, even by processes sharing the warehouse
+            with file_lock(self._game_lock_path(gamePk)):
+                plays_df = self.load_game(gamePk)
+                if plays_df is None:
+                    plays_df = game_to_df(game_json, augment=True)
+                    self.ingest_game(game_json, plays_df=plays_df)
+        return plays_df
+
+    def ingest_season(self, api_engine, start_year, progress=None):
+        """download and store every final game of a season that isn't stored yet"""
+        try:
+            for gamePk, game_json in api_engine.download_games(start_year=start_year, progress=progress, selective=True):
+                if is_final(game_json) and not self.has_game(gamePk):
+                    self.ingest_game(game_json)
+        finally:
+            game_season = api_engine._start_year_to_season_string(start_year)
+            if os.path.exists(self._stale_index_path(game_season)):
+                self.build_index(game_season)
+
+    def build_index(self, game_season):
+        """summarize in which games each team, player and event type appears"""
+        # one build at a time, even across processes: they write the same files
+        with file_lock(os.path.join(self._season_dir(game_season), "_index.lock")):
+            if not self._is_stale(game_season):
+                # built while waiting for the lock
+                return pd.read_parquet(self._index_path(game_season))
+            # unmarked before reading, so games stored meanwhile mark the index stale again
+            try:
+                os.remove(self._stale_index_path(game_season))
+            except FileNotFoundError:
+                pass
+            files = self._files(seasons=game_season)
+            dataset = ds.dataset(files, schema=self.schema, format="parquet", partitioning=self.partitioning, partition_base_dir=self.root)
+            index_df = dataset.to_table(columns=INDEX_COLUMNS).to_pandas().drop_duplicates(ignore_index=True)
+
+            with atomic_path(self._index_path(game_season)) as tmp_path:
+                index_df.to_parquet(tmp_path, index=False)
+
+            # a season of shots: ids and types as categories
+            plays_df = dataset.to_table(columns=DENSITY_COLUMNS).to_pandas(strings_to_categorical=True)
+            densities = {}
+            for game_type, type_df in plays_df.groupby("game_type", observed=True):
+                densities[f"{game_type}|team"] = group_densities(type_df, by="team_initiative_id")
+                densities[f"{game_type}|shooter"] = group_densities(type_df, by="shooter_id")
+            save_densities(self._density_path(game_season), densities)
+            return index_df
+
+    def _is_stale(self, game_season):
+        return (
+            os.path.exists(self._stale_index_path(game_season))
+            or not os.path.exists(self._index_path(game_season))
+            or not os.path.exists(self._density_path(game_season))
+        )
+
+    def load_index(self, game_season):
+        """return the index of a season, rebuilding it if games were stored since it was built"""
+        if self._is_stale(game_season):
+            return self.build_index(game_season)
+        return pd.read_parquet(self._index_path(game_season))
+
+    def _game_types(self, game_season):
+        return [entry.name.split("=", 1)[1] for entry in os.scandir(self._season_dir(game_season)) if entry.name.startswith("game_type=")]
+
+    def shot_density(self, team=None, shooter=None, seasons=None, game_types=None, gamePks=None, start_date=None, end_date=None):
+        """return the ShotDensity of the stored shots of a team (triCode) or a shooter (player id).
+        Whole seasons and game types merge the densities precomputed with the season index;
+        gamePks, dates or both a team and a shooter bin the matching shots instead.
+        """
+        if gamePks is not None or start_date is not None or end_date is not None or (team is not None and shooter is not None):
+            if shooter is not None and gamePks is None:
+                gamePks = self._matching_gamePks(seasons, team, shooter, None, None, start_date, end_date)
+            # the side a team attacks is found from all of its shots, not only those of the shooter
+            plays_df = self.query(
+                columns=DENSITY_COLUMNS, seasons=seasons, game_types=game_types, gamePks=gamePks,
+                team=team, start_date=start_date, end_date=end_date, compact=True,
+            )
+            if shooter is None:
+                return ShotDensity.from_plays(plays_df)
+            densities = group_densities(plays_df, by="shooter_id")
+            # compact plays hold the player ids as integers
+            return ShotDensity.merge([densities[int(player_id)] for player_id in _as_list(shooter) if int(player_id) in densities])
+
+        if shooter is not None:
+            name, keys = "shooter", [str(player_id) for player_id in _as_list(shooter)]
+        else:
+            name, keys = "team", None if team is None else _as_list(team)
+        densities = []
+        for game_season in (self._seasons() if seasons is None else _as_list(seasons)):
+            if not os.path.isdir(self._season_dir(game_season)):
+                continue
+            if self._is_stale(game_season):
+                self.build_index(game_season)
+            for game_type in (self._game_types(game_season) if game_types is None else _as_list(game_types)):
+                densities.extend(load_densities(self._density_path(game_season), f"{game_type}|{name}", keys=keys).values())
+        return ShotDensity.merge(densities)
+
+    def _matching_gamePks(self, seasons, team, shooter, goalie, event_type, start_date, end_date):
+        """find the games that contain plays matching the filters, from the season indexes"""
+        gamePks = []
+        for game_season in (self._seasons() if seasons is None else _as_list(seasons)):
+            if not os.path.isdir(self._season_dir(game_season)):
+                continue
+            index_df = self.load_index(game_season)
+            mask = pd.Series(True, index=index_df.index)
+            if team is not None:
+                mask &= index_df["team_initiative_id"].isin(_as_list(team))
+            if shooter is not None:
+                mask &= index_df["shooter_id"].isin([str(player_id) for player_id in _as_list(shooter)])
+            if goalie is not None:
+                mask &= index_df["goalie_id"].isin([str(player_id) for player_id in _as_list(goalie)])
+            if event_type is not None:
+                mask &= index_df["event_type_id"].isin(_as_list(event_type))
+            if start_date is not None:
+                mask &= index_df["game_start_time"] >= str(start_date)
+            if end_date is not None:
+                mask &= index_df["game_start_time"] < _day_after(end_date)
+            gamePks.extend(index_df.loc[mask, "gamePk"].unique().tolist())
+        return gamePks
+
+    def _files(self, seasons=None, game_types=None, gamePks=None):
+        """list the files of the matching partitions without walking the others"""
+        if gamePks is not None:
+            paths = []
+            for gamePk in _as_list(gamePks):
+                game_season, game_type = gamePk_to_season_and_type(gamePk)
+                if seasons is not None and game_season not in _as_list(seasons):
+                    continue
+                if game_types is not None and game_type not in _as_list(game_types):
+                    continue
+                paths.append(self._game_path(gamePk))
+            return [path for path in paths if os.path.exists(path)]
+
+        if seasons is not None:
+            season_dirs = [self._season_dir(game_season) for game_season in _as_list(seasons)]
+        elif os.path.isdir(self.root):
+            season_dirs = [entry.path for entry in os.scandir(self.root) if entry.name.startswith("game_season=")]
+        else:
+            season_dirs = []
+
+        game_type_names = None if game_types is None else [f"game_type={game_type}" for game_type in _as_list(game_types)]
+        files = []
+        for season_dir in season_dirs:
+            if not os.path.isdir(season_dir):
+                continue
+            for type_entry in os.scandir(season_dir):
+                # the season index files sit next to the partitions
+                if not type_entry.name.startswith("game_type="):
+                    continue
+                if game_type_names is not None and type_entry.name not in game_type_names:
+                    continue
+                for game_entry in os.scandir(type_entry.path):
+                    path = os.path.join(game_entry.path, "plays.parquet")
+                    if os.path.exists(path):
+                        files.append(path)
+        return files
+
+    def query(self, columns=None, seasons=None, game_types=None, gamePks=None, team=None, shooter=None, goalie=None,
+              event_type=None, start_date=None, end_date=None, compact=False):
+        """return the stored plays matching every given filter as a DataFrame.
+        Filters accept a single value or a list: seasons ("20212022"), game_types ("R", "P"),
+        gamePks, team (triCode), shooter and goalie (player id), event_type ("SHOT", "GOAL").
+        start_date and end_date (inclusive) select games by their start date.
+        compact=True shrinks the result with utils.compact_plays_df (player names are dropped),
+        for queries covering many games.
+        """
+        columns = COLUMNS if columns is None else columns
+        filters = [team, shooter, goalie, event_type, start_date, end_date]
+        if gamePks is None and any(f is not None for f in filters):
+            gamePks = self._matching_gamePks(seasons, team, shooter, goalie, event_type, start_date, end_date)
+        files = self._files(seasons=seasons, game_types=game_types, gamePks=gamePks)
+        if not files:
+            return self.schema.empty_table().to_pandas()[columns]
+
+        conditions = []
+        if team is not None:
+            conditions.append(ds.field("team_initiative_id").isin(_as_list(team)))
+        if shooter is not None:
+            conditions.append(ds.field("shooter_id").isin([str(player_id) for player_id in _as_list(shooter)]))
+        if goalie is not None:
+            conditions.append(ds.field("goalie_id").isin([str(player_id) for player_id in _as_list(goalie)]))
+        if event_type is not None:
+            conditions.append(ds.field("event_type_id").isin(_as_list(event_type)))
+        # game_start_time is an ISO 8601 string, so dates compare in lexicographic order
+        if start_date is not None:
+            conditions.append(ds.field("game_start_time") >= str(start_date))
+        if end_date is not None:
+            conditions.append(ds.field("game_start_time") < _day_after(end_date))
+
+        condition = None
+        for c in conditions:
+            condition = c if condition is None else condition & c
+
+        dataset = ds.dataset(files, schema=self.schema, format="parquet", partitioning=self.partitioning, partition_base_dir=self.root)
+        table = dataset.to_table(columns=columns, filter=condition)
+        if compact:
+            # strings are decoded once per distinct value, not once per row
+            plays_df, _ = compact_plays_df(table.to_pandas(strings_to_categorical=True))
+            return plays_df
+        return table.to_pandas()
+
+    def load_game(self, gamePk, columns=None):
+        """return the plays of a stored game, or None if it isn't stored"""
+        if not self.has_game(gamePk):
+            return None
+        return self.query(columns=columns, gamePks=gamePk)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Store the plays of every final game of the given seasons.")
+    parser.add_argument("--start-years", type=int, nargs="+", required=True, help="first year of each season (i.e., 2021 for 2021-2022)")
+    parser.add_argument("--root", default=os.path.join(STORAGE_PATH, "warehouse"), help="directory of the warehouse")
+    parser.add_argument("--storage-path", default=STORAGE_PATH, help="storage_path of the ApiEngine cache")
+    args = parser.parse_args()
+
+    api_engine = ApiEngine(args.storage_path)
+    warehouse = PlaysWarehouse(args.root)
+    for start_year in args.start_years:
+        try:
+            warehouse.ingest_season(api_engine, start_year, progress=lambda n, total: print(f"\r{start_year}: {n}/{total}", end=""))
+        except ApiError as e:
+            print(f"\n{e}")
+        print()
@@ -0,0 +1,136 @@
+"""Fetch and parse ahead the games likely to be opened next.
+
+On a game night most views go to the games of the day, and games are browsed one after
+the other in the order of the list. A CacheWarmer loads these games on a small thread
+pool of the app process, through the same memoized getters as the pages, so their first
+view is served from memory:
+    warmer = get_warmer(api_engine, warehouse)
+    warmer.warm_today(schedule_index)
+    warmer.warm_neighbours(games_df["gamePk"].tolist(), gamePk)
+
+Limits are read from the environment: WARM_WORKERS threads, at most WARM_MAX_PENDING
+games queued or running (others are dropped), WARM_NEIGHBOURS games on each side of
+the selected one. The memory held by warmed games is bounded by the maxsize of the
+memoized getters (see ApiEngine.get_game), so warm_today is capped to WARM_MAX_PENDING too.
+Setting WARM_WORKERS=0 disables warming.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from utils import get_metadata
+
+
+WARM_WORKERS = int(os.environ.get("WARM_WORKERS", 2))
+WARM_MAX_PENDING = int(os.environ.get("WARM_MAX_PENDING", 8))
+WARM_NEIGHBOURS = int(os.environ.get("WARM_NEIGHBOURS", 2))
+# a warmed game isn't warmed again before this many seconds (games in progress change)
+REWARM_AFTER = 60
+# gamePks remembered as warmed
+MAX_WARMED = 256
+
+WARM_GAMES = metrics.counter("cache_warmer_games_total", "Games submitted to the cache warmer", ["result"])
+WARM_SECONDS = metrics.histogram("cache_warmer_game_seconds", "Time to fetch and parse a game ahead")
+
+
+class CacheWarmer:
+    """Thread pool loading games into the memoized caches of an ApiEngine and the warehouse.
+    Each game warms its feed, metadata, media index and plays: final games are stored in
+    the warehouse, the others are parsed for the version of their feed (see parse_game).
+    Submitting never blocks the caller.
+    """
+    def __init__(self, api_engine, warehouse, max_workers=WARM_WORKERS, max_pending=WARM_MAX_PENDING, neighbours=WARM_NEIGHBOURS):
+        self.api_engine = api_engine
+        self.warehouse = warehouse
+        self.max_pending = max_pending
+        self.neighbours = neighbours
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cache-warmer") if max_workers > 0 else None
+        self._pending = set()
+        self._warmed = OrderedDict()
+        self._lock = threading.Lock()
+
+    def warm_game(self, gamePk):
+        """load a game the way the game page does"""
+        with WARM_SECONDS.time():
+            game_json = self.api_engine.get_game(gamePk)
+            get_metadata(game_json)
+            self.api_engine.get_media_index(gamePk)
+            self.warehouse.get_game_plays(game_json)
+
+    def _run(self, gamePk):
+        try:
+            self.warm_game(gamePk)
+            WARM_GAMES.inc(result="done")
+        except Exception:
+            # the page reports the errors of the games it opens
+            WARM_GAMES.inc(result="failed")
+        finally:
+            with self._lock:
+                self._pending.discard(gamePk)
+                self._warmed[gamePk] = time.time()
+                self._warmed.move_to_end(gamePk)
+                while len(self._warmed) > MAX_WARMED:
+                    self._warmed.popitem(last=False)
+
+    def submit(self, gamePks):
+        """queue the games in order, skipping the ones queued or warmed recently;
+        return the gamePks actually queued"""
+        if self._executor is None:
+            return []
+        queued = []
+        now = time.time()
+        with self._lock:
+            for gamePk in gamePks:
+                gamePk = int(gamePk)
+                if gamePk in self._pending or now - self._warmed.get(gamePk, 0) < REWARM_AFTER:
+                    WARM_GAMES.inc(result="skipped")
+                    continue
+                if len(self._pending) >= self.max_pending:
+                    WARM_GAMES.inc(result="dropped")
+                    continue
+                self._pending.add(gamePk)
+                queued.append(gamePk)
+        for gamePk in queued:
+            self._executor.submit(self._run, gamePk)
+        return queued
+
+    def warm_today(self, schedule_index):
+        """queue the games of the day"""
+        return self.submit(schedule_index.today()["gamePk"].tolist()[:self.max_pending])
+
+    def warm_neighbours(self, gamePks, gamePk):
+        """queue the games around gamePk in the list the user browses, the closest first"""
+        gamePks = list(gamePks)
+        if gamePk not in gamePks:
+            return []
+        position = gamePks.index(gamePk)
+        around = []
+        for offset in range(1, self.neighbours + 1):
+            # the next game is more likely to be opened than the previous one
+            for neighbour in (position + offset, position - offset):
+                if 0 <= neighbour < len(gamePks):
+                    around.append(gamePks[neighbour])
+        return self.submit(around)
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def shutdown(self, wait=False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+
+_warmers = {}
+_warmers_lock = threading.Lock()
+
+
+def get_warmer(api_engine, warehouse):
+    """return the warmer shared by every session of the process for this storage"""
+    with _warmers_lock:
+        if api_engine not in _warmers:
+            _warmers[api_engine] = CacheWarmer(api_engine, warehouse)
+        return _warmers[api_engine]
@@ -0,0 +1,239 @@
+"""Expected goals (xG) of shots, scored by a model serialized as JSON.
+    python xg.py --features ./features --output ./assets/xg_model.json
+
+A model lists the columns it reads from FeaturePipeline (`features`) and the pipeline
+features producing them (`pipeline_features`). Two kinds are supported:
+    {"type": "linear", "features": [...], "coefficients": [...], "intercept": -2.1, "link": "logistic"}
+    {"type": "trees", "features": [...], "trees": [...], "base_score": 0.0, "aggregate": "sum", "link": "logistic"}
+Each tree is given as flat arrays indexed by node (node 0 is the root, a leaf has left == -1):
+    {"feature": [...], "threshold": [...], "left": [...], "right": [...], "value": [...], "missing_left": [...]}
+`aggregate` is "sum" for boosted trees and "mean" for random forests; `comparison` is "<="
+(scikit-learn, the default) or "<" (XGBoost) for the rows going to the left child.
+Missing columns (i.e., a shot type that never occurs in a game) are zeros; missing values
+are zeros for linear models and follow `missing_left` in trees.
+
+Scoring is vectorized over the whole frame: a linear model is one matrix product, a tree
+moves every shot down one level per step, so a season is scored in a few seconds.
+The command line fits a baseline logistic regression on the output of feature_job.py.
+"""
+import argparse
+import glob
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from cache import atomic_path, memoize
+from features import FeaturePipeline
+
+
+XG_MODEL_PATH = os.environ.get("XG_MODEL_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "xg_model.json"))
+
+# columns of the baseline logistic regression
+BASELINE_FEATURES = [
+    "dist_from_net", "angle_from_net", "empty_net", "rebound", "angle_change",
+    "seconds_from_previous", "dist_from_previous", "speed",
+]
+
+
+def _link(raw, link):
+    if link == "logistic":
+        return 1 / (1 + np.exp(-raw))
+    return raw
+
+
+class XgModel:
+    def __init__(self, features, pipeline_features=None, link="logistic", name=None):
+        self.features = list(features)
+        self.pipeline_features = list(pipeline_features or FeaturePipeline.ADVANCED_FEATURES)
+        self.link = link
+        self.name = name
+
+    def feature_matrix(self, features_df):
+        """float matrix of the model columns, in order"""
+        return features_df.reindex(columns=self.features, fill_value=0).to_numpy(dtype=np.float64, na_value=np.nan)
+
+    def predict(self, features_df):
+        """xG of each row of a FeaturePipeline frame"""
+        return _link(self.raw_score(self.feature_matrix(features_df)), self.link)
+
+
+class LinearModel(XgModel):
+    def __init__(self, features, coefficients, intercept=0.0, **kwargs):
+        super().__init__(features, **kwargs)
+        self.coefficients = np.asarray(coefficients, dtype=np.float64)
+        self.intercept = float(intercept)
+
+    def raw_score(self, X):
+        return np.nan_to_num(X, nan=0.0) @ self.coefficients + self.intercept
+
+    def to_dict(self):
+        return dict(type="linear", features=self.features, pipeline_features=self.pipeline_features, link=self.link,
+                    coefficients=self.coefficients.tolist(), intercept=self.intercept)
+
+
+class TreeEnsemble(XgModel):
+    def __init__(self, features, trees, base_score=0.0, aggregate="sum", comparison="<=", **kwargs):
+        super().__init__(features, **kwargs)
+        self.trees = [self._tree_arrays(tree) for tree in trees]
+        self.base_score = float(base_score)
+        self.aggregate = aggregate
+        self.comparison = comparison
+
+    @staticmethod
+    def _tree_arrays(tree):
+        arrays = dict(
+            feature=np.asarray(tree["feature"], dtype=np.int64),
+            threshold=np.asarray(tree["threshold"], dtype=np.float64),
+            left=np.asarray(tree["left"], dtype=np.int64),
+            right=np.asarray(tree["right"], dtype=np.int64),
+            value=np.asarray(tree["value"], dtype=np.float64),
+        )
+        arrays["missing_left"] = np.asarray(tree.get("missing_left", np.ones(len(arrays["left"]))), dtype=bool)
+        return arrays
+
+    def _predict_tree(self, tree, X):
+        rows = np.arange(len(X))
+        node = np.zeros(len(X), dtype=np.int64)
+        # one level of the tree per step, for every row at once
+        for _ in range(len(tree["left"])):
+            internal = tree["left"][node] >= 0
+            if not internal.any():
+                break
+            x = X[rows, np.where(internal, tree["feature"][node], 0)]
+            threshold = tree["threshold"][node]
+            go_left = x < threshold if self.comparison == "<" else x <= threshold
+            go_left = np.where(np.isnan(x), tree["missing_left"][node], go_left)
+            node = np.where(internal, np.where(go_left, tree["left"][node], tree["right"][node]), node)
+        return tree["value"][node]
+
+    def raw_score(self, X):
+        total = np.zeros(len(X))
+        for tree in self.trees:
+            total += self._predict_tree(tree, X)
+        if self.aggregate == "mean" and self.trees:
+            total /= len(self.trees)
+        return total + self.base_score
+
+    def to_dict(self):
+        trees = [{name: values.tolist() for name, values in tree.items()} for tree in self.trees]
+        return dict(type="trees", features=self.features, pipeline_features=self.pipeline_features, link=self.link,
+                    trees=trees, base_score=self.base_score, aggregate=self.aggregate, comparison=self.comparison)
+
+
+MODEL_TYPES = {"linear": LinearModel, "trees": TreeEnsemble}
+
+
+def model_from_dict(model_dict, name=None):
+    model_dict = dict(model_dict)
+    model_type = model_dict.pop("type")
+    if model_type not in MODEL_TYPES:
+        raise ValueError(f"unknown xG model type '{model_type}', expected one of {list(MODEL_TYPES)}")
+    return MODEL_TYPES[model_type](name=name, **model_dict)
+
+
+def load_model(path):
+    with open(path, "r") as f:
+        return model_from_dict(json.load(f), name=os.path.basename(path))
+
+
+def save_model(model, path):
+    with atomic_path(path) as tmp_path:
+        with open(tmp_path, "w") as f:
+            json.dump(model.to_dict(), f)
+
+
+@memoize(maxsize=4)
+def _load_model_version(path, mtime):
+    model = load_model(path)
+    # scores cached per game are dropped with the version of the model
+    model.name = f"{os.path.basename(path)}@{mtime}"
+    return model
+
+
+def get_model(path=XG_MODEL_PATH):
+    """the model stored at path, reloaded when the file changes; None if there is none"""
+    try:
+        mtime = os.path.getmtime(path)
+    except FileNotFoundError:
+        return None
+    return _load_model_version(path, mtime)
+
+
+def score_plays(model, plays_df):
+    """xG of each shot of a plays frame (utils.game_to_df with augment=True), in one pass"""
+    if plays_df.empty:
+        return pd.Series(dtype=np.float64, index=plays_df.index, name="xg")
+    features_df = FeaturePipeline(plays_df).transform(model.pipeline_features)
+    return pd.Series(model.predict(features_df), index=plays_df.index, name="xg")
+
+
+@memoize(maxsize=64, key=lambda model, gamePk, plays_df: (model.name, gamePk, len(plays_df)))
+def score_game(model, gamePk, plays_df):
+    """score_plays, kept per game (and number of plays, for games in progress)"""
+    return score_plays(model, plays_df)
+
+
+def team_totals(plays_df, xg):
+    """shots, goals and summed xG of each team"""
+    totals_df = pd.DataFrame({
+        "team": plays_df["team_initiative_id"].astype(object),
+        "shots": 1,
+        "goals": (plays_df["event_type_id"] == "GOAL").astype("int64"),
+        "xG": xg,
+    })
+    totals_df = totals_df.groupby("team").sum()
+    totals_df["xG"] = totals_df["xG"].round(2)
+    return totals_df
+
+
+def fit_logistic(features_df, features=BASELINE_FEATURES, target="is_goal", l2=1.0, n_iter=25):
+    """logistic regression fitted with Newton's method on standardized columns
+    (missing values are zeros, as when scoring)"""
+    X = features_df.reindex(columns=features, fill_value=0).to_numpy(dtype=np.float64, na_value=np.nan)
+    X = np.nan_to_num(X, nan=0.0)
+    y = features_df[target].to_numpy(dtype=np.float64)
+    mean, std = X.mean(axis=0), X.std(axis=0)
+    std[std == 0] = 1
+    Z = np.column_stack([np.ones(len(X)), (X - mean) / std])
+
+    weights = np.zeros(Z.shape[1])
+    penalty = np.full(Z.shape[1], l2)
+    penalty[0] = 0
+    for _ in range(n_iter):
+        p = 1 / (1 + np.exp(-Z @ weights))
+        gradient = Z.T @ (p - y) + penalty * weights
+        hessian = (Z * (p * (1 - p))[:, None]).T @ Z + np.diag(penalty)
+        step = np.linalg.solve(hessian, gradient)
+        weights -= step
+        if np.abs(step).max() < 1e-8:
+            break
+
+    # back to the scale of the features
+    coefficients = weights[1:] / std
+    intercept = weights[0] - (coefficients * mean).sum()
+    # only compute the pipeline features the columns come from, when they are named alike
+    pipeline_features = features if set(features) <= set(FeaturePipeline.ADVANCED_FEATURES) else None
+    return LinearModel(features, coefficients, intercept, pipeline_features=pipeline_features)
+
+
+def read_features(features_path):
+    """the features written by feature_job.py"""
+    paths = glob.glob(os.path.join(features_path, "game_season=*", "game_type=*", "features.parquet"))
+    if not paths:
+        raise FileNotFoundError(f"no features.parquet under {features_path}; run feature_job.py first")
+    return pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit a baseline logistic xG model on the output of feature_job.py.")
+    parser.add_argument("--features", default="./features", help="directory of the partitioned features")
+    parser.add_argument("--output", default=XG_MODEL_PATH, help="path of the JSON model")
+    parser.add_argument("--columns", nargs="+", default=BASELINE_FEATURES, help="feature columns of the model")
+    args = parser.parse_args()
+
+    features_df = read_features(args.features)
+    model = fit_logistic(features_df, args.columns)
+    save_model(model, args.output)
+    print(f"fitted on {len(features_df)} shots ({int(features_df['is_goal'].sum())} goals), saved to {args.output}")